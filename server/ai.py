@@ -16,6 +16,17 @@ Usage:
    will be displayed in the console.
 4. Type 'exit' to quit the tool at any time.
 
+Batch mode:
+Run many prompts concurrently from a JSONL file, e.g. to regression-test prompt changes
+against the support guide:
+   python ai.py --batch prompts.jsonl --output results.jsonl --workers 8 --rate 5 --support-guide
+Each input line is a JSON object with a "prompt" (or "message") field and an optional "id".
+Each output line holds the prompt, response, latency and token usage, or the error.
+A report with p50/p95/p99 latency, tokens/sec and error counts is printed at the end.
+--rate caps requests started per second across all workers (0 means no limit).
+--max-retries sets client retries per prompt (default 0, so every upstream error is counted).
+--support-guide uses the same support guide prompt as the app instead of a generic one.
+
 Prerequisites:
 - Python 3
 - openai Python package (install with 'pip install openai')
@@ -25,21 +36,37 @@ This tool is intended for educational and testing purposes, providing a quick an
 to interact with the OpenAI API without the need for setting up a full application.
 """
 
+import argparse
+import json
+import math
 import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
 import openai
 from dotenv import load_dotenv
 from flask import Flask
+from prompt_store import PromptStore
 
 # Load environment variables from the .env file for secure API key management
 load_dotenv()
 
-# Initialize OpenAI client with API key from environment variables
-client = openai.OpenAI(api_key=os.environ["OPENAI_API_KEY"])
-
-# Retrieve the OpenAI API key and Assistant ID from environment variables
+# Retrieve the OpenAI API key and Assistant ID from environment variables.
+# OPENAI_BASE_URL optionally points the client at another endpoint, such as fake_openai.py,
+# in which case the API key may be left unset, as in config.py.
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
 OPENAI_ASSISTANT_ID = os.getenv("OPENAI_ASSISTANT_ID")
+if not OPENAI_API_KEY:
+    if not OPENAI_BASE_URL:
+        raise ValueError("The OPENAI_API_KEY environment variable is not set.")
+    OPENAI_API_KEY = "fake-openai-key"
+
+# Initialize OpenAI client
+client = openai.OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
 
 # Initialize Flask app (for potential future web server extension)
 app = Flask(__name__)
@@ -50,10 +77,6 @@ TEMP_USER_ID = 1
 # Assistant ID for OpenAI chat completion (replace with your Assistant's ID)
 assistant_id = OPENAI_ASSISTANT_ID
 
-# Reinitialize OpenAI client (if needed) and Flask app
-client = openai.OpenAI(api_key=os.environ["OPENAI_API_KEY"])
-app = Flask(__name__)
-
 
 # also if you want to change the models change the content where it has you are a helpful assistant
 # to what you may want like you are a math tutor or what you want it to act like.
@@ -85,10 +108,177 @@ def get_completion(prompt, model="gpt-3.5-turbo", temperature=0.7, max_tokens=15
         return None
 
 
+def request_completion(
+    messages, model="gpt-3.5-turbo", temperature=0.7, max_tokens=150, max_retries=0
+):
+    """
+    Sends a chat completion request and returns the full API response, including usage.
+    Client retries are off by default so errors and latencies are reported as they happen.
+    """
+    return client.with_options(max_retries=max_retries).chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+    )
+
+
+class RateLimiter:
+    """
+    Spaces out request starts across threads so no more than `rate` start per second.
+    A rate of 0 disables the limit.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        time.sleep(max(0.0, start - now))
+
+
+def percentile(values, pct):
+    """
+    Returns the nearest-rank percentile of a list of numbers, or None if it is empty.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def read_prompts(path):
+    """
+    Reads batch prompts from a JSONL file. Returns a list of (id, prompt) pairs.
+    """
+    prompts = []
+    with open(path, "r", encoding="utf-8") as file:
+        for line_number, line in enumerate(file, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            prompt = item.get("prompt") or item.get("message")
+            if not prompt:
+                raise ValueError(f"Line {line_number} has no prompt or message field")
+            prompts.append((item.get("id", line_number), prompt))
+    return prompts
+
+
+def run_batch(args):
+    """
+    Runs every prompt in args.batch concurrently, writes results to args.output as JSONL
+    and prints a throughput and latency report.
+    """
+    prompts = read_prompts(args.batch)
+    limiter = RateLimiter(args.rate)
+    guide = None
+    if args.support_guide:
+        guide = PromptStore(Path(__file__).parent / "data" / "support_guide.txt")
+
+    def run_one(item):
+        item_id, prompt = item
+        if guide:
+            system_message = guide.system_message_for(prompt, args.top_k)
+        else:
+            system_message = {
+                "role": "system",
+                "content": "You are a helpful assistant.",
+            }
+        messages = [system_message, {"role": "user", "content": prompt}]
+
+        limiter.wait()
+        started = time.perf_counter()
+        result = {"id": item_id, "prompt": prompt}
+        try:
+            response = request_completion(
+                messages,
+                args.model,
+                args.temperature,
+                args.max_tokens,
+                args.max_retries,
+            )
+            result["response"] = (
+                response.choices[0].message.content.strip()
+                if response.choices
+                else None
+            )
+            if response.usage:
+                result["prompt_tokens"] = response.usage.prompt_tokens
+                result["completion_tokens"] = response.usage.completion_tokens
+        except Exception as e:
+            result["error"] = type(e).__name__
+            result["error_message"] = str(e)
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    batch_started = time.perf_counter()
+    with open(args.output, "w", encoding="utf-8") as output:
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            results = []
+            for result in executor.map(run_one, prompts):
+                output.write(json.dumps(result) + "\n")
+                results.append(result)
+    elapsed = time.perf_counter() - batch_started
+
+    latencies = [r["latency_ms"] for r in results if "error" not in r]
+    completion_tokens = sum(r.get("completion_tokens", 0) for r in results)
+    prompt_tokens = sum(r.get("prompt_tokens", 0) for r in results)
+    errors = Counter(r["error"] for r in results if "error" in r)
+
+    print(
+        f"Prompts: {len(results)} in {elapsed:.2f}s ({len(results) / elapsed:.2f} req/s)"
+    )
+    rate_limit = f"{args.rate} req/s" if args.rate > 0 else "none"
+    print(f"Workers: {args.workers}, rate limit: {rate_limit}")
+    for pct in (50, 95, 99):
+        value = percentile(latencies, pct)
+        print(
+            f"p{pct} latency: {value:.1f} ms" if value is not None else f"p{pct}: n/a"
+        )
+    print(f"Prompt tokens: {prompt_tokens}, completion tokens: {completion_tokens}")
+    print(f"Completion tokens/sec: {completion_tokens / elapsed:.1f}")
+    print(f"Errors: {sum(errors.values())}")
+    for name, count in errors.most_common():
+        print(f"  {name}: {count}")
+    print(f"Results written to {args.output}")
+
+
+def parse_args():
+    """
+    Parses command-line options. Without --batch the interactive prompt loop runs.
+    """
+    parser = argparse.ArgumentParser(description="OpenAI API CLI Testing Tool")
+    parser.add_argument("--batch", help="JSONL file of prompts to run concurrently")
+    parser.add_argument("--output", default="results.jsonl")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=0.0)
+    parser.add_argument("--model", default="gpt-3.5-turbo")
+    parser.add_argument("--temperature", type=float, default=0.7)
+    parser.add_argument("--max-tokens", type=int, default=150)
+    parser.add_argument("--max-retries", type=int, default=0)
+    parser.add_argument("--support-guide", action="store_true")
+    parser.add_argument("--top-k", type=int, default=3)
+    return parser.parse_args()
+
+
 def main():
     """
     Main function to run the CLI tool.
     """
+    args = parse_args()
+    if args.batch:
+        run_batch(args)
+        return
+
     print("OpenAI API Test CLI")
     print("Type 'exit' to quit at any time.")
 
@@ -11,20 +11,38 @@ from flask_migrate import current
 from pydantic import conset
 
 load_dotenv()
+import functools
+import json
 import logging
+import math
 import os
+import time
 
 import bcrypt
 from flask import Flask, render_template, send_from_directory
 from openai import OpenAI
 
-client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
 import traceback
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
-
-from config import api, app, db, ma, openai_client
-from flask import jsonify, make_response, request, session
+from urllib.parse import urlsplit
+
+from chat_jobs import QUEUED, RUNNING, create_chat_job_queue
+from chat_socket import ChatSocket, ChatSocketRegistry
+from chat_writer import create_chat_writer
+from completion_cache import create_completion_cache, is_standalone, make_cache_key
+from config import api, app, db, ma, openai_client, password_hasher, sock
+from context_builder import build_context, count_tokens
+from context_cache import ConversationContextCache
+from faq_miner import create_faq_index
+from flask import (
+    Response,
+    jsonify,
+    make_response,
+    request,
+    session,
+    stream_with_context,
+)
 from flask_bcrypt import Bcrypt
 from flask_marshmallow import fields
 from flask_restful import Resource
@@ -33,6 +51,7 @@ from marshmallow import Schema, ValidationError, fields, validate
 from models import (
     ChatMessage,
     Color,
+    ConversationSummary,
     Order,
     OrderDetail,
     Product,
@@ -42,8 +61,30 @@ from models import (
     db,
 )
 from openai import OpenAI
+from password_hasher import PasswordHasherBusy
+from prefilter import create_prefilter
+from profile_cache import ProfileCache
+from prompt_store import PromptStore
+from rate_limiter import RateLimited, create_auth_throttle, create_rate_limiter
+from resilience import UpstreamUnavailable, create_upstream_guard
+from session_store import init_session_store
+from simple_websocket import ConnectionClosed
+from single_flight import SingleFlight
+from sqlalchemy import tuple_
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.exc import IntegrityError
+from summarizer import ConversationSummarizer
+from usage_meter import (
+    BYPASS,
+    COALESCED,
+    FAQ,
+    GROUP_BY,
+    HIT,
+    MISS,
+    SORT_BY,
+    create_usage_meter,
+    usage_rollup,
+)
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 DATABASE = os.environ.get(
@@ -56,16 +97,62 @@ DATABASE_URI = os.getenv("DATABASE_URI")
 
 app.config.update(
     SECRET_KEY=SECRET_KEY,
-    SESSION_TYPE="filesystem",
     SQLALCHEMY_DATABASE_URI=DATABASE_URI,
     SQLALCHEMY_TRACK_MODIFICATIONS=False,
 )
 
+session_store = init_session_store(app)
 bcrypt = Bcrypt(app)
-client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+client = openai_client
 
 script_dir = Path(__file__).parent
 file_path = script_dir / "data" / "support_guide.txt"
+support_guide_store = PromptStore(
+    file_path,
+    check_interval=app.config["SUPPORT_GUIDE_CHECK_INTERVAL"],
+    core_sections=app.config["SUPPORT_GUIDE_CORE_SECTIONS"],
+)
+completion_cache = create_completion_cache(app.config)
+# Coalesces concurrent cache misses for the same completion key into one upstream call in
+# this process; a shared cache (CHAT_CACHE_BACKEND "filesystem") extends it across workers
+in_flight_completions = SingleFlight()
+context_cache = ConversationContextCache(max_turns=app.config["CHAT_CONTEXT_TURNS"])
+profile_cache = ProfileCache(
+    ttl=app.config["PROFILE_CACHE_TTL"], max_users=app.config["PROFILE_CACHE_MAX_USERS"]
+)
+upstream_guard = create_upstream_guard(
+    app.config,
+    retry_on=(
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.RateLimitError,
+        openai.InternalServerError,
+    ),
+)
+usage_meter = create_usage_meter(app)
+summarizer = ConversationSummarizer(
+    app,
+    client,
+    refresh_every=app.config["CHAT_SUMMARY_EVERY"],
+    keep_recent=app.config["CHAT_CONTEXT_TURNS"],
+    max_tokens=app.config["CHAT_SUMMARY_MAX_TOKENS"],
+    on_refresh=context_cache.set_summary,
+    guard=upstream_guard,
+    meter=usage_meter,
+)
+chat_jobs = create_chat_job_queue(app)
+prefilter = create_prefilter(app.config)
+faq_index = create_faq_index(app.config)
+rate_limiter = create_rate_limiter(app.config)
+auth_throttle = create_auth_throttle(app.config)
+# Open WebSocket chat connections of this process, by user
+chat_sockets = ChatSocketRegistry()
+
+# Reply sent while the model API is unavailable or shedding load
+FALLBACK_REPLY = (
+    "I'm sorry, our support assistant is temporarily unavailable. Please try again in "
+    "a few moments. I'm here to help with your VisionX phone as soon as I'm back."
+)
 
 
 @app.route("/")
@@ -100,16 +187,146 @@ class UserAuthSchema(ma.SQLAlchemyAutoSchema):
     )
 
 
+def password_hashing(method):
+    """
+    Resource method decorator answering PasswordHasherBusy with a 503 JSON response and a
+    Retry-After header, without logging an error for each refused request.
+    """
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        except PasswordHasherBusy as e:
+            response = make_response(jsonify({"error": e.description}), 503)
+            response.headers["Retry-After"] = str(e.retry_after)
+            return response
+
+    return wrapper
+
+
+def check_auth_throttle(**keys):
+    """
+    Takes a sign-in attempt from the throttle buckets named by keys, e.g.
+    check_auth_throttle(ip=..., username=...). Called before any database or password
+    hashing work, so refused attempts cost next to nothing.
+
+    Returns:
+    Response: A 429 response with Retry-After if the attempt is throttled, else None.
+    """
+    if not auth_throttle:
+        return None
+    try:
+        auth_throttle.acquire(**keys)
+    except RateLimited as e:
+        logging.info(f"Sign-in throttle {e.limit} reached from {request.remote_addr}")
+        return too_many_requests(
+            {
+                "error": "Too many attempts, please try again later.",
+                "limit": e.limit,
+                "retry_after": max(1, math.ceil(e.retry_after)),
+            }
+        )
+    return None
+
+
+# Largest value of an Integer primary key column
+MAX_ROW_ID = 2**31 - 1
+
+
+def parse_row_id(text):
+    """
+    Parses a row id from a pagination cursor. Returns None unless it is a positive integer
+    that fits an Integer column.
+    """
+    try:
+        row_id = int(text)
+    except ValueError:
+        return None
+    return row_id if 0 < row_id <= MAX_ROW_ID else None
+
+
+def username_sort_key():
+    """
+    Returns the username column as compared by the user listing: under the C collation on
+    PostgreSQL, matching ix_user_auth_username_c_id, and as is on SQLite, which compares
+    text bytewise.
+    """
+    if db.engine.dialect.name == "postgresql":
+        return UserAuth.username.collate("C")
+    return UserAuth.username
+
+
 class UserAuthResource(Resource):
     """
     RESTful resource for managing UserAuth entities, supporting operations like retrieval, creation, and deletion of user accounts.
     """
 
+    method_decorators = [password_hashing]
+
     def get(self):
-        """Fetches and returns all user accounts, excluding sensitive password hashes."""
-        users = UserAuth.query.all()
-        user_schema = UserAuthSchema(many=True, only=["id", "username", "email"])
-        return make_response(jsonify(user_schema.dump(users)), 200)
+        """
+        Returns a page of user accounts in id order, excluding sensitive password hashes.
+
+        When more accounts remain, the response carries a next_cursor; pass it back as
+        ?cursor= to get the following page. ?limit= sets the page size, up to
+        USER_LIST_MAX_PAGE_SIZE, and ?username_prefix= lists only usernames starting
+        with it, in username order. Malformed or out-of-range cursors get a 400.
+        """
+        limit = request.args.get("limit", app.config["USER_LIST_PAGE_SIZE"], type=int)
+        limit = max(1, min(limit, app.config["USER_LIST_MAX_PAGE_SIZE"]))
+
+        # Only the listed columns are selected; no UserAuth objects are loaded
+        query = db.session.query(UserAuth.id, UserAuth.username, UserAuth.email)
+        cursor = request.args.get("cursor")
+        prefix = request.args.get("username_prefix", "").lower()
+
+        if prefix:
+            # Filter, order and cursor all use the (username, id) key, so a prefix search
+            # is one range scan of ix_user_auth_username_c_id on PostgreSQL
+            username = username_sort_key()
+            order = (username, UserAuth.id)
+            query = query.filter(username.startswith(prefix, autoescape=True))
+            if cursor:
+                # Cursors are "<id>:<username>" of the last account already returned
+                cursor_id, _, cursor_username = cursor.partition(":")
+                cursor_id = parse_row_id(cursor_id)
+                if cursor_id is None or not cursor_username:
+                    return make_response(jsonify({"error": "Invalid cursor."}), 400)
+                query = query.filter(
+                    tuple_(username, UserAuth.id) > tuple_(cursor_username, cursor_id)
+                )
+        else:
+            order = (UserAuth.id,)
+            if cursor:
+                # Cursors are the id of the last account already returned
+                cursor_id = parse_row_id(cursor)
+                if cursor_id is None:
+                    return make_response(jsonify({"error": "Invalid cursor."}), 400)
+                query = query.filter(UserAuth.id > cursor_id)
+
+        # One extra row tells whether another page exists
+        rows = query.order_by(*order).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        next_cursor = None
+        if has_more:
+            last = rows[-1]
+            next_cursor = f"{last.id}:{last.username}" if prefix else str(last.id)
+
+        return make_response(
+            jsonify(
+                {
+                    "users": [
+                        {"id": row.id, "username": row.username, "email": row.email}
+                        for row in rows
+                    ],
+                    "next_cursor": next_cursor,
+                }
+            ),
+            200,
+        )
 
     def post(self):
         """Creates a new user account with provided username, email, and password."""
@@ -127,6 +344,10 @@ class UserAuthResource(Resource):
                 jsonify({"error": "Missing username, email, or password"}), 400
             )
 
+        throttled = check_auth_throttle(register_ip=request.remote_addr)
+        if throttled:
+            return throttled
+
         if len(password) < 6:
             return make_response(
                 jsonify({"error": "Password must be at least 6 characters long"}), 400
@@ -138,7 +359,7 @@ class UserAuthResource(Resource):
         if UserAuth.query.filter_by(email=email).first():
             return make_response(jsonify({"error": "Email already exists"}), 409)
 
-        hashed_password = bcrypt.generate_password_hash(password).decode("utf-8")
+        hashed_password = password_hasher.hash(password)
 
         new_user = UserAuth(
             username=username, email=email, password_hash=hashed_password
@@ -156,6 +377,7 @@ class UserAuthResource(Resource):
         session["username"] = new_user.username
         session["logged_in"] = True
         session["session_id"] = new_user_session.id
+        profile_cache.store(new_user)
 
         return make_response(
             jsonify(
@@ -182,17 +404,28 @@ class UserAuthResource(Resource):
             username = data["username"].lower()
             password = data["password"]
 
+            throttled = check_auth_throttle(ip=request.remote_addr, username=username)
+            if throttled:
+                return throttled
+
             user = UserAuth.query.filter_by(username=username).first()
 
-            if user and bcrypt.check_password_hash(user.password_hash, password):
+            if user and password_hasher.verify(user.password_hash, password):
+                # Buffered turns would otherwise be inserted after their user is gone
+                flush_pending_chat_messages(user.id)
                 db.session.delete(user)
                 db.session.commit()
+                context_cache.invalidate(user.id)
+                profile_cache.invalidate(user.id)
+                chat_sockets.close_user(user.id)
                 session.clear()
                 return make_response({"message": "User deleted successfully"}, 200)
             elif user:
                 return make_response({"error": "Incorrect password"}, 401)
             else:
                 return make_response({"error": "User not found"}, 404)
+        except PasswordHasherBusy:
+            raise
         except Exception as error:
             return make_response({"error": str(error)}, 500)
 
@@ -200,12 +433,15 @@ class UserAuthResource(Resource):
         """Updates a user's password after verifying the current password."""
         data = request.get_json()
         username = data["username"].lower()
+        throttled = check_auth_throttle(ip=request.remote_addr, username=username)
+        if throttled:
+            return throttled
+
         user = UserAuth.query.filter_by(username=username).first()
-        if user and bcrypt.check_password_hash(user.password_hash, data["password"]):
-            user.password_hash = bcrypt.generate_password_hash(
-                data["newPassword"]
-            ).decode("utf-8")
+        if user and password_hasher.verify(user.password_hash, data["password"]):
+            user.password_hash = password_hasher.hash(data["newPassword"])
             db.session.commit()
+            profile_cache.invalidate(user.id)
             return make_response({"message": "Password updated successfully"}, 200)
         else:
             return make_response({"error": "Invalid credentials"}, 401)
@@ -217,6 +453,8 @@ class UserLoginResource(Resource):
     Successful login creates a user session.
     """
 
+    method_decorators = [password_hashing]
+
     def post(self):
         """Authenticates user with provided username and password, creating a session on success."""
 
@@ -226,7 +464,12 @@ class UserLoginResource(Resource):
                 jsonify({"error": "Username and password are required"}), 400
             )
 
-        user = UserAuth.query.filter_by(username=data["username"].lower()).first()
+        username = data["username"].lower()
+        throttled = check_auth_throttle(ip=request.remote_addr, username=username)
+        if throttled:
+            return throttled
+
+        user = UserAuth.query.filter_by(username=username).first()
         if user and user.check_password(
             data["password"]
         ):  # Utilize the check_password method of the UserAuth model
@@ -234,14 +477,20 @@ class UserLoginResource(Resource):
             session["username"] = user.username
             session["logged_in"] = True
 
+            # Upgrade a hash made with another bcrypt cost while the password is at hand
+            if password_hasher.needs_rehash(user.password_hash):
+                user.password_hash = password_hasher.rehash(data["password"])
+
             # Create a new UserSession instance
             new_user_session = UserSession(
                 user_id=user.id, started_at=datetime.utcnow()
             )
             db.session.add(new_user_session)
             db.session.commit()
+            context_cache.invalidate(user.id)
 
             session["session_id"] = new_user_session.id
+            profile_cache.store(user)
 
             response_data = {
                 "message": "Login successful",
@@ -279,6 +528,9 @@ class UserLogoutResource(Resource):
             if current_session:
                 current_session.ended_at = datetime.utcnow()
                 db.session.commit()
+            context_cache.invalidate(user_id)
+            profile_cache.invalidate(user_id)
+            chat_sockets.close_user(user_id)
 
         session.clear()
 
@@ -290,6 +542,8 @@ class UserLogoutResource(Resource):
 class SessionCheckResource(Resource):
     """
     Checks if there's an active session, indicating an authenticated user.
+    The user's profile is served from the per-process profile cache while it is fresh,
+    so most checks do not query UserAuth.
     """
 
     def get(self):
@@ -297,30 +551,35 @@ class SessionCheckResource(Resource):
 
         try:
             user_id = session.get("user_id")
-            if user_id:
-                user = UserAuth.query.get(user_id)
-                if user:
-                    return (
-                        jsonify(
-                            {
-                                "authenticated": True,
-                                "id": user.id,
-                                "username": user.username,
-                                "email": user.email,
-                            }
-                        ),
-                        200,
-                    )
-                else:
-                    return (
+            if not user_id:
+                return make_response(jsonify({"authenticated": False}), 200)
+
+            profile = profile_cache.get(user_id)
+            if profile is None:
+                user = db.session.get(UserAuth, user_id)
+                if not user:
+                    return make_response(
                         jsonify({"authenticated": False, "message": "User not found"}),
                         404,
                     )
-            else:
-                return jsonify({"authenticated": False}), 200
+                profile = profile_cache.store(user)
+
+            return make_response(
+                jsonify(
+                    {
+                        "authenticated": True,
+                        "id": profile["id"],
+                        "username": profile["username"],
+                        "email": profile["email"],
+                    }
+                ),
+                200,
+            )
         except Exception as e:
             logging.error(f"Error in SessionCheckResource: {str(e)}")
-            return jsonify({"error": "Internal server error", "details": str(e)}), 500
+            return make_response(
+                jsonify({"error": "Internal server error", "details": str(e)}), 500
+            )
 
 
 # Shipping Information Resources
@@ -691,9 +950,11 @@ chat_message_schema = ChatMessageSchema()
 
 def read_support_guide(file_path=file_path):
     """
-    Reads the support guide from a specified file path, providing a system message
-    to be included in chat sessions for guidance.
+    Returns the support guide text, providing a system message to be included in chat
+    sessions for guidance. The default guide is served from the in-memory prompt store.
     """
+    if Path(file_path) == support_guide_store.path:
+        return support_guide_store.text()
     try:
         with open(file_path, "r", encoding="utf-8") as file:
             support_guide = file.read()
@@ -705,138 +966,1003 @@ def read_support_guide(file_path=file_path):
     return ""
 
 
-def get_completion(
-    user_id, user_message, model="gpt-3.5-turbo", temperature=0.7, max_tokens=150
-):
+def get_user_context(user_id, session_id=None):
     """
-    Fetches AI-generated responses based on the user's message and preceding chat context.
-    Utilizes OpenAI's API to generate responses tailored to the conversation flow.
+    Returns the user's recent conversation turns, open session id and session summary,
+    loading them from the database only when they are not already cached.
+
+    Args:
+    user_id (int): The user whose context to return.
+    session_id (int): The UserSession of the user's Flask session, if known. A cached
+    context for another session, left behind by a login or logout served by another
+    worker, is reloaded.
     """
-    # Retrieve the last three messages for context
+    context = context_cache.get(user_id, session_id)
+    if context is not None:
+        return context
+
+    # Retrieve the most recent messages for context
+    flush_pending_chat_messages(user_id)
     last_messages = (
         ChatMessage.query.filter_by(user_id=user_id)
         .order_by(ChatMessage.timestamp.desc())
-        .limit(3)
+        .limit(context_cache.max_turns)
         .all()
     )
-    support_guide = read_support_guide()
+    session_id = session_id or get_open_session_id(user_id)
+    summary = (
+        ConversationSummary.query.filter_by(session_id=session_id).first()
+        if session_id
+        else None
+    )
+    return context_cache.load(
+        user_id,
+        session_id,
+        [(msg.message, msg.response) for msg in reversed(last_messages)],
+        summary.summary if summary else None,
+    )
 
-    # Construct the message payload including the system message, previous messages, and the current user message
-    messages = (
-        [
-            {"role": "system", "content": support_guide},
-        ]
-        + [
-            {
-                "role": "user" if msg.user_id == user_id else "assistant",
-                "content": msg.message or msg.response,
-            }
-            for msg in reversed(last_messages)
-        ]
-        + [
-            {"role": "user", "content": user_message},
-        ]
+
+def build_chat_messages(user_id, user_message, with_history=True):
+    """
+    Builds the message payload sent to OpenAI: the support guide sections relevant to the
+    user's message as the system message, the rolling summary of the session's older turns,
+    as many of the user's recent turns as fit the prompt token budget, and the current
+    user message. Without history only the system and user messages are sent.
+
+    Returns a tuple of the messages and their estimated prompt token count.
+    """
+    system_message = support_guide_store.system_message_for(
+        user_message, app.config["SUPPORT_GUIDE_TOP_K"]
     )
+    if not with_history:
+        return build_context(
+            system_message, (), user_message, app.config["CHAT_PROMPT_TOKEN_BUDGET"]
+        )
+    context = get_user_context(user_id)
+    return build_context(
+        system_message,
+        context.turns,
+        user_message,
+        app.config["CHAT_PROMPT_TOKEN_BUDGET"],
+        summary=context.summary,
+    )
+
+
+def prepare_chat_call(user_id, user_message, model, temperature, max_tokens, use_cache):
+    """
+    Builds the message payload of a chat call and its completion cache key.
 
+    Standalone messages (see completion_cache.is_standalone) are sent without the
+    conversation history and keyed on the normalized message, model parameters and
+    system message alone, so the same question from any user shares one cache
+    entry and one in-flight call. Follow-ups are sent with the history and bypass the
+    cache, since their replies depend on the conversation.
+
+    Returns:
+    tuple: (messages, estimated prompt tokens, cache key or None when not cacheable).
+    """
+    if use_cache and is_standalone(user_message):
+        messages, prompt_tokens = build_chat_messages(
+            user_id, user_message, with_history=False
+        )
+        cache_key = make_cache_key(
+            user_message,
+            model,
+            temperature,
+            max_tokens,
+            messages[0]["content"],
+        )
+        return messages, prompt_tokens, cache_key
+    messages, prompt_tokens = build_chat_messages(user_id, user_message)
+    return messages, prompt_tokens, None
+
+
+def new_usage(model, cache_status, streamed=False):
+    """
+    Returns an empty usage record for a chat model call.
+    """
+    return {
+        "call_type": "chat",
+        "model": model,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "tokens_estimated": False,
+        "latency_ms": 0,
+        "cache_status": cache_status,
+        "streamed": streamed,
+    }
+
+
+def get_completion(
+    user_id,
+    user_message,
+    model="gpt-3.5-turbo",
+    temperature=0.7,
+    max_tokens=None,
+    use_cache=True,
+    usage=None,
+):
+    """
+    Fetches AI-generated responses based on the user's message and preceding chat context.
+    Utilizes OpenAI's API to generate responses tailored to the conversation flow.
+    Replies to standalone questions are served from and stored in the completion cache
+    unless use_cache is False (see prepare_chat_call); concurrent misses for the same key
+    share a single upstream call.
+    max_tokens defaults to the CHAT_MAX_TOKENS setting.
+
+    When a usage dict is passed it is filled with the call's model, token counts,
+    latency and cache status, ready for usage_meter.record().
+
+    Raises UpstreamUnavailable when the call is shed by the upstream guard or fails
+    after its retries.
+    """
+    started = time.perf_counter()
+    call = new_usage(model, MISS if use_cache else BYPASS)
     try:
-        # Generate the completion using the OpenAI API
-        response = client.chat.completions.create(
+        return fetch_completion(
+            user_id, user_message, model, temperature, max_tokens, use_cache, call
+        )
+    finally:
+        charge_tokens(user_id, call)
+        if usage is not None:
+            call["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            usage.update(call)
+
+
+def fetch_completion(
+    user_id, user_message, model, temperature, max_tokens, use_cache, call
+):
+    """
+    Cache lookup and upstream call behind get_completion. Token counts and the cache
+    status are written to the call usage record.
+    """
+    max_tokens = max_tokens or app.config["CHAT_MAX_TOKENS"]
+    messages, prompt_tokens, cache_key = prepare_chat_call(
+        user_id, user_message, model, temperature, max_tokens, use_cache
+    )
+    logging.debug(f"Chat prompt for user {user_id}: {prompt_tokens} tokens")
+
+    if cache_key is None:
+        call["cache_status"] = BYPASS
+    else:
+        cached = completion_cache.get(cache_key)
+        if cached is not None:
+            call["cache_status"] = HIT
+            return cached
+
+    def create(timeout):
+        return client.with_options(
+            timeout=timeout, max_retries=0
+        ).chat.completions.create(
             model=model,
             messages=messages,
             temperature=temperature,
             max_tokens=max_tokens,
         )
+
+    leader = []
+
+    def fetch():
+        # Generate the completion using the OpenAI API
+        leader.append(True)
+        response = upstream_guard.call(create)
+        if response.usage:
+            call["prompt_tokens"] = response.usage.prompt_tokens
+            call["completion_tokens"] = response.usage.completion_tokens
+            call["total_tokens"] = response.usage.total_tokens
         if response.choices and response.choices[0].message:
-            return response.choices[0].message.content.strip()
+            ai_response = response.choices[0].message.content.strip()
+            if cache_key is not None:
+                completion_cache.set(cache_key, ai_response)
+            return ai_response
+        return None
+
+    def fetch_shared():
+        # Wait for another worker already fetching this completion, if any
+        timeout = app.config["CHAT_CACHE_PENDING_TIMEOUT"]
+        if not completion_cache.claim(cache_key, timeout):
+            result = completion_cache.wait(cache_key, timeout)
+            return result if result is not None else fetch()
+        try:
+            return fetch()
+        finally:
+            completion_cache.release(cache_key)
+
+    try:
+        if cache_key is not None:
+            result = in_flight_completions.do(cache_key, fetch_shared)
+            if not leader:
+                # The tokens were spent, and are metered, by the call that was in flight
+                call["cache_status"] = COALESCED
+            return result
+        return fetch()
+    except UpstreamUnavailable:
+        raise
     except Exception as e:
         print(f"Error: {e}")
     return None
 
 
-@app.route("/api/chat_messages", methods=["POST"])
-def chat():
+def stream_completion(
+    user_id,
+    user_message,
+    model="gpt-3.5-turbo",
+    temperature=0.7,
+    max_tokens=None,
+    use_cache=True,
+    usage=None,
+):
     """
-    Endpoint to handle the posting of new chat messages. Processes the user's message,
-    generates an AI response, and stores the conversation in the database.
+    Streaming counterpart of get_completion. Yields response text fragments as
+    OpenAI produces them so callers can relay tokens before the reply is complete.
+    A cached response is yielded as a single fragment.
+
+    A usage dict, when passed, is filled in once the stream ends. Streamed responses
+    carry no usage from the API, so their token counts are estimated locally.
+
+    Raises UpstreamUnavailable when the call is shed by the upstream guard or fails
+    before the first fragment.
     """
-    user_id = session.get("user_id")
-    if not user_id:
-        return jsonify({"error": "You must be signed in to send messages."}), 403
+    started = time.perf_counter()
+    call = new_usage(model, MISS if use_cache else BYPASS, streamed=True)
+    max_tokens = max_tokens or app.config["CHAT_MAX_TOKENS"]
+    messages, prompt_tokens, cache_key = prepare_chat_call(
+        user_id, user_message, model, temperature, max_tokens, use_cache
+    )
+    logging.debug(f"Chat prompt for user {user_id}: {prompt_tokens} tokens")
 
+    if cache_key is None:
+        call["cache_status"] = BYPASS
+    else:
+        cached = completion_cache.get(cache_key)
+        if cached is not None:
+            call["cache_status"] = HIT
+            if usage is not None:
+                call["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                usage.update(call)
+            yield cached
+            return
+
+    def create(timeout):
+        return client.with_options(
+            timeout=timeout, max_retries=0
+        ).chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+        )
+
+    fragments = []
+    try:
+        for chunk in upstream_guard.stream(create):
+            if chunk.choices and chunk.choices[0].delta.content:
+                fragments.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+    finally:
+        completion_tokens = count_tokens("".join(fragments))
+        call.update(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+            tokens_estimated=True,
+            latency_ms=round((time.perf_counter() - started) * 1000, 1),
+        )
+        charge_tokens(user_id, call)
+        if usage is not None:
+            usage.update(call)
+
+    ai_response = "".join(fragments).strip()
+    if ai_response and cache_key is not None:
+        completion_cache.set(cache_key, ai_response)
+
+
+def charge_tokens(user_id, call):
+    """
+    Charges the tokens of a model call against the user's and the global token limits.
+    Cache hits and coalesced calls spent no tokens of their own and are free.
+    """
+    if rate_limiter and call["cache_status"] in (MISS, BYPASS):
+        rate_limiter.charge(user_id, call["total_tokens"])
+
+
+def acquire_chat_turn(user_id):
+    """
+    Takes a chat turn from the user's and the global turn limits.
+
+    Returns:
+    dict: The error payload, with the limit hit and whole seconds to wait, if the turn
+    is over a limit; None if it may proceed.
+    """
+    if not rate_limiter:
+        return None
+    try:
+        rate_limiter.acquire(user_id)
+    except RateLimited as e:
+        logging.info(f"Chat rate limit {e.limit} reached for user {user_id}")
+        return {
+            "error": "Too many chat requests, please try again shortly.",
+            "limit": e.limit,
+            "retry_after": max(1, math.ceil(e.retry_after)),
+        }
+    return None
+
+
+def check_rate_limit(user_id):
+    """
+    Takes a chat turn from the user's and the global turn limits.
+
+    Returns:
+    Response: A 429 response with Retry-After if the turn is over a limit, else None.
+    """
+    limited = acquire_chat_turn(user_id)
+    if not limited:
+        return None
+    return too_many_requests(limited)
+
+
+def too_many_requests(payload):
+    """Returns a 429 JSON response for payload, with its retry_after as Retry-After."""
+    response = jsonify(payload)
+    response.status_code = 429
+    response.headers["Retry-After"] = str(payload["retry_after"])
+    return response
+
+
+def wants_cached_response(data):
+    """
+    Returns False when the request opts out of the completion cache, either with
+    "cache": false in the JSON body or a "Cache-Control: no-cache" header.
+    """
+    if data.get("cache") is False:
+        return False
+    return "no-cache" not in request.headers.get("Cache-Control", "")
+
+
+def sse_event(data, event=None):
+    """
+    Formats a payload as a single Server-Sent Events frame.
+    """
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+
+def get_open_session_id(user_id):
+    """
+    Returns the id of the user's most recent open UserSession, or None.
+    """
     current_session = (
         UserSession.query.filter_by(user_id=user_id, ended_at=None)
         .order_by(UserSession.started_at.desc())
         .first()
     )
-    session_id = current_session.id if current_session else None
+    return current_session.id if current_session else None
 
-    data = request.json
-    user_message = data.get("message")
-    if not user_message:
-        return jsonify({"error": "No message provided."}), 400
 
-    ai_response = get_completion(user_id, user_message)
+def record_usage(usage, user_id, session_id, chat_message=None, success=True):
+    """
+    Queues a chat call's usage record for the usage meter, linked to the stored
+    ChatMessage when there is one.
+    """
+    if not usage:
+        return
+    usage_meter.record(
+        user_id=user_id,
+        session_id=session_id,
+        chat_message_id=chat_message.id if chat_message else None,
+        success=success,
+        **usage,
+    )
 
-    if ai_response:
+
+def record_written_usage(chat_messages):
+    """
+    Records the usage of chat turns once the write-behind writer has inserted them.
+    """
+    for chat_message in chat_messages:
+        record_usage(
+            chat_message.usage,
+            chat_message.user_id,
+            chat_message.session_id,
+            chat_message,
+        )
+
+
+# Buffers chat turns for batched inserts when CHAT_WRITE_BEHIND is on; None otherwise
+chat_writer = create_chat_writer(app, on_written=record_written_usage)
+
+
+def flush_pending_chat_messages(user_id):
+    """
+    Writes the user's buffered chat turns, if any, so database reads see them.
+    """
+    if chat_writer:
+        chat_writer.flush_user(user_id)
+
+
+def store_chat_turn(user_id, session_id, user_message, ai_response, usage=None):
+    """
+    Stores a completed chat turn, records it in the user's cached context and records
+    the call's usage against it. Returns the serialized chat message.
+
+    With write-behind enabled the turn is buffered for a batched insert and the returned
+    message has no id yet.
+    """
+    if chat_writer:
+        new_chat_message = chat_writer.add(
+            user_id, session_id, user_message, ai_response, usage
+        )
+        payload = chat_message_schema.dump(new_chat_message)
+    else:
         new_chat_message = ChatMessage(
             user_id=user_id,
             session_id=session_id,
             message=user_message,
             response=ai_response,
         )
-
         db.session.add(new_chat_message)
+        # Serialize after the flush assigns the id but before the commit expires the
+        # instance, so the response needs no reload query
+        db.session.flush()
+        payload = chat_message_schema.dump(new_chat_message)
         db.session.commit()
+        record_usage(usage, user_id, session_id, new_chat_message)
 
-        result = chat_message_schema.dump(new_chat_message)
-        return jsonify(result), 200
+    context_cache.append(user_id, session_id, user_message, ai_response)
+    summarizer.schedule(session_id)
+    return payload
+
+
+def answer_from_faq(user_message, use_cache=True):
+    """
+    Looks the message up in the mined FAQ clusters. Requests that opt out of the
+    completion cache skip the FAQ as well, and so do follow-ups, whose answer depends
+    on the conversation history.
+
+    Returns:
+    tuple: (answer, usage record) for a matching cluster, or None.
+    """
+    if not faq_index or not use_cache or not is_standalone(user_message):
+        return None
+    started = time.perf_counter()
+    match = faq_index.match(user_message)
+    if match is None:
+        return None
+    cluster_id, answer, similarity = match
+    logging.debug(f"FAQ cluster {cluster_id} matched with similarity {similarity:.3f}")
+    usage = new_usage(f"faq:{cluster_id}", FAQ)
+    usage["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return answer, usage
+
+
+def complete_chat_turn(user_id, session_id, user_message, use_cache=True):
+    """
+    Generates the AI response to a user's message and stores the conversation turn.
+    Shared by the synchronous endpoint and background chat jobs.
+
+    Messages the pre-filter rejects get its templated reply and are not stored.
+    Standalone messages matching a mined FAQ cluster get the cluster's answer without a
+    model call.
+
+    Returns:
+    tuple: (response payload, HTTP status code).
+    """
+    decision = prefilter.check(user_id, user_message)
+    if decision.blocked:
+        return {"response": decision.reply, "prefilter": decision.label}, 200
+
+    faq = answer_from_faq(user_message, use_cache)
+    if faq:
+        answer, usage = faq
+        payload = store_chat_turn(user_id, session_id, user_message, answer, usage)
+        return payload, 200
+
+    usage = {}
+    try:
+        ai_response = get_completion(
+            user_id, user_message, use_cache=use_cache, usage=usage
+        )
+    except UpstreamUnavailable as e:
+        logging.warning(f"Chat fallback for user {user_id}: {e.reason}")
+        record_usage(usage, user_id, session_id, success=False)
+        return {"response": FALLBACK_REPLY, "fallback": True}, 200
+
+    if ai_response:
+        payload = store_chat_turn(user_id, session_id, user_message, ai_response, usage)
+        return payload, 200
     else:
-        return jsonify({"error": "Failed to get response from AI"}), 500
+        record_usage(usage, user_id, session_id, success=False)
+        return {"error": "Failed to get response from AI"}, 500
 
 
-@app.route("/api/continue_last_conversation", methods=["GET"])
-def continue_last_conversation():
+@app.route("/api/chat_messages", methods=["POST"])
+def chat():
+    """
+    Endpoint to handle the posting of new chat messages. Processes the user's message,
+    generates an AI response, and stores the conversation in the database.
+
+    With "async": true in the JSON body the turn is queued as a background job instead,
+    and the response is 202 with the job id to poll at /api/chat_jobs/<job_id>.
+
+    Messages over a chat rate limit are refused with 429 and a Retry-After header.
+    """
     user_id = session.get("user_id")
     if not user_id:
-        return jsonify({"error": "User not logged in."}), 401
-    print("user_id", user_id)
+        return jsonify({"error": "You must be signed in to send messages."}), 403
 
-    last_session_id = (
-        db.session.query(ChatMessage.session_id)
-        .filter(ChatMessage.user_id == user_id)
-        .order_by(ChatMessage.timestamp.desc())
-        .first()
+    session_id = get_user_context(user_id, session.get("session_id")).session_id
+
+    data = request.json
+    user_message = data.get("message")
+    if not user_message:
+        return jsonify({"error": "No message provided."}), 400
+
+    limited = check_rate_limit(user_id)
+    if limited:
+        return limited
+
+    use_cache = wants_cached_response(data)
+
+    if data.get("async"):
+        job = chat_jobs.submit(
+            user_id, complete_chat_turn, user_id, session_id, user_message, use_cache
+        )
+        if job is None:
+            return jsonify({"error": "Chat is busy, please try again shortly."}), 503
+        return (
+            jsonify(
+                {
+                    "job_id": job["id"],
+                    "status": job["status"],
+                    "status_url": f"/api/chat_jobs/{job['id']}",
+                }
+            ),
+            202,
+        )
+
+    result, status = complete_chat_turn(user_id, session_id, user_message, use_cache)
+    return jsonify(result), status
+
+
+@app.route("/api/chat_jobs/<job_id>", methods=["GET"])
+def chat_job(job_id):
+    """
+    Returns the state of a chat job. With ?wait=<seconds> the request long-polls until the
+    job finishes or the wait (capped at CHAT_JOB_MAX_WAIT) runs out.
+
+    Responds 200 with the job and its result once finished, 202 while it is still queued
+    or running, and 404 for unknown, expired or other users' jobs.
+    """
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "You must be signed in to view chat jobs."}), 403
+
+    job = chat_jobs.get(job_id)
+    if not job or job["user_id"] != user_id:
+        return jsonify({"error": "Chat job not found."}), 404
+
+    wait = min(
+        request.args.get("wait", 0, type=float), app.config["CHAT_JOB_MAX_WAIT"]
     )
+    if wait > 0 and job["status"] in (QUEUED, RUNNING):
+        job = chat_jobs.wait(job_id, wait) or job
 
-    if not last_session_id:
-        return jsonify({"error": "No previous session found."}), 404
+    body = {"job_id": job["id"], "status": job["status"]}
+    if job["status"] in (QUEUED, RUNNING):
+        return jsonify(body), 202
+    body["http_status"] = job["http_status"]
+    body["result"] = job["result"]
+    return jsonify(body), 200
 
-    last_session_id = last_session_id[0]
-    last_session = UserSession.query.get(last_session_id)
 
-    if not last_session:
-        return jsonify({"error": "No previous session found."}), 404
+def chat_turn_events(user_id, session_id, user_message, use_cache=True):
+    """
+    Runs a chat turn for the streaming endpoints, yielding (event, data) pairs as the
+    reply is produced and storing the turn once it is complete. The events are those
+    documented on chat_stream(), with "message" for each response fragment.
+    """
+    decision = prefilter.check(user_id, user_message)
+    if decision.blocked:
+        yield "filtered", {"response": decision.reply, "prefilter": decision.label}
+        return
+
+    faq = answer_from_faq(user_message, use_cache)
+    if faq:
+        answer, usage = faq
+        yield "message", {"delta": answer}
+        payload = store_chat_turn(user_id, session_id, user_message, answer, usage)
+        yield "done", payload
+        return
+
+    fragments = []
+    usage = {}
+    try:
+        for fragment in stream_completion(
+            user_id, user_message, use_cache=use_cache, usage=usage
+        ):
+            fragments.append(fragment)
+            yield "message", {"delta": fragment}
+    except UpstreamUnavailable as e:
+        # A reply cut off mid-stream is discarded rather than stored as if complete
+        logging.warning(f"Chat fallback for user {user_id}: {e.reason}")
+        record_usage(usage, user_id, session_id, success=False)
+        yield "fallback", {"response": FALLBACK_REPLY, "partial": bool(fragments)}
+        return
+    except Exception:
+        logging.exception(f"Error streaming chat response for user {user_id}")
+        record_usage(usage, user_id, session_id, success=False)
+        yield "error", {
+            "error": "Failed to get response from AI",
+            "partial": bool(fragments),
+        }
+        return
+
+    ai_response = "".join(fragments).strip()
+    if not ai_response:
+        record_usage(usage, user_id, session_id, success=False)
+        yield "error", {"error": "Failed to get response from AI"}
+        return
+
+    payload = store_chat_turn(user_id, session_id, user_message, ai_response, usage)
+    yield "done", payload
+
+
+@app.route("/api/chat_messages/stream", methods=["POST"])
+def chat_stream():
+    """
+    Streaming variant of the chat endpoint. Relays the AI response as Server-Sent Events
+    while it is generated, then stores the full conversation turn once the stream finishes.
+    Messages over a chat rate limit are refused with 429 and a Retry-After header before
+    the stream starts.
+
+    Events:
+    - message: {"delta": "<text fragment>"} for each fragment of the response.
+    - done: the stored chat message, serialized like the /api/chat_messages response.
+    - fallback: {"response": FALLBACK_REPLY, "partial": <bool>} if the model API is
+      unavailable or fails mid-reply; nothing is stored. partial is true when fragments
+      were already sent and should be discarded.
+    - filtered: {"response": "<templated reply>", "prefilter": "<label>"} if the pre-filter
+      answered the message without the model; nothing is stored.
+    - error: {"error": "<message>", "partial": <bool>} if the response could not be
+      generated; nothing is stored.
+    """
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "You must be signed in to send messages."}), 403
 
-    print("last_session", last_session)
-    print("last_session.id", last_session.id)
+    session_id = get_user_context(user_id, session.get("session_id")).session_id
 
-    chat_messages = (
-        ChatMessage.query.filter_by(session_id=last_session_id)
-        .order_by(ChatMessage.timestamp.asc())
-        .all()
+    data = request.json
+    user_message = data.get("message")
+    if not user_message:
+        return jsonify({"error": "No message provided."}), 400
+
+    limited = check_rate_limit(user_id)
+    if limited:
+        return limited
+
+    use_cache = wants_cached_response(data)
+
+    def generate():
+        for event, data in chat_turn_events(
+            user_id, session_id, user_message, use_cache
+        ):
+            yield sse_event(data, None if event == "message" else event)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def socket_origin_allowed():
+    """
+    Returns True if the WebSocket handshake comes from the app's own host or an origin in
+    CHAT_SOCKET_ALLOWED_ORIGINS. Handshakes without an Origin header are not sent by
+    browsers, so they cannot carry a visitor's cookie on another site's behalf.
+    """
+    origin = request.headers.get("Origin")
+    if origin is None:
+        return True
+    origin = origin.rstrip("/").lower()
+    if urlsplit(origin).netloc == request.host.lower():
+        return True
+    return origin in app.config["CHAT_SOCKET_ALLOWED_ORIGINS"]
+
+
+@app.before_request
+def check_socket_origin():
+    """Refuses chat socket handshakes from other sites before the socket is accepted."""
+    if request.endpoint == "chat_channel" and not socket_origin_allowed():
+        logging.info(f"Refused chat socket from origin {request.headers['Origin']}")
+        return jsonify({"error": "Origin not allowed."}), 403
+
+
+def socket_sign_in_valid(session_key, user_id):
+    """
+    Returns True if a chat socket's sign-in still stands: its Flask session is still
+    stored for the user, which a logout in any worker ends, and the user still exists.
+    Sockets are only closed directly in the worker handling the logout or deletion.
+    """
+    data = app.session_interface.backend.load(session_key)
+    if not data or data.get("user_id") != user_id:
+        return False
+    return db.session.query(UserAuth.id).filter_by(id=user_id).first() is not None
+
+
+@sock.route("/api/chat_socket")
+def chat_channel(ws):
+    """
+    WebSocket chat channel. The user is authenticated from the session cookie sent with
+    the handshake, and the user and chat session are kept for the life of the connection.
+    Before each turn the sign-in is re-checked against the shared session store and the
+    database, so a logout or account deletion in any worker ends the socket.
+
+    Client frames are JSON objects {"message": "<text>", "cache": <bool, optional>}.
+    Server frames are JSON objects {"event": <name>, "data": <payload>}:
+    - ready: {"user_id": ..., "session_id": ...} once the socket is authenticated.
+    - message, done, fallback, filtered, error: as on /api/chat_messages/stream.
+    - rate_limited: {"error", "limit", "retry_after"} if the turn is over a chat rate
+      limit.
+    Other events may be pushed at any time with chat_sockets.push(). The socket is closed
+    with code 1008 if the user is not signed in or their sign-in has ended.
+    Handshakes from origins other than the app's own and CHAT_SOCKET_ALLOWED_ORIGINS are
+    refused with 403.
+    """
+    user_id = session.get("user_id")
+    if not user_id:
+        ws.close(reason=1008, message="You must be signed in to send messages.")
+        return
+
+    session_key = app.session_interface.key_prefix + session.sid
+    connection = ChatSocket(
+        ws, user_id, get_user_context(user_id, session.get("session_id")).session_id
     )
-    print("chat_messages", chat_messages)
+    chat_sockets.add(connection)
+    try:
+        connection.send(
+            "ready", {"user_id": user_id, "session_id": connection.session_id}
+        )
+        while True:
+            # Return the database connection to the pool while the socket waits for the
+            # next frame, instead of holding it open for the life of the socket
+            db.session.remove()
+            try:
+                data = json.loads(ws.receive())
+                user_message = data.get("message")
+            except (AttributeError, TypeError, ValueError):
+                user_message = None
+            if not user_message or not isinstance(user_message, str):
+                connection.send("error", {"error": "No message provided."})
+                continue
+
+            if not socket_sign_in_valid(session_key, user_id):
+                ws.close(reason=1008, message="Your session has ended.")
+                return
+
+            limited = acquire_chat_turn(user_id)
+            if limited:
+                connection.send("rate_limited", limited)
+                continue
+
+            connection.turns += 1
+            for event, payload in chat_turn_events(
+                user_id,
+                connection.session_id,
+                user_message,
+                data.get("cache") is not False,
+            ):
+                if not connection.send(event, payload):
+                    break
+    except ConnectionClosed:
+        pass
+    finally:
+        chat_sockets.remove(connection)
+        db.session.remove()
+
+
+@app.route("/api/continue_last_conversation", methods=["GET"])
+def continue_last_conversation():
+    """
+    Returns a page of the turns of the user's latest chat session, oldest first.
+
+    The first page holds the newest turns. When older turns remain, the response carries
+    a next_cursor; pass it back as ?cursor= to get the page before it. ?limit= sets the
+    page size in turns, up to CHAT_HISTORY_MAX_PAGE_SIZE.
+    """
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "User not logged in."}), 401
+
+    limit = request.args.get("limit", app.config["CHAT_HISTORY_PAGE_SIZE"], type=int)
+    limit = max(1, min(limit, app.config["CHAT_HISTORY_MAX_PAGE_SIZE"]))
+
+    flush_pending_chat_messages(user_id)
+    query = db.session.query(
+        ChatMessage.id,
+        ChatMessage.session_id,
+        ChatMessage.message,
+        ChatMessage.response,
+    ).filter(ChatMessage.user_id == user_id)
+
+    cursor = request.args.get("cursor")
+    if cursor:
+        # Cursors are "<session_id>:<id of the oldest turn already returned>"
+        try:
+            cursor_session_id, before_id = (int(part) for part in cursor.split(":"))
+        except ValueError:
+            return jsonify({"error": "Invalid cursor."}), 400
+        query = query.filter(
+            ChatMessage.session_id == cursor_session_id, ChatMessage.id < before_id
+        )
+    else:
+        latest_session_id = (
+            db.session.query(ChatMessage.session_id)
+            .filter(ChatMessage.user_id == user_id)
+            .order_by(ChatMessage.id.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        query = query.filter(ChatMessage.session_id == latest_session_id)
 
-    if not chat_messages:
-        return jsonify({"message": "No messages found in the last session."}), 200
+    # One extra row tells whether an older page exists
+    rows = query.order_by(ChatMessage.id.desc()).limit(limit + 1).all()
+    if not rows:
+        if cursor:
+            return jsonify({"session_id": cursor_session_id, "messages": []}), 200
+        return jsonify({"error": "No previous session found."}), 404
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    session_id = rows[0].session_id
 
     messages = []
-    for chat_message in chat_messages:
+    for chat_message in reversed(rows):
         user_message = {"sender": "user", "text": chat_message.message}
         ai_response = {"sender": "bot", "text": chat_message.response}
         messages.extend([user_message, ai_response])
 
-    return jsonify({"session_id": last_session.id, "messages": messages}), 200
+    return (
+        jsonify(
+            {
+                "session_id": session_id,
+                "messages": messages,
+                "next_cursor": f"{session_id}:{rows[-1].id}" if has_more else None,
+            }
+        ),
+        200,
+    )
+
+
+def is_admin(user_id):
+    """Returns True if user_id belongs to an account listed in ADMIN_USERNAMES."""
+    if not user_id or not app.config["ADMIN_USERNAMES"]:
+        return False
+    username = db.session.query(UserAuth.username).filter_by(id=user_id).scalar()
+    return username in app.config["ADMIN_USERNAMES"]
+
+
+def admin_required(view):
+    """
+    Route decorator refusing requests that are not signed in (401) or not from an
+    account listed in ADMIN_USERNAMES (403).
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        user_id = session.get("user_id")
+        if not user_id:
+            return jsonify({"error": "You must be signed in."}), 401
+        if not is_admin(user_id):
+            return jsonify({"error": "Administrator access required."}), 403
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+@app.route("/api/chat_metrics", methods=["GET"])
+@admin_required
+def chat_metrics():
+    """
+    Reports counters for the chat completion pipeline. Administrators only.
+    """
+    return (
+        jsonify(
+            {
+                "completion_cache": completion_cache.stats(),
+                "coalescing": in_flight_completions.stats(),
+                "context_cache": context_cache.stats(),
+                "upstream": upstream_guard.stats(),
+                "jobs": chat_jobs.stats(),
+                "usage_meter": usage_meter.stats(),
+                "chat_writer": chat_writer.stats() if chat_writer else None,
+                "prefilter": prefilter.stats(),
+                "faq": faq_index.stats() if faq_index else None,
+                "rate_limits": rate_limiter.stats() if rate_limiter else None,
+                "sockets": chat_sockets.stats(),
+            }
+        ),
+        200,
+    )
+
+
+@app.route("/api/auth_metrics", methods=["GET"])
+@admin_required
+def auth_metrics():
+    """
+    Reports counters for sign-in and account handling, including password hashing queue
+    wait and hash time, sign-in throttling and the profile cache. Administrators only.
+    """
+    return (
+        jsonify(
+            {
+                "password_hasher": password_hasher.stats(),
+                "profile_cache": profile_cache.stats(),
+                "throttles": auth_throttle.stats() if auth_throttle else None,
+            }
+        ),
+        200,
+    )
+
+
+@app.route("/api/chat_usage", methods=["GET"])
+def chat_usage():
+    """
+    Reports token usage and latency of model calls, rolled up per hour, user or session.
+    Administrators see every user's calls; other signed-in users only their own.
+
+    Query parameters:
+    - group_by: "hour" (default), "user" or "session".
+    - since / until: ISO timestamps (UTC); defaults to the last 24 hours.
+    - call_type: Optional filter, "chat" or "summary".
+    - sort: For user and session rollups, "tokens" (default), "latency" or "calls".
+    - limit: Maximum rows returned, up to 1000 (default 100).
+    """
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "You must be signed in."}), 401
+
+    group_by = request.args.get("group_by", "hour")
+    sort = request.args.get("sort", "tokens")
+    if group_by not in GROUP_BY or sort not in SORT_BY:
+        return jsonify({"error": "Invalid group_by or sort."}), 400
+    try:
+        until = datetime.fromisoformat(
+            request.args.get("until", datetime.utcnow().isoformat())
+        )
+        since = datetime.fromisoformat(
+            request.args.get("since", (until - timedelta(hours=24)).isoformat())
+        )
+    except ValueError:
+        return jsonify({"error": "since and until must be ISO timestamps."}), 400
+    limit = max(1, min(request.args.get("limit", 100, type=int), 1000))
+
+    # Include calls still waiting in the meter's buffer
+    usage_meter.flush()
+    rows = usage_rollup(
+        group_by,
+        since,
+        until,
+        call_type=request.args.get("call_type"),
+        sort=sort,
+        limit=limit,
+        user_id=None if is_admin(user_id) else user_id,
+    )
+    return (
+        jsonify(
+            {
+                "group_by": group_by,
+                "since": since.isoformat(),
+                "until": until.isoformat(),
+                "rows": rows,
+            }
+        ),
+        200,
+    )
 
 
 # API Resource Routing
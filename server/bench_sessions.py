@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark of the session backends in session_store.py.
+
+Saves and then loads a typical signed-in session under many session ids with each
+backend and reports per-operation latency. The filesystem backend stores sessions the
+way Flask-Session's "filesystem" type did, in a temporary directory. The sql backend
+uses the app's database; run the migrations first. Its benchmark rows are deleted
+afterwards.
+
+Usage:
+   python bench_sessions.py
+   python bench_sessions.py --sessions 5000 --backends memory sql
+"""
+
+import argparse
+import math
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+
+from app import app, db
+from models import ServerSession
+from session_store import (
+    FileSystemSessionBackend,
+    MemorySessionBackend,
+    SqlSessionBackend,
+)
+
+BACKENDS = ("filesystem", "memory", "sql")
+
+SESSION_DATA = {
+    "_permanent": False,
+    "user_id": 1234,
+    "username": "alice",
+    "logged_in": True,
+    "session_id": 5678,
+}
+
+
+def percentile(values, pct):
+    """
+    Returns the nearest-rank percentile of a list of numbers, or None if it is empty.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def timed(fn, keys):
+    """Calls fn(key) for every key. Returns the per-call latencies in microseconds."""
+    latencies = []
+    for key in keys:
+        started = time.perf_counter()
+        fn(key)
+        latencies.append((time.perf_counter() - started) * 1e6)
+    return latencies
+
+
+def bench(backend, sessions):
+    """
+    Saves, loads and deletes sessions with a backend.
+
+    Returns:
+    dict: Latencies in microseconds per operation.
+    """
+    keys = [f"bench:{uuid.uuid4().hex}" for _ in range(sessions)]
+    lifetime = timedelta(hours=1)
+    results = {
+        "save": timed(lambda key: backend.save(key, SESSION_DATA, lifetime), keys),
+        "load": timed(backend.load, keys),
+        "delete": timed(backend.delete, keys),
+    }
+    if backend.counters["errors"]:
+        raise RuntimeError(f"{backend.counters['errors']} {backend.backend} errors")
+    return results
+
+
+def main():
+    """
+    Parses command-line options, runs the benchmark and prints a latency table.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the session backends")
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    args = parser.parse_args()
+
+    print(
+        f"{'backend':<12}{'op':<8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}"
+        "   (microseconds)"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for name in args.backends:
+            if name == "filesystem":
+                backend = FileSystemSessionBackend(directory, threshold=0)
+            elif name == "memory":
+                backend = MemorySessionBackend(max_entries=args.sessions)
+            else:
+                backend = SqlSessionBackend(app)
+            try:
+                results = bench(backend, args.sessions)
+            finally:
+                if name == "sql":
+                    with app.app_context():
+                        ServerSession.query.filter(
+                            ServerSession.id.like("bench:%")
+                        ).delete(synchronize_session=False)
+                        db.session.commit()
+            for op, latencies in results.items():
+                print(
+                    f"{name:<12}{op:<8}{sum(latencies) / len(latencies):>10.1f}"
+                    f"{percentile(latencies, 50):>10.1f}"
+                    f"{percentile(latencies, 95):>10.1f}"
+                    f"{percentile(latencies, 99):>10.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+# chat_export.py: Incremental export of chat turns as training data.
+# Stored ChatMessage pairs are streamed in id order from the last exported id, deduplicated by
+# a hash of their normalized content and written either as AITrainingData rows or as gzipped
+# JSONL shards. Rows are read and written in fixed-size batches, so memory use does not grow
+# with the size of the chat history.
+
+import gzip
+import hashlib
+import json
+import os
+import re
+from datetime import datetime, timedelta
+
+from completion_cache import normalize_message
+from config import db
+from models import AITrainingData, ChatExportHash, ChatExportState, ChatMessage
+
+AI_TRAINING_DATA = "ai_training_data"
+JSONL = "jsonl"
+TARGETS = (AI_TRAINING_DATA, JSONL)
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def content_hash(message, response):
+    """
+    Returns the SHA-256 hex digest identifying a chat turn's content. Messages are
+    normalized as for completion cache lookups and whitespace in the response is
+    collapsed, so trivially different copies of a turn hash the same.
+    """
+    response = WHITESPACE_PATTERN.sub(" ", response).strip()
+    encoded = f"{normalize_message(message)}\0{response}".encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def training_example(message, response):
+    """Returns a chat turn as a chat fine-tuning example."""
+    return {
+        "messages": [
+            {"role": "user", "content": message.strip()},
+            {"role": "assistant", "content": response.strip()},
+        ]
+    }
+
+
+class AITrainingDataSink:
+    """Writes training examples as AITrainingData rows, one multi-row insert per batch."""
+
+    target = AI_TRAINING_DATA
+
+    def start(self, first_id):
+        pass
+
+    def write(self, examples):
+        now = datetime.utcnow()
+        db.session.execute(
+            db.insert(AITrainingData),
+            [{"data": json.dumps(example), "created_at": now} for example in examples],
+        )
+
+    def finish(self, last_id):
+        pass
+
+    def abort(self):
+        pass
+
+
+class JsonlShardSink:
+    """
+    Writes training examples to gzipped JSONL shards in a directory, one shard per export
+    window, named after the range of chat message ids it covers.
+
+    A shard is written under a temporary name and renamed once complete. A window that is
+    exported again after a failed run produces the same shard name, so the rerun replaces
+    the earlier file instead of duplicating it.
+    """
+
+    target = JSONL
+
+    def __init__(self, directory, compresslevel=6):
+        self.directory = directory
+        self.compresslevel = compresslevel
+        self.paths = []
+        self._file = None
+        self._path = None
+        self._first_id = None
+
+    def start(self, first_id):
+        self._first_id = first_id
+
+    def write(self, examples):
+        if self._file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._path = os.path.join(
+                self.directory, f".chat_turns-{self._first_id:010d}.jsonl.gz.tmp"
+            )
+            self._file = gzip.open(
+                self._path, "wt", encoding="utf-8", compresslevel=self.compresslevel
+            )
+        for example in examples:
+            self._file.write(json.dumps(example, ensure_ascii=False) + "\n")
+
+    def finish(self, last_id):
+        if self._file is None:
+            return
+        self._file.close()
+        path = os.path.join(
+            self.directory,
+            f"chat_turns-{self._first_id:010d}-{last_id:010d}.jsonl.gz",
+        )
+        os.replace(self._path, path)
+        self.paths.append(path)
+        self._file = self._path = None
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+            os.remove(self._path)
+            self._file = self._path = None
+
+
+class ChatTurnExporter:
+    """
+    Exports new chat turns to a sink.
+
+    Attributes:
+    - sink: AITrainingDataSink or JsonlShardSink.
+    - batch_size: Rows fetched from the cursor, deduplicated and written at a time.
+    - window_size: Rows read per export window. Each window is one streamed query;
+      its output, content hashes and the watermark are committed together when it
+      ends, so an interrupted run resumes from the last complete window.
+    - settle_seconds: Turns younger than this are left for a later run. Ids are handed
+      out before their transactions commit, so a turn can become visible after a higher
+      id was exported; the watermark only advances over settled turns, and the setting
+      must exceed the longest chat write (including the write-behind buffer) for no
+      turn to be skipped.
+
+    On PostgreSQL the rows of a window are read through a server-side cursor. Only one
+    export per target should run at a time.
+    """
+
+    def __init__(self, sink, batch_size=1000, window_size=50000, settle_seconds=300):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.window_size = window_size
+        self.settle_seconds = settle_seconds
+
+    def run(self):
+        """
+        Exports every settled chat turn newer than the target's watermark. Must run in
+        an app context.
+
+        Returns:
+        dict: Turns read, exported and skipped as duplicates, and the new watermark.
+        """
+        target = self.sink.target
+        state = db.session.get(ChatExportState, target)
+        if state is None:
+            state = ChatExportState(
+                target=target, last_message_id=0, exported=0, duplicates=0
+            )
+            db.session.add(state)
+        totals = {"read": 0, "exported": 0, "duplicates": 0}
+        settled_before = datetime.utcnow() - timedelta(seconds=self.settle_seconds)
+
+        while True:
+            window = self._export_window(state.last_message_id, settled_before)
+            if window["read"] == 0:
+                break
+            for name in totals:
+                totals[name] += window[name]
+            state.last_message_id = window["last_id"]
+            state.exported += window["exported"]
+            state.duplicates += window["duplicates"]
+            state.updated_at = datetime.utcnow()
+            db.session.commit()
+            if window["settling"] or window["read"] < self.window_size:
+                break
+
+        db.session.commit()
+        totals["last_message_id"] = state.last_message_id
+        return totals
+
+    def _export_window(self, after_id, settled_before):
+        """
+        Streams up to window_size chat turns after after_id into the sink, stopping at
+        the first turn stored after settled_before. The caller commits.
+        """
+        query = (
+            db.select(
+                ChatMessage.id,
+                ChatMessage.message,
+                ChatMessage.response,
+                ChatMessage.timestamp,
+            )
+            .where(ChatMessage.id > after_id)
+            .order_by(ChatMessage.id)
+            .limit(self.window_size)
+            .execution_options(yield_per=self.batch_size)
+        )
+        window = {
+            "read": 0,
+            "exported": 0,
+            "duplicates": 0,
+            "last_id": after_id,
+            "settling": False,
+        }
+        self.sink.start(after_id + 1)
+        result = db.session.execute(query)
+        try:
+            for rows in result.partitions():
+                # Lower ids may yet commit behind a turn that is still settling
+                for index, row in enumerate(rows):
+                    if row.timestamp > settled_before:
+                        rows = rows[:index]
+                        window["settling"] = True
+                        break
+                if not rows:
+                    break
+                window["read"] += len(rows)
+                window["last_id"] = rows[-1].id
+                examples, duplicates = self._new_examples(rows)
+                window["exported"] += len(examples)
+                window["duplicates"] += duplicates
+                if examples:
+                    self.sink.write(examples)
+                if window["settling"]:
+                    break
+            result.close()
+            self.sink.finish(window["last_id"])
+        except Exception:
+            self.sink.abort()
+            db.session.rollback()
+            raise
+        return window
+
+    def _new_examples(self, rows):
+        """
+        Returns training examples for the turns of a batch whose content has not been
+        exported to the target, and records their hashes. Turns without a message or a
+        response are skipped.
+
+        Returns:
+        tuple: (examples, number of duplicate turns skipped).
+        """
+        hashes = {}
+        turns = 0
+        for row in rows:
+            if row.message and row.response:
+                turns += 1
+                hashes.setdefault(content_hash(row.message, row.response), row)
+        if not hashes:
+            return [], 0
+
+        seen = set(
+            db.session.scalars(
+                db.select(ChatExportHash.content_hash).where(
+                    ChatExportHash.target == self.sink.target,
+                    ChatExportHash.content_hash.in_(hashes),
+                )
+            )
+        )
+        new = [(key, row) for key, row in hashes.items() if key not in seen]
+        if new:
+            db.session.execute(
+                db.insert(ChatExportHash),
+                [{"target": self.sink.target, "content_hash": key} for key, _ in new],
+            )
+        examples = [training_example(row.message, row.response) for _, row in new]
+        return examples, turns - len(examples)
+
+
+def create_chat_exporter(config, target):
+    """
+    Creates a chat turn exporter for a target from the CHAT_EXPORT_* settings in the app
+    config. JSONL shards are written to CHAT_EXPORT_DIR.
+    """
+    if target == AI_TRAINING_DATA:
+        sink = AITrainingDataSink()
+    elif target == JSONL:
+        sink = JsonlShardSink(config["CHAT_EXPORT_DIR"])
+    else:
+        raise ValueError(f"Unknown export target: {target}")
+    return ChatTurnExporter(
+        sink,
+        batch_size=config["CHAT_EXPORT_BATCH_SIZE"],
+        window_size=config["CHAT_EXPORT_WINDOW_SIZE"],
+        settle_seconds=config["CHAT_EXPORT_SETTLE_SECONDS"],
+    )
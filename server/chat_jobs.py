@@ -0,0 +1,179 @@
+# chat_jobs.py: Asynchronous chat turns.
+# A chat turn can be submitted as a job that runs on a bounded worker pool while the HTTP
+# worker returns immediately; clients poll or long-poll the job for its result. Job state is
+# kept in a cachelib cache so any worker sharing the store can answer a poll.
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from cachelib import FileSystemCache, SimpleCache
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Seconds between store checks while waiting on a job started by another process
+POLL_INTERVAL = 0.1
+
+
+class ChatJobQueue:
+    """
+    Runs chat turns on a bounded pool of background threads.
+
+    Attributes:
+    - store: cachelib cache holding job records, keyed by job id.
+    - max_workers: Number of threads running jobs in this process.
+    - max_pending: Maximum number of queued or running jobs in this process; further
+      submissions are refused.
+    - result_ttl: Seconds a job record is kept after it was last updated.
+
+    Job records are dicts with id, user_id, status (queued, running, done or failed),
+    created_at, finished_at, and once finished the turn's result payload and HTTP status.
+    """
+
+    def __init__(self, app, store, max_workers=4, max_pending=64, result_ttl=600):
+        self.app = app
+        self.store = store
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="chat-job"
+        )
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._events = {}
+        self._lock = threading.Lock()
+        self.counters = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0}
+
+    def _key(self, job_id):
+        return f"chat_job:{job_id}"
+
+    def _save(self, job):
+        self.store.set(self._key(job["id"]), job, timeout=self.result_ttl)
+
+    def submit(self, user_id, fn, *args):
+        """
+        Queues fn(*args) as a job owned by user_id. fn runs inside an app context and must
+        return a (payload, status) tuple.
+
+        Returns:
+        dict: The queued job record, or None if the queue is full.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.counters["rejected"] += 1
+            return None
+
+        job = {
+            "id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "status": QUEUED,
+            "created_at": time.time(),
+            "finished_at": None,
+            "result": None,
+            "http_status": None,
+        }
+        self._save(job)
+        with self._lock:
+            self._events[job["id"]] = threading.Event()
+            self.counters["submitted"] += 1
+        self._executor.submit(self._run, dict(job), fn, args)
+        return job
+
+    def _run(self, job, fn, args):
+        try:
+            job["status"] = RUNNING
+            self._save(job)
+            with self.app.app_context():
+                payload, status = fn(*args)
+            job.update(status=DONE, result=payload, http_status=status)
+        except Exception as e:
+            job.update(
+                status=FAILED,
+                result={"error": "Failed to get response from AI", "details": str(e)},
+                http_status=500,
+            )
+        finally:
+            job["finished_at"] = time.time()
+            self._save(job)
+            with self._lock:
+                self.counters["completed" if job["status"] == DONE else "failed"] += 1
+                event = self._events.pop(job["id"], None)
+            if event:
+                event.set()
+            self._slots.release()
+
+    def get(self, job_id):
+        """Returns the job record for job_id, or None if it is unknown or expired."""
+        return self.store.get(self._key(job_id))
+
+    def wait(self, job_id, timeout):
+        """
+        Waits up to timeout seconds for a job to finish and returns its latest record.
+        Jobs running in this process wake the waiter as soon as they finish; others are
+        polled from the store.
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            event = self._events.get(job_id)
+        if event is not None:
+            event.wait(timeout)
+            return self.get(job_id)
+
+        job = self.get(job_id)
+        while job and job["status"] in (QUEUED, RUNNING):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(POLL_INTERVAL, remaining))
+            job = self.get(job_id)
+        return job
+
+    def stats(self):
+        """Returns job counters and the number of jobs pending in this process."""
+        with self._lock:
+            data = dict(self.counters)
+            data["pending"] = len(self._events)
+        data["max_pending"] = self.max_pending
+        data["max_workers"] = self.max_workers
+        return data
+
+
+def create_chat_job_queue(app):
+    """
+    Creates the chat job queue from the CHAT_JOB_* settings in the app config.
+
+    CHAT_JOB_STORE may be "filesystem" (records in CHAT_JOB_DIR, visible to every worker on
+    the host) or "memory" (job records visible to this process only).
+
+    Raises ValueError for an unknown store, for the memory store when WEB_CONCURRENCY is
+    above 1 (a poll landing on another worker would not find the job), and for a
+    CHAT_JOB_MAX_WAIT above half of WEB_WORKER_TIMEOUT.
+    """
+    config = app.config
+    ttl = config["CHAT_JOB_TTL"]
+    if config["CHAT_JOB_MAX_WAIT"] > config["WEB_WORKER_TIMEOUT"] / 2:
+        raise ValueError(
+            f"CHAT_JOB_MAX_WAIT ({config['CHAT_JOB_MAX_WAIT']}s) must be at most half of "
+            f"WEB_WORKER_TIMEOUT ({config['WEB_WORKER_TIMEOUT']}s)"
+        )
+    if config["CHAT_JOB_STORE"] == "filesystem":
+        store = FileSystemCache(config["CHAT_JOB_DIR"], default_timeout=ttl)
+    elif config["CHAT_JOB_STORE"] == "memory":
+        if config["WEB_CONCURRENCY"] > 1:
+            raise ValueError(
+                'CHAT_JOB_STORE "memory" cannot be used with WEB_CONCURRENCY above 1'
+            )
+        store = SimpleCache(threshold=config["CHAT_JOB_MAX_PENDING"] * 16)
+    else:
+        raise ValueError(f"Unknown CHAT_JOB_STORE: {config['CHAT_JOB_STORE']}")
+    return ChatJobQueue(
+        app,
+        store,
+        max_workers=config["CHAT_JOB_WORKERS"],
+        max_pending=config["CHAT_JOB_MAX_PENDING"],
+        result_ttl=ttl,
+    )
@@ -0,0 +1,111 @@
+# chat_socket.py: Open WebSocket chat connections.
+# A chat socket is authenticated once, when it connects, and keeps the user and chat session
+# it was opened for. Open sockets are registered per user so the server can push messages to
+# a user outside of a chat turn, and close them when the user logs out.
+
+import json
+import logging
+import threading
+import time
+
+from simple_websocket import ConnectionClosed
+
+
+class ChatSocket:
+    """
+    One open chat WebSocket.
+
+    Attributes:
+    - ws: The underlying simple_websocket connection.
+    - user_id: The user authenticated when the socket connected.
+    - session_id: The user's chat session when the socket connected.
+
+    Frames sent to the client are JSON objects {"event": <name>, "data": <payload>}.
+    Sends are serialized, so pushes from other threads do not interleave with a
+    streaming reply.
+    """
+
+    def __init__(self, ws, user_id, session_id):
+        self.ws = ws
+        self.user_id = user_id
+        self.session_id = session_id
+        self.connected_at = time.time()
+        self.turns = 0
+        self._lock = threading.Lock()
+
+    def send(self, event, data):
+        """
+        Sends an event to the client. Returns False if the socket has closed.
+        """
+        frame = json.dumps({"event": event, "data": data})
+        try:
+            with self._lock:
+                self.ws.send(frame)
+        except ConnectionClosed:
+            return False
+        return True
+
+    def close(self, reason=1000, message=None):
+        """Closes the socket."""
+        try:
+            with self._lock:
+                self.ws.close(reason=reason, message=message)
+        except ConnectionClosed:
+            pass
+
+
+class ChatSocketRegistry:
+    """
+    Tracks the open chat sockets of this process by user.
+    """
+
+    def __init__(self):
+        self._sockets = {}
+        self._lock = threading.Lock()
+        self.counters = {"opened": 0, "closed": 0, "pushed": 0}
+
+    def add(self, chat_socket):
+        with self._lock:
+            self._sockets.setdefault(chat_socket.user_id, set()).add(chat_socket)
+            self.counters["opened"] += 1
+
+    def remove(self, chat_socket):
+        with self._lock:
+            sockets = self._sockets.get(chat_socket.user_id)
+            if sockets and chat_socket in sockets:
+                sockets.discard(chat_socket)
+                if not sockets:
+                    del self._sockets[chat_socket.user_id]
+                self.counters["closed"] += 1
+
+    def sockets_for(self, user_id):
+        with self._lock:
+            return list(self._sockets.get(user_id, ()))
+
+    def push(self, user_id, event, data):
+        """
+        Sends an event to every open socket of a user in this process.
+
+        Returns:
+        int: The number of sockets the event was delivered to.
+        """
+        delivered = sum(
+            chat_socket.send(event, data) for chat_socket in self.sockets_for(user_id)
+        )
+        with self._lock:
+            self.counters["pushed"] += delivered
+        return delivered
+
+    def close_user(self, user_id, message=None):
+        """Closes every open socket of a user, e.g. when the user logs out."""
+        for chat_socket in self.sockets_for(user_id):
+            logging.debug(f"Closing chat socket of user {user_id}")
+            chat_socket.close(message=message)
+
+    def stats(self):
+        """Returns connection counters and the number of open sockets."""
+        with self._lock:
+            data = dict(self.counters)
+            data["open"] = sum(len(sockets) for sockets in self._sockets.values())
+            data["users"] = len(self._sockets)
+        return data
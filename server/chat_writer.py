@@ -0,0 +1,205 @@
+# chat_writer.py: Write-behind persistence for chat messages.
+# Chat turns are buffered in memory and written in multi-row inserts on a size or time
+# threshold, so a burst of turns costs one commit instead of one commit per turn.
+
+import atexit
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+
+from config import db
+from models import ChatMessage
+
+
+class PendingChatMessage:
+    """
+    A chat turn waiting to be written. id is None until the row has been inserted.
+    usage optionally holds the turn's model call usage, recorded once the row has an id.
+    """
+
+    __slots__ = (
+        "id",
+        "user_id",
+        "session_id",
+        "message",
+        "response",
+        "timestamp",
+        "usage",
+    )
+
+    def __init__(self, user_id, session_id, message, response, usage=None):
+        self.id = None
+        self.user_id = user_id
+        self.session_id = session_id
+        self.message = message
+        self.response = response
+        self.timestamp = datetime.utcnow()
+        self.usage = usage
+
+    def row(self):
+        return {
+            "user_id": self.user_id,
+            "session_id": self.session_id,
+            "message": self.message,
+            "response": self.response,
+            "timestamp": self.timestamp,
+        }
+
+
+class ChatMessageWriter:
+    """
+    Buffers chat messages and inserts them in batches on a background thread.
+
+    Attributes:
+    - batch_size: Buffered messages that wake the writer for an immediate flush.
+    - flush_interval: Longest time, in seconds, a message waits in the buffer.
+    - on_written: Optional callback(messages) run after each flush with the attempted
+      PendingChatMessages; messages that could not be written still have id None.
+
+    Read-your-writes: before reading a user's messages from the database, call
+    flush_user(user_id), which writes any of that user's buffered messages first. This
+    holds within the process; other processes see a message once it has been flushed.
+    The buffer is drained when the interpreter exits.
+    """
+
+    def __init__(self, app, batch_size=50, flush_interval=0.5, on_written=None):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_written = on_written
+        self._buffer = []
+        self._unwritten = Counter()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self.counters = {"queued": 0, "written": 0, "dropped": 0, "flushes": 0}
+        self._thread = threading.Thread(
+            target=self._flush_loop, name="chat-writer", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add(self, user_id, session_id, message, response, usage=None):
+        """
+        Buffers a chat turn and returns it as a PendingChatMessage.
+        """
+        pending = PendingChatMessage(user_id, session_id, message, response, usage)
+        with self._lock:
+            self._buffer.append(pending)
+            self._unwritten[user_id] += 1
+            self.counters["queued"] += 1
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wake.set()
+        return pending
+
+    def flush_user(self, user_id):
+        """
+        Writes buffered messages now if any of them belong to user_id.
+        """
+        with self._lock:
+            unwritten = self._unwritten[user_id] > 0
+        if unwritten:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes all buffered messages. Returns the number written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+            written = 0
+            try:
+                with self.app.app_context():
+                    written = self._insert(batch)
+            except Exception as e:
+                logging.error(f"Error flushing chat messages: {str(e)}")
+            finally:
+                with self._lock:
+                    for pending in batch:
+                        self._unwritten[pending.user_id] -= 1
+                        if self._unwritten[pending.user_id] <= 0:
+                            del self._unwritten[pending.user_id]
+            with self._lock:
+                self.counters["written"] += written
+                self.counters["dropped"] += len(batch) - written
+                self.counters["flushes"] += 1
+            if self.on_written:
+                try:
+                    self.on_written(batch)
+                except Exception as e:
+                    logging.error(f"Error after writing chat messages: {str(e)}")
+            return written
+
+    def _insert(self, batch):
+        """
+        Inserts a batch in one multi-row statement, falling back to one row at a time if
+        the batch fails, so a single bad row does not lose the rest.
+        """
+        statement = db.insert(ChatMessage).returning(
+            ChatMessage.id, sort_by_parameter_order=True
+        )
+        try:
+            ids = db.session.scalars(
+                statement, [pending.row() for pending in batch]
+            ).all()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error writing {len(batch)} chat messages: {str(e)}")
+        else:
+            for pending, new_id in zip(batch, ids):
+                pending.id = new_id
+            return len(batch)
+
+        written = 0
+        for pending in batch:
+            try:
+                pending.id = db.session.scalars(statement, [pending.row()]).one()
+                db.session.commit()
+                written += 1
+            except Exception as e:
+                db.session.rollback()
+                logging.error(
+                    f"Dropping chat message for user {pending.user_id}: {str(e)}"
+                )
+        return written
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        """Stops the background writer and writes any buffered messages."""
+        self._closed = True
+        self._wake.set()
+        self.flush()
+
+    def stats(self):
+        """Returns writer counters and the number of messages waiting to be written."""
+        with self._lock:
+            data = dict(self.counters)
+            data["pending"] = len(self._buffer)
+        return data
+
+
+def create_chat_writer(app, on_written=None):
+    """
+    Creates the write-behind chat writer from the CHAT_WRITE_* settings in the app
+    config, or returns None when CHAT_WRITE_BEHIND is off and turns are written inline.
+    """
+    if not app.config["CHAT_WRITE_BEHIND"]:
+        return None
+    return ChatMessageWriter(
+        app,
+        batch_size=app.config["CHAT_WRITE_BATCH_SIZE"],
+        flush_interval=app.config["CHAT_WRITE_FLUSH_INTERVAL"],
+        on_written=on_written,
+    )
@@ -0,0 +1,273 @@
+# completion_cache.py: Response cache for chat completions.
+# Only standalone questions are cached. They are answered without conversation history, so
+# their keys combine just the normalized user message, the model parameters and the support
+# guide version, and the same question from any user is answered from memory instead of a
+# full OpenAI round trip.
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from cachelib import FileSystemCache
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+TRAILING_PUNCTUATION = "?!.,;: "
+# Prefix of the marks shared caches keep for completions being fetched by a worker
+PENDING_PREFIX = "pending:"
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+# Words tying a message to earlier turns ("it still won't start", "what about the other
+# one?"); such messages need the conversation history and are not cached
+REFERENCE_WORDS = frozenset("""
+    it its it's that that's this these those they them their there above again previous
+    earlier before same also another other else still instead yes no ok okay thanks
+    thank sure tried
+    """.split())
+# Openings that continue the previous turn ("what about the battery?", "and on Android?")
+FOLLOW_UP_OPENERS = (
+    ("what", "about"),
+    ("how", "about"),
+    ("what", "if"),
+    ("and",),
+    ("but",),
+    ("so",),
+)
+
+
+def normalize_message(message):
+    """
+    Normalizes a user message for cache lookups: lowercased, whitespace collapsed and
+    trailing punctuation removed, so "How do I reset my phone?" and
+    "how do i reset my phone" share an entry.
+    """
+    message = WHITESPACE_PATTERN.sub(" ", message.lower().replace("’", "'"))
+    return message.strip().rstrip(TRAILING_PUNCTUATION)
+
+
+def is_standalone(message, min_words=3):
+    """
+    Returns True if a message reads as a self-contained question, such as "how do I
+    reset my phone", rather than a follow-up like "it still won't turn on": it has at
+    least min_words words, none of REFERENCE_WORDS and no FOLLOW_UP_OPENERS. Standalone
+    messages can be answered without the conversation history.
+    """
+    found = WORD_PATTERN.findall(normalize_message(message))
+    if len(found) < min_words or REFERENCE_WORDS.intersection(found):
+        return False
+    return not any(
+        tuple(found[: len(opener)]) == opener for opener in FOLLOW_UP_OPENERS
+    )
+
+
+def make_cache_key(message, model, temperature, max_tokens, system_message):
+    """
+    Builds a cache key for a chat completion request sent without conversation history.
+
+    Args:
+    message (str): The user message; it is normalized.
+    model (str): The model name.
+    temperature (float): Sampling temperature.
+    max_tokens (int): Completion token limit.
+    system_message (str): The system message sent with the request, which covers
+    the support guide version and every setting that shapes the prompt.
+
+    Returns:
+    str: A hex digest identifying the request.
+    """
+    payload = {
+        "message": normalize_message(message),
+        "model": model,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "system_message": system_message,
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """
+    Base class for completion caches. Tracks hit and miss counters; subclasses implement
+    _get and _set against their storage.
+    """
+
+    backend = "none"
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self._counter_lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the cached completion for key, or None on a miss."""
+        value = self._get(key)
+        with self._counter_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Stores a completion under key."""
+        self._set(key, value)
+
+    def claim(self, key, timeout):
+        """
+        Marks the completion for key as being fetched by this worker. Returns False if
+        another worker already holds the mark; that worker's result can be awaited with
+        wait(). The mark expires after timeout seconds so a worker that dies mid-call
+        cannot hold it. Caches not shared between workers always grant the claim.
+        """
+        return True
+
+    def release(self, key):
+        """Removes the mark set by claim()."""
+
+    def wait(self, key, timeout, interval=0.05):
+        """
+        Waits up to timeout seconds for the worker holding the mark on key to store its
+        completion. Returns the completion, or None if the mark was released or expired
+        without one.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            value = self._get(key)
+            if value is not None:
+                with self._counter_lock:
+                    self.shared_hits += 1
+                return value
+            if not self._claimed(key) or time.monotonic() >= deadline:
+                with self._counter_lock:
+                    self.shared_misses += 1
+                return None
+            time.sleep(interval)
+
+    def _get(self, key):
+        return None
+
+    def _set(self, key, value):
+        pass
+
+    def _claimed(self, key):
+        return False
+
+    def stats(self):
+        """Returns the backend name and hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "shared_hits": self.shared_hits,
+            "shared_misses": self.shared_misses,
+        }
+
+
+class MemoryCompletionCache(CompletionCache):
+    """
+    In-process LRU cache with TTL expiry. Memory is bounded by max_entries; the least
+    recently used entry is evicted first and expired entries are dropped on access.
+    """
+
+    backend = "memory"
+
+    def __init__(self, max_entries=1024, ttl=3600):
+        super().__init__(ttl)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        data = super().stats()
+        data["entries"] = len(self._entries)
+        data["max_entries"] = self.max_entries
+        return data
+
+
+class CachelibCompletionCache(CompletionCache):
+    """
+    Completion cache backed by a cachelib cache, e.g. a FileSystemCache directory or a
+    RedisCache shared by every worker. Size limits and expiry are enforced by cachelib.
+
+    claim() stores a pending mark next to the entry, so a miss being fetched by one
+    worker is awaited by the others instead of fetched again. The mark is checked and
+    set in two steps; two workers racing for the same key may both fetch it, which
+    only costs the extra call the mark exists to avoid.
+    """
+
+    backend = "cachelib"
+
+    def __init__(self, cache, ttl=3600):
+        super().__init__(ttl)
+        self.cache = cache
+
+    def _get(self, key):
+        return self.cache.get(key)
+
+    def _set(self, key, value):
+        self.cache.set(key, value, timeout=self.ttl)
+
+    def claim(self, key, timeout):
+        # cachelib's FileSystemCache.add() refuses to replace an expired mark, so the
+        # expiry-aware get() is used to test for a live one
+        if self._claimed(key):
+            return False
+        return bool(
+            self.cache.set(PENDING_PREFIX + key, 1, timeout=max(1, int(timeout)))
+        )
+
+    def release(self, key):
+        self.cache.delete(PENDING_PREFIX + key)
+
+    def _claimed(self, key):
+        return self.cache.get(PENDING_PREFIX + key) is not None
+
+
+def create_completion_cache(config):
+    """
+    Creates the completion cache selected by the CHAT_CACHE_* settings in the app config.
+
+    CHAT_CACHE_BACKEND may be "memory" (per process), "filesystem" (cachelib cache in
+    CHAT_CACHE_DIR, shared by workers on the same host) or "none".
+    """
+    backend = config["CHAT_CACHE_BACKEND"]
+    ttl = config["CHAT_CACHE_TTL"]
+    max_entries = config["CHAT_CACHE_MAX_ENTRIES"]
+
+    if backend == "memory":
+        return MemoryCompletionCache(max_entries=max_entries, ttl=ttl)
+    if backend == "filesystem":
+        cache = FileSystemCache(
+            config["CHAT_CACHE_DIR"], threshold=max_entries, default_timeout=ttl
+        )
+        return CachelibCompletionCache(cache, ttl=ttl)
+    if backend == "none":
+        return CompletionCache(ttl)
+    raise ValueError(f"Unknown CHAT_CACHE_BACKEND: {backend}")
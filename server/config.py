@@ -10,11 +10,12 @@ from flask_cors import CORS
 from flask_marshmallow import Marshmallow
 from flask_migrate import Migrate
 from flask_restful import Api
+from flask_sock import Sock
 from flask_sqlalchemy import SQLAlchemy
 from openai import OpenAI
+from password_hasher import create_password_hasher
 from sqlalchemy import MetaData
-
-from flask_session import Session
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 load_dotenv()
 
@@ -33,15 +34,103 @@ app = Flask(
 
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Set OPENAI_BASE_URL to send model calls elsewhere, e.g. to the local stand-in server in
+# fake_openai.py ("http://127.0.0.1:8001/v1") for offline load and latency testing.
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
 if not OPENAI_API_KEY:
-    raise ValueError("The OPENAI_API_KEY environment variable is not set.")
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+    if not OPENAI_BASE_URL:
+        raise ValueError("The OPENAI_API_KEY environment variable is not set.")
+    OPENAI_API_KEY = "fake-openai-key"
+openai_client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
 
 app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "default_secret_key")
-app.config["SESSION_TYPE"] = "filesystem"
+# Usernames, comma-separated, allowed to read the metrics endpoints and every user's
+# model usage at /api/chat_usage.
+app.config["ADMIN_USERNAMES"] = {
+    username.strip().lower()
+    for username in os.getenv("ADMIN_USERNAMES", "").split(",")
+    if username.strip()
+}
+# Web server processes and their request timeout, matching gunicorn's WEB_CONCURRENCY and
+# --timeout. Used to size per-process pools and to reject settings that only work in a
+# single process or that would let a request outlive its worker.
+app.config["WEB_CONCURRENCY"] = int(os.getenv("WEB_CONCURRENCY", "1"))
+app.config["WEB_WORKER_TIMEOUT"] = float(os.getenv("WEB_WORKER_TIMEOUT", "30"))
+# Password hashing: bcrypt cost for new hashes (stored hashes with another cost are
+# rehashed at sign-in), hashing threads per process, hashes queued or running before
+# requests are refused with 503, and seconds a request waits for its hash. Each hashing
+# thread keeps a core busy, so the host runs up to PASSWORD_HASH_WORKERS x WEB_CONCURRENCY
+# hashes at once; the default gives sign-ins half of the host's cores, split between the
+# web workers.
+app.config["BCRYPT_LOG_ROUNDS"] = int(os.getenv("BCRYPT_LOG_ROUNDS", "12"))
+app.config["PASSWORD_HASH_WORKERS"] = int(
+    os.getenv(
+        "PASSWORD_HASH_WORKERS",
+        str(max(1, (os.cpu_count() or 1) // 2 // app.config["WEB_CONCURRENCY"])),
+    )
+)
+app.config["PASSWORD_HASH_MAX_PENDING"] = int(
+    os.getenv("PASSWORD_HASH_MAX_PENDING", "64")
+)
+app.config["PASSWORD_HASH_TIMEOUT"] = float(os.getenv("PASSWORD_HASH_TIMEOUT", "10"))
+# Reverse proxies in front of the app whose X-Forwarded-For and X-Forwarded-Proto
+# headers are trusted, so request.remote_addr is the client's address rather than the
+# proxy's. X-Forwarded-For is not trusted by default, since a client reaching the app
+# directly could forge it to dodge the per-IP throttles; the Azure App Service
+# deployment sets PROXY_FIX_X_FOR to 1 for its front end.
+app.config["PROXY_FIX_X_FOR"] = int(os.getenv("PROXY_FIX_X_FOR", "0"))
+app.config["PROXY_FIX_X_PROTO"] = int(os.getenv("PROXY_FIX_X_PROTO", "1"))
+# Sign-in throttles: token buckets on password attempts (login, password change, account
+# deletion) per client IP and per username, and on account creation per client IP, checked
+# before any database or hashing work. Rates and bursts work as for the chat rate limits
+# below; AUTH_RATE_STORE "filesystem" shares them between the workers on a host.
+app.config["AUTH_RATE_LIMIT"] = os.getenv("AUTH_RATE_LIMIT", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+app.config["AUTH_RATE_STORE"] = os.getenv("AUTH_RATE_STORE", "filesystem")
+app.config["AUTH_RATE_DIR"] = os.getenv("AUTH_RATE_DIR", "auth_rate_limits")
+app.config["AUTH_RATE_IP_PER_MINUTE"] = float(
+    os.getenv("AUTH_RATE_IP_PER_MINUTE", "30")
+)
+app.config["AUTH_RATE_IP_BURST"] = float(os.getenv("AUTH_RATE_IP_BURST", "10"))
+app.config["AUTH_RATE_USERNAME_PER_MINUTE"] = float(
+    os.getenv("AUTH_RATE_USERNAME_PER_MINUTE", "5")
+)
+app.config["AUTH_RATE_USERNAME_BURST"] = float(
+    os.getenv("AUTH_RATE_USERNAME_BURST", "5")
+)
+app.config["AUTH_RATE_REGISTER_IP_PER_MINUTE"] = float(
+    os.getenv("AUTH_RATE_REGISTER_IP_PER_MINUTE", "3")
+)
+app.config["AUTH_RATE_REGISTER_IP_BURST"] = float(
+    os.getenv("AUTH_RATE_REGISTER_IP_BURST", "5")
+)
+# Server-side sessions (session_store.py): "filesystem" (SESSION_FILE_DIR, shared by
+# workers on one host), "memory" (in-process LRU, single worker only) or "sql"
+# (server_sessions table; slower, for deployments with several nodes). SESSION_MAX_ENTRIES
+# bounds the memory and filesystem stores; expired sessions are swept every
+# SESSION_SWEEP_INTERVAL seconds (0 disables).
+app.config["SESSION_BACKEND"] = os.getenv("SESSION_BACKEND", "filesystem")
 app.config["SESSION_PERMANENT"] = False
 app.config["SESSION_USE_SIGNER"] = True
-Session(app)
+app.config["SESSION_KEY_PREFIX"] = "session:"
+app.config["SESSION_FILE_DIR"] = os.getenv("SESSION_FILE_DIR", "flask_session")
+app.config["SESSION_MAX_ENTRIES"] = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+app.config["SESSION_SWEEP_INTERVAL"] = float(os.getenv("SESSION_SWEEP_INTERVAL", "300"))
+# Seconds /api/check_session serves a user's profile from the per-process cache before
+# reloading it from the database (0 always reloads), and the most profiles cached. The
+# TTL also bounds how long a password change or account deletion takes to reach other
+# workers.
+app.config["PROFILE_CACHE_TTL"] = float(os.getenv("PROFILE_CACHE_TTL", "60"))
+app.config["PROFILE_CACHE_MAX_USERS"] = int(
+    os.getenv("PROFILE_CACHE_MAX_USERS", "10000")
+)
+# Accounts returned per page of GET /api/user_auth, and the largest page a client may
+# request with ?limit=.
+app.config["USER_LIST_PAGE_SIZE"] = int(os.getenv("USER_LIST_PAGE_SIZE", "100"))
+app.config["USER_LIST_MAX_PAGE_SIZE"] = int(os.getenv("USER_LIST_MAX_PAGE_SIZE", "500"))
 
 # app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DB_URI", "sqlite:///app.db")
 app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URI")
@@ -51,12 +140,228 @@ app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URI")
 #     app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///app.db"
 
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+# Chat configuration
+# Seconds between checks of support_guide.txt for changes; 0 checks on every chat turn.
+app.config["SUPPORT_GUIDE_CHECK_INTERVAL"] = float(
+    os.getenv("SUPPORT_GUIDE_CHECK_INTERVAL", "2")
+)
+# Number of relevant support guide sections sent with each turn; 0 sends the whole guide.
+app.config["SUPPORT_GUIDE_TOP_K"] = int(os.getenv("SUPPORT_GUIDE_TOP_K", "3"))
+# Leading guide paragraphs that are always sent as the core preamble.
+app.config["SUPPORT_GUIDE_CORE_SECTIONS"] = int(
+    os.getenv("SUPPORT_GUIDE_CORE_SECTIONS", "2")
+)
+# Completion cache for standalone questions: "memory" (per process), "filesystem" (shared
+# via cachelib) or "none". Concurrent misses for the same question share one OpenAI call
+# within a process; with "filesystem" they also do across the workers on a host, waiting
+# up to CHAT_CACHE_PENDING_TIMEOUT seconds for the worker already fetching the reply.
+# Multi-worker deployments on the "memory" backend should use threaded or gevent workers
+# so bursts land in the same process.
+app.config["CHAT_CACHE_BACKEND"] = os.getenv("CHAT_CACHE_BACKEND", "memory")
+app.config["CHAT_CACHE_DIR"] = os.getenv("CHAT_CACHE_DIR", "chat_cache")
+app.config["CHAT_CACHE_MAX_ENTRIES"] = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "1024"))
+app.config["CHAT_CACHE_TTL"] = int(os.getenv("CHAT_CACHE_TTL", "3600"))
+app.config["CHAT_CACHE_PENDING_TIMEOUT"] = float(
+    os.getenv("CHAT_CACHE_PENDING_TIMEOUT", "30")
+)
+# Number of recent conversation turns kept per user as candidate context.
+app.config["CHAT_CONTEXT_TURNS"] = int(os.getenv("CHAT_CONTEXT_TURNS", "10"))
+# Turns returned per page of /api/continue_last_conversation, and the largest page a
+# client may request with ?limit=.
+app.config["CHAT_HISTORY_PAGE_SIZE"] = int(os.getenv("CHAT_HISTORY_PAGE_SIZE", "50"))
+app.config["CHAT_HISTORY_MAX_PAGE_SIZE"] = int(
+    os.getenv("CHAT_HISTORY_MAX_PAGE_SIZE", "200")
+)
+# Prompt tokens (system prompt, context and new message) allowed per model call.
+app.config["CHAT_PROMPT_TOKEN_BUDGET"] = int(
+    os.getenv("CHAT_PROMPT_TOKEN_BUDGET", "1500")
+)
+# Completion tokens the model may generate per reply.
+app.config["CHAT_MAX_TOKENS"] = int(os.getenv("CHAT_MAX_TOKENS", "150"))
+# Older session messages folded into the rolling summary per refresh; 0 disables summaries.
+app.config["CHAT_SUMMARY_EVERY"] = int(os.getenv("CHAT_SUMMARY_EVERY", "6"))
+app.config["CHAT_SUMMARY_MAX_TOKENS"] = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "200"))
+# Asynchronous chat jobs: worker threads and pending-job limit per process, seconds job
+# results are kept, and the longest long-poll wait allowed on /api/chat_jobs/<job_id>. A
+# long-poll holds a web worker for its whole wait, so CHAT_JOB_MAX_WAIT may be at most half
+# of WEB_WORKER_TIMEOUT.
+app.config["CHAT_JOB_WORKERS"] = int(os.getenv("CHAT_JOB_WORKERS", "4"))
+app.config["CHAT_JOB_MAX_PENDING"] = int(os.getenv("CHAT_JOB_MAX_PENDING", "64"))
+app.config["CHAT_JOB_TTL"] = int(os.getenv("CHAT_JOB_TTL", "600"))
+app.config["CHAT_JOB_MAX_WAIT"] = float(os.getenv("CHAT_JOB_MAX_WAIT", "10"))
+# Job record store: "filesystem" (shared by workers on the host) or "memory" (per process,
+# refused when WEB_CONCURRENCY is above 1 since polls reach other workers).
+app.config["CHAT_JOB_STORE"] = os.getenv("CHAT_JOB_STORE", "filesystem")
+app.config["CHAT_JOB_DIR"] = os.getenv("CHAT_JOB_DIR", "chat_jobs")
+# Chat turn export (export_chat_turns.py): rows fetched and written per batch, rows per
+# export window (committed together; one JSONL shard each), the JSONL shard directory, and
+# the age in seconds before a turn is exported (as for FAQ_MINING_SETTLE_SECONDS).
+app.config["CHAT_EXPORT_BATCH_SIZE"] = int(os.getenv("CHAT_EXPORT_BATCH_SIZE", "1000"))
+app.config["CHAT_EXPORT_WINDOW_SIZE"] = int(
+    os.getenv("CHAT_EXPORT_WINDOW_SIZE", "50000")
+)
+app.config["CHAT_EXPORT_DIR"] = os.getenv("CHAT_EXPORT_DIR", "training_exports")
+app.config["CHAT_EXPORT_SETTLE_SECONDS"] = int(
+    os.getenv("CHAT_EXPORT_SETTLE_SECONDS", "300")
+)
+# WebSocket chat channel: seconds between keepalive pings (0 disables them) and the
+# largest client frame accepted, in bytes.
+app.config["SOCK_SERVER_OPTIONS"] = {
+    "ping_interval": float(os.getenv("CHAT_SOCKET_PING_INTERVAL", "25")) or None,
+    "max_message_size": int(os.getenv("CHAT_SOCKET_MAX_MESSAGE_SIZE", "65536")),
+}
+# Browser origins, besides the app's own host, allowed to open the chat socket, as a
+# comma-separated list such as "https://shop.example.com". Browsers send the session
+# cookie with cross-site WebSocket handshakes, so other origins are refused.
+app.config["CHAT_SOCKET_ALLOWED_ORIGINS"] = [
+    origin.strip().rstrip("/").lower()
+    for origin in os.getenv("CHAT_SOCKET_ALLOWED_ORIGINS", "").split(",")
+    if origin.strip()
+]
+# Local pre-filter answering empty, abusive and clearly off-topic messages without a
+# model call. The optional off-topic model is written by train_prefilter.py; messages
+# scoring at or above CHAT_PREFILTER_THRESHOLD are treated as off-topic.
+app.config["CHAT_PREFILTER"] = os.getenv("CHAT_PREFILTER", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+app.config["CHAT_PREFILTER_MODEL"] = os.getenv(
+    "CHAT_PREFILTER_MODEL",
+    os.path.join(os.path.dirname(__file__), "data", "prefilter_model.json"),
+)
+app.config["CHAT_PREFILTER_THRESHOLD"] = float(
+    os.getenv("CHAT_PREFILTER_THRESHOLD", "0.9")
+)
+# File the pre-filter's blocking decisions are appended to, e.g.
+# "/var/log/chat/prefilter_audit.log"; unset, no file is written. Entries identify the
+# message by a hash and its length, plus its first CHAT_PREFILTER_AUDIT_CHARS characters
+# when that is above 0.
+app.config["CHAT_PREFILTER_AUDIT_LOG"] = os.getenv("CHAT_PREFILTER_AUDIT_LOG", "")
+app.config["CHAT_PREFILTER_AUDIT_CHARS"] = int(
+    os.getenv("CHAT_PREFILTER_AUDIT_CHARS", "0")
+)
+# FAQ fast path: messages whose TF-IDF similarity to a mined FAQ cluster with at least
+# FAQ_MIN_CLUSTER_SIZE members reaches FAQ_MATCH_THRESHOLD get the cluster's answer.
+# Clusters are mined by mine_faq.py and reloaded every FAQ_RELOAD_INTERVAL seconds.
+app.config["FAQ_FAST_PATH"] = os.getenv("FAQ_FAST_PATH", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+app.config["FAQ_MATCH_THRESHOLD"] = float(os.getenv("FAQ_MATCH_THRESHOLD", "0.8"))
+app.config["FAQ_MIN_CLUSTER_SIZE"] = int(os.getenv("FAQ_MIN_CLUSTER_SIZE", "5"))
+app.config["FAQ_RELOAD_INTERVAL"] = float(os.getenv("FAQ_RELOAD_INTERVAL", "60"))
+# FAQ mining: hashed vector size, similarity at which a message joins a cluster, centroid
+# entries kept per cluster, the size a new cluster must reach within a run to be stored,
+# and the age in seconds before a message is mined (longer than any chat write, including
+# the write-behind buffer, so messages committed out of id order are not skipped).
+app.config["FAQ_VECTOR_DIM"] = int(os.getenv("FAQ_VECTOR_DIM", "4096"))
+app.config["FAQ_CLUSTER_THRESHOLD"] = float(os.getenv("FAQ_CLUSTER_THRESHOLD", "0.6"))
+app.config["FAQ_CENTROID_TERMS"] = int(os.getenv("FAQ_CENTROID_TERMS", "128"))
+app.config["FAQ_MINING_MIN_CLUSTER_SIZE"] = int(
+    os.getenv("FAQ_MINING_MIN_CLUSTER_SIZE", "2")
+)
+app.config["FAQ_MINING_SETTLE_SECONDS"] = int(
+    os.getenv("FAQ_MINING_SETTLE_SECONDS", "300")
+)
+# Write-behind chat persistence: when enabled, chat turns are buffered and inserted in
+# batches of up to CHAT_WRITE_BATCH_SIZE rows at least every CHAT_WRITE_FLUSH_INTERVAL
+# seconds instead of being committed one by one.
+app.config["CHAT_WRITE_BEHIND"] = os.getenv("CHAT_WRITE_BEHIND", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+app.config["CHAT_WRITE_BATCH_SIZE"] = int(os.getenv("CHAT_WRITE_BATCH_SIZE", "50"))
+app.config["CHAT_WRITE_FLUSH_INTERVAL"] = float(
+    os.getenv("CHAT_WRITE_FLUSH_INTERVAL", "0.5")
+)
+# Model call metering: usage records buffered per batch insert, and seconds between
+# background flushes of a partly filled batch.
+app.config["USAGE_METER_BATCH_SIZE"] = int(os.getenv("USAGE_METER_BATCH_SIZE", "50"))
+app.config["USAGE_METER_FLUSH_INTERVAL"] = float(
+    os.getenv("USAGE_METER_FLUSH_INTERVAL", "5")
+)
+# Chat rate limits: token buckets refilled at *_PER_MINUTE and holding up to *_BURST
+# (defaulting to one minute's worth), on chat turns and on model tokens, per user and
+# across all users. A rate of 0 disables that limit. CHAT_RATE_STORE may be "filesystem"
+# (shared by every worker on the host, in CHAT_RATE_DIR) or "memory" (per process).
+app.config["CHAT_RATE_LIMIT"] = os.getenv("CHAT_RATE_LIMIT", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+app.config["CHAT_RATE_STORE"] = os.getenv("CHAT_RATE_STORE", "filesystem")
+app.config["CHAT_RATE_DIR"] = os.getenv("CHAT_RATE_DIR", "chat_rate_limits")
+app.config["CHAT_RATE_USER_TURNS_PER_MINUTE"] = float(
+    os.getenv("CHAT_RATE_USER_TURNS_PER_MINUTE", "10")
+)
+app.config["CHAT_RATE_USER_TURNS_BURST"] = float(
+    os.getenv("CHAT_RATE_USER_TURNS_BURST", "5")
+)
+app.config["CHAT_RATE_GLOBAL_TURNS_PER_MINUTE"] = float(
+    os.getenv("CHAT_RATE_GLOBAL_TURNS_PER_MINUTE", "600")
+)
+app.config["CHAT_RATE_GLOBAL_TURNS_BURST"] = float(
+    os.getenv("CHAT_RATE_GLOBAL_TURNS_BURST", "100")
+)
+app.config["CHAT_RATE_USER_TOKENS_PER_MINUTE"] = float(
+    os.getenv("CHAT_RATE_USER_TOKENS_PER_MINUTE", "10000")
+)
+app.config["CHAT_RATE_USER_TOKENS_BURST"] = float(
+    os.getenv("CHAT_RATE_USER_TOKENS_BURST", "0")
+)
+app.config["CHAT_RATE_GLOBAL_TOKENS_PER_MINUTE"] = float(
+    os.getenv("CHAT_RATE_GLOBAL_TOKENS_PER_MINUTE", "200000")
+)
+app.config["CHAT_RATE_GLOBAL_TOKENS_BURST"] = float(
+    os.getenv("CHAT_RATE_GLOBAL_TOKENS_BURST", "0")
+)
+
+# Upstream model API protection
+# Concurrent OpenAI calls per process, and seconds to wait for a free slot.
+app.config["OPENAI_MAX_CONCURRENCY"] = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+app.config["OPENAI_ACQUIRE_TIMEOUT"] = float(os.getenv("OPENAI_ACQUIRE_TIMEOUT", "0.5"))
+# Seconds per attempt, total seconds per call including retries, and retry backoff.
+app.config["OPENAI_CALL_TIMEOUT"] = float(os.getenv("OPENAI_CALL_TIMEOUT", "20"))
+app.config["OPENAI_DEADLINE"] = float(os.getenv("OPENAI_DEADLINE", "30"))
+app.config["OPENAI_MAX_RETRIES"] = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+app.config["OPENAI_RETRY_BASE_DELAY"] = float(
+    os.getenv("OPENAI_RETRY_BASE_DELAY", "0.25")
+)
+# Circuit breaker: opens when the failure or slow-call rate over the last
+# OPENAI_BREAKER_WINDOW calls crosses its threshold, for OPENAI_BREAKER_RESET_TIMEOUT seconds.
+app.config["OPENAI_BREAKER_WINDOW"] = int(os.getenv("OPENAI_BREAKER_WINDOW", "20"))
+app.config["OPENAI_BREAKER_MIN_CALLS"] = int(
+    os.getenv("OPENAI_BREAKER_MIN_CALLS", "10")
+)
+app.config["OPENAI_BREAKER_FAILURE_RATE"] = float(
+    os.getenv("OPENAI_BREAKER_FAILURE_RATE", "0.5")
+)
+app.config["OPENAI_BREAKER_SLOW_CALL_SECONDS"] = float(
+    os.getenv("OPENAI_BREAKER_SLOW_CALL_SECONDS", "10")
+)
+app.config["OPENAI_BREAKER_SLOW_CALL_RATE"] = float(
+    os.getenv("OPENAI_BREAKER_SLOW_CALL_RATE", "0.8")
+)
+app.config["OPENAI_BREAKER_RESET_TIMEOUT"] = float(
+    os.getenv("OPENAI_BREAKER_RESET_TIMEOUT", "30")
+)
 app.json.compact = False
+if app.config["PROXY_FIX_X_FOR"] or app.config["PROXY_FIX_X_PROTO"]:
+    app.wsgi_app = ProxyFix(
+        app.wsgi_app,
+        x_for=app.config["PROXY_FIX_X_FOR"],
+        x_proto=app.config["PROXY_FIX_X_PROTO"],
+    )
 CORS(app)
 # Define metadata, instantiate db
 metadata = MetaData(
     naming_convention={
         "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
+        "ix": "ix_%(column_0_label)s",
     }
 )
 db = SQLAlchemy(metadata=metadata)
@@ -67,9 +372,12 @@ ma.init_app(app)
 migrate = Migrate(app, db)
 db.init_app(app)
 bcrypt = Bcrypt(app)
+password_hasher = create_password_hasher(app.config)
 app.openai_client = openai_client
 # Instantiate REST API
 api = Api(app)
+# Instantiate WebSocket routes
+sock = Sock(app)
 
 # Instantiate CORS
 CORS(app, resources={r"/api/*": {"origins": "*"}})
@@ -0,0 +1,85 @@
+# context_builder.py: Packs the chat prompt into a token budget.
+# Tokens are counted locally, so prompt size is known before the request leaves the server.
+
+import math
+import re
+
+# Word runs, number runs and single punctuation marks roughly match how GPT tokenizers
+# split English text; long words are charged one token per four characters.
+TOKEN_PATTERN = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+# Per-message framing overhead and reply priming used by the chat completions format.
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+
+
+def count_tokens(text):
+    """
+    Estimates the number of model tokens in a piece of text without calling the API.
+
+    Args:
+    text (str): The text to measure.
+
+    Returns:
+    int: The estimated token count.
+    """
+    if not text:
+        return 0
+    return sum(
+        max(1, math.ceil(len(piece) / 4)) for piece in TOKEN_PATTERN.findall(text)
+    )
+
+
+def count_message_tokens(message):
+    """
+    Estimates the tokens a single chat message adds to a request, including framing.
+    """
+    return TOKENS_PER_MESSAGE + count_tokens(message["content"])
+
+
+def build_context(system_message, turns, user_message, budget, summary=None):
+    """
+    Packs the system prompt, prior turns and the new user message into a token budget.
+
+    The system message, the conversation summary (when given) and the new user message
+    are always included. Prior turns are added newest first, each as its user message
+    followed by the assistant response, until the next turn would exceed the budget; the
+    packed turns keep their original chronological order in the payload.
+
+    Args:
+    system_message (dict): The system message.
+    turns (iterable): Prior (message, response) pairs, oldest first.
+    user_message (str): The new user message.
+    budget (int): Maximum number of prompt tokens.
+    summary (str): Optional summary of older turns, sent after the system message.
+
+    Returns:
+    tuple: (list of OpenAI messages, estimated prompt tokens used).
+    """
+    current = {"role": "user", "content": user_message}
+    head = [system_message]
+    if summary:
+        head.append(
+            {
+                "role": "system",
+                "content": f"Summary of the earlier conversation: {summary}",
+            }
+        )
+    used = (
+        TOKENS_PER_REPLY
+        + sum(count_message_tokens(item) for item in head)
+        + count_message_tokens(current)
+    )
+
+    packed = []
+    for message, response in reversed(list(turns)):
+        turn = [{"role": "user", "content": message}]
+        if response:
+            turn.append({"role": "assistant", "content": response})
+        cost = sum(count_message_tokens(item) for item in turn)
+        if used + cost > budget:
+            break
+        packed[:0] = turn
+        used += cost
+
+    return head + packed + [current], used
@@ -0,0 +1,118 @@
+# context_cache.py: Per-user cache of recent conversation turns and the open session id.
+# Lets a warm chat turn build its prompt without querying ChatMessage or UserSession.
+
+import threading
+from collections import OrderedDict, deque
+
+
+class UserContext:
+    """
+    Cached chat state for one user.
+
+    Attributes:
+    - session_id: Id of the user's open UserSession, or None.
+    - turns: Ring buffer of the most recent (message, response) pairs, oldest first.
+    - summary: Rolling summary of the open session's older turns, or None.
+    """
+
+    __slots__ = ("session_id", "turns", "summary")
+
+    def __init__(self, session_id, turns, max_turns, summary=None):
+        self.session_id = session_id
+        self.turns = deque(turns, maxlen=max_turns)
+        self.summary = summary
+
+
+class ConversationContextCache:
+    """
+    Process-local cache of UserContext entries, bounded to max_users with LRU eviction.
+
+    Entries are loaded from the database on a miss, updated write-through when a chat
+    turn is committed and invalidated when the user's session changes (login, logout,
+    account deletion). Each worker keeps its own cache and only the worker serving a
+    login or logout invalidates its entry, so lookups pass the session id from the
+    user's Flask session and an entry cached for another session counts as a miss.
+    """
+
+    def __init__(self, max_turns=3, max_users=10000):
+        self.max_turns = max_turns
+        self.max_users = max_users
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, session_id=None):
+        """
+        Returns a snapshot of the cached UserContext for user_id, or None on a miss.
+        With a session_id, an entry cached for another session is dropped and missed.
+        The snapshot is safe to read while other threads record new turns.
+        """
+        with self._lock:
+            context = self._entries.get(user_id)
+            if context is not None and session_id not in (None, context.session_id):
+                del self._entries[user_id]
+                self.stale += 1
+                context = None
+            if context is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(user_id)
+            return UserContext(
+                context.session_id, context.turns, self.max_turns, context.summary
+            )
+
+    def load(self, user_id, session_id, turns, summary=None):
+        """
+        Stores freshly loaded state for user_id and returns its UserContext.
+
+        Args:
+        user_id (int): The user the state belongs to.
+        session_id (int): Id of the user's open UserSession, or None.
+        turns (list): Recent (message, response) pairs, oldest first.
+        summary (str): Rolling summary of the open session, or None.
+        """
+        context = UserContext(session_id, turns, self.max_turns, summary)
+        with self._lock:
+            self._entries[user_id] = context
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+            return UserContext(
+                context.session_id, context.turns, self.max_turns, context.summary
+            )
+
+    def append(self, user_id, session_id, message, response):
+        """
+        Records a committed chat turn for a cached user. Users without an entry are left
+        alone; their state is loaded from the database on the next turn.
+        """
+        with self._lock:
+            context = self._entries.get(user_id)
+            if context is not None:
+                context.session_id = session_id
+                context.turns.append((message, response))
+
+    def set_summary(self, user_id, session_id, summary):
+        """Records a refreshed session summary for a cached user."""
+        with self._lock:
+            context = self._entries.get(user_id)
+            if context is not None and context.session_id == session_id:
+                context.summary = summary
+
+    def invalidate(self, user_id):
+        """Drops the cached state for user_id."""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def stats(self):
+        """Returns hit/miss counters and the number of cached users."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "users": len(self._entries),
+            "max_turns": self.max_turns,
+        }
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Exports stored chat turns as training data.
+
+Each run only reads the chat messages stored since the previous run of the same target,
+leaves turns younger than CHAT_EXPORT_SETTLE_SECONDS for the next run, skips turns whose
+content was already exported, and writes the rest either as
+AITrainingData rows or as gzipped JSONL shards in CHAT_EXPORT_DIR. Each example is a
+{"messages": [user, assistant]} chat fine-tuning record.
+
+Usage:
+   python export_chat_turns.py --target ai_training_data
+   python export_chat_turns.py --target jsonl --output-dir exports/
+"""
+
+import argparse
+
+from app import app
+from chat_export import JSONL, TARGETS, create_chat_exporter
+
+
+def main():
+    """
+    Parses command-line options and runs one incremental export.
+    """
+    parser = argparse.ArgumentParser(description="Export chat turns as training data")
+    parser.add_argument("--target", choices=TARGETS, default=JSONL)
+    parser.add_argument("--output-dir", help="JSONL shard directory")
+    parser.add_argument("--batch-size", type=int)
+    parser.add_argument("--window-size", type=int)
+    args = parser.parse_args()
+
+    config = dict(app.config)
+    if args.output_dir:
+        config["CHAT_EXPORT_DIR"] = args.output_dir
+    if args.batch_size:
+        config["CHAT_EXPORT_BATCH_SIZE"] = args.batch_size
+    if args.window_size:
+        config["CHAT_EXPORT_WINDOW_SIZE"] = args.window_size
+
+    exporter = create_chat_exporter(config, args.target)
+    with app.app_context():
+        result = exporter.run()
+    print(
+        f"Read {result['read']} chat turns through ChatMessage "
+        f"{result['last_message_id']}: {result['exported']} exported, "
+        f"{result['duplicates']} duplicates skipped."
+    )
+    for path in getattr(exporter.sink, "paths", ()):
+        print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+Local OpenAI-Compatible Stand-In Server
+
+Serves a fake /v1/chat/completions endpoint (regular and streaming) so the chat path can be
+load-tested offline and upstream slowness or failures can be reproduced deterministically.
+Replies are canned text; latency, error rates and token rates are configurable.
+
+Usage:
+1. Start the stand-in:
+   python fake_openai.py --port 8001 --latency lognormal --latency-mean 0.8 --token-rate 40
+2. Point the app at it by setting in your .env file:
+   OPENAI_BASE_URL='http://127.0.0.1:8001/v1'
+   OPENAI_API_KEY is optional while OPENAI_BASE_URL is set.
+3. Run the Flask app (or ai.py) as usual; every model call now goes to the stand-in.
+
+Latency distributions (time to first token, in seconds):
+- fixed: always --latency-mean.
+- uniform: between --latency-min and --latency-max.
+- normal: mean --latency-mean, standard deviation --latency-stddev, clipped at 0.
+- lognormal: median --latency-mean, shape --latency-stddev (long-tailed, like real APIs).
+- exponential: mean --latency-mean.
+
+After the first token, completion tokens are produced at --token-rate tokens per second.
+--error-rate and --rate-limit-rate are probabilities (0-1) of answering with a 500 or 429.
+--seed makes the latency and error sequence reproducible.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+
+from context_builder import count_tokens
+from flask import Flask, Response, jsonify, request
+
+CANNED_REPLY = (
+    "Thanks for reaching out to FuturePhone Tech Support. I understand how frustrating "
+    "this can be, and I'm here to help. Please open Settings > System > Software Update "
+    "on your VisionX phone, make sure the battery is at least 50% charged, and let me "
+    "know what you see so we can work through the next steps together."
+)
+
+DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+
+class FakeUpstream:
+    """
+    Samples latency, errors and reply tokens for the stand-in server.
+
+    All randomness comes from a single seeded generator guarded by a lock, so a given
+    seed and request order always produce the same behavior.
+    """
+
+    def __init__(
+        self,
+        latency="fixed",
+        latency_mean=0.5,
+        latency_stddev=0.25,
+        latency_min=0.1,
+        latency_max=1.0,
+        token_rate=50.0,
+        error_rate=0.0,
+        rate_limit_rate=0.0,
+        reply=CANNED_REPLY,
+        seed=None,
+    ):
+        if latency not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {latency}")
+        self.latency = latency
+        self.latency_mean = latency_mean
+        self.latency_stddev = latency_stddev
+        self.latency_min = latency_min
+        self.latency_max = latency_max
+        self.token_rate = token_rate
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.reply = reply
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def first_token_delay(self):
+        """Returns a sampled time to first token, in seconds."""
+        with self._lock:
+            if self.latency == "uniform":
+                return self._random.uniform(self.latency_min, self.latency_max)
+            if self.latency == "normal":
+                return max(
+                    0.0, self._random.gauss(self.latency_mean, self.latency_stddev)
+                )
+            if self.latency == "lognormal":
+                return self.latency_mean * self._random.lognormvariate(
+                    0.0, self.latency_stddev
+                )
+            if self.latency == "exponential":
+                return self._random.expovariate(1.0 / self.latency_mean)
+            return self.latency_mean
+
+    def sample_error(self):
+        """Returns an HTTP status to fail the request with, or None to succeed."""
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500
+        return None
+
+    def token_delay(self):
+        """Returns the delay between two completion tokens, in seconds."""
+        return 1.0 / self.token_rate if self.token_rate > 0 else 0.0
+
+    def reply_tokens(self, max_tokens):
+        """Splits the canned reply into word tokens, truncated to max_tokens."""
+        words = self.reply.split(" ")
+        if max_tokens:
+            words = words[:max_tokens]
+        return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+
+def create_app(upstream):
+    """
+    Builds the Flask app serving the OpenAI-compatible endpoints for an upstream model.
+    """
+    fake_app = Flask(__name__)
+
+    def error_response(status):
+        if status == 429:
+            message, error_type = "Simulated rate limit", "rate_limit_exceeded"
+        else:
+            message, error_type = "Simulated upstream error", "server_error"
+        return jsonify({"error": {"message": message, "type": error_type}}), status
+
+    @fake_app.route("/v1/models", methods=["GET"])
+    def list_models():
+        return jsonify(
+            {
+                "object": "list",
+                "data": [
+                    {"id": "gpt-3.5-turbo", "object": "model", "owned_by": "fake"}
+                ],
+            }
+        )
+
+    @fake_app.route("/v1/chat/completions", methods=["POST"])
+    def chat_completions():
+        data = request.get_json() or {}
+        model = data.get("model", "gpt-3.5-turbo")
+        messages = data.get("messages", [])
+        tokens = upstream.reply_tokens(data.get("max_tokens"))
+        prompt_tokens = sum(count_tokens(msg.get("content") or "") for msg in messages)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        time.sleep(upstream.first_token_delay())
+        status = upstream.sample_error()
+        if status:
+            return error_response(status)
+
+        if not data.get("stream"):
+            time.sleep(upstream.token_delay() * max(len(tokens) - 1, 0))
+            return jsonify(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {
+                                "role": "assistant",
+                                "content": "".join(tokens),
+                            },
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": len(tokens),
+                        "total_tokens": prompt_tokens + len(tokens),
+                    },
+                }
+            )
+
+        def chunk(delta, finish_reason=None):
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                ],
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        def generate():
+            yield chunk({"role": "assistant", "content": ""})
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(upstream.token_delay())
+                yield chunk({"content": token})
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return Response(generate(), mimetype="text/event-stream")
+
+    return fake_app
+
+
+def main():
+    """
+    Parses command-line options and runs the stand-in server.
+    """
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", choices=DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--latency-mean", type=float, default=0.5)
+    parser.add_argument("--latency-stddev", type=float, default=0.25)
+    parser.add_argument("--latency-min", type=float, default=0.1)
+    parser.add_argument("--latency-max", type=float, default=1.0)
+    parser.add_argument("--token-rate", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    upstream = FakeUpstream(
+        latency=args.latency,
+        latency_mean=args.latency_mean,
+        latency_stddev=args.latency_stddev,
+        latency_min=args.latency_min,
+        latency_max=args.latency_max,
+        token_rate=args.token_rate,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+    )
+    create_app(upstream).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+# faq_miner.py: FAQ mining over chat history and the FAQ fast path.
+# Past user messages are vectorized with hashed TF-IDF and grouped into clusters of
+# recurring questions, each with a canonical answer. Incoming messages that closely match
+# a well-populated cluster are answered directly, without a model call.
+
+import logging
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+
+import numpy as np
+from completion_cache import is_standalone
+from config import db
+from models import ChatMessage, FaqCluster, FaqMiningState, ModelCallUsage
+from sqlalchemy import exists
+from support_index import tokenize
+from usage_meter import FAQ
+
+
+class HashedTfidf:
+    """
+    TF-IDF vectorizer over a fixed number of hashed term buckets, so vectors from
+    different runs stay comparable without storing a vocabulary.
+
+    Attributes:
+    - dim: Number of term buckets.
+    - document_frequencies: Documents seen per bucket.
+    - document_count: Documents seen in total.
+    """
+
+    def __init__(self, dim, document_frequencies=None, document_count=0):
+        self.dim = dim
+        if document_frequencies is None:
+            document_frequencies = np.zeros(dim, dtype=np.float64)
+        self.document_frequencies = document_frequencies
+        self.document_count = document_count
+
+    def buckets(self, text):
+        """Returns the bucket index of every term in a text."""
+        return np.array(
+            [zlib.crc32(term.encode("utf-8")) % self.dim for term in tokenize(text)],
+            dtype=np.int64,
+        )
+
+    def fit(self, texts):
+        """Adds the document frequencies of texts."""
+        for text in texts:
+            self.document_frequencies[np.unique(self.buckets(text))] += 1
+            self.document_count += 1
+
+    def transform(self, texts):
+        """
+        Returns the L2-normalized TF-IDF vectors of texts as a (len(texts), dim) matrix.
+        Texts without any terms get a zero row.
+        """
+        idf = (
+            np.log((1 + self.document_count) / (1 + self.document_frequencies)) + 1
+        ).astype(np.float32)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            np.add.at(matrix[row], self.buckets(text), 1.0)
+        matrix *= idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+
+def pack_vector(vector, max_terms):
+    """
+    Packs the max_terms largest entries of a vector into bytes: int32 indexes followed
+    by float32 values.
+    """
+    nonzero = np.flatnonzero(vector)
+    if len(nonzero) > max_terms:
+        nonzero = nonzero[np.argsort(vector[nonzero])[-max_terms:]]
+    nonzero = np.sort(nonzero)
+    return (
+        nonzero.astype(np.int32).tobytes()
+        + vector[nonzero].astype(np.float32).tobytes()
+    )
+
+
+def unpack_vector(data, dim):
+    """Unpacks bytes written by pack_vector into a dense, L2-normalized vector."""
+    count = len(data) // 8
+    indexes = np.frombuffer(data[: count * 4], dtype=np.int32)
+    values = np.frombuffer(data[count * 4 :], dtype=np.float32)
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[indexes] = values
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class FaqMiner:
+    """
+    Incrementally clusters chat history into FAQ clusters.
+
+    Attributes:
+    - dim: Hashed term buckets per vector.
+    - cluster_threshold: Cosine similarity to a centroid at which a message joins that
+      cluster instead of starting a new one.
+    - centroid_terms: Largest centroid entries kept when a centroid is stored.
+    - min_terms: Messages with fewer terms than this are skipped, as are follow-ups
+      that need the conversation history (see completion_cache.is_standalone).
+    - min_cluster_size: Clusters started in a run are stored only if they reach this
+      size within it; smaller ones are dropped.
+    - settle_seconds: Messages younger than this are left for a later run.
+
+    Each run reads only the chat messages newer than the stored watermark. Ids are handed
+    out before their transactions commit, so a message can become visible after a higher
+    id was already mined; the watermark therefore only advances over messages older than
+    settle_seconds, which must exceed the longest write (including the write-behind
+    buffer) for no message to be skipped. Each message joins its most similar cluster,
+    whose centroid is updated as a running mean, or starts a new one. A cluster's
+    canonical answer is the response of the member closest to its centroid.
+    """
+
+    def __init__(
+        self,
+        dim=4096,
+        cluster_threshold=0.6,
+        centroid_terms=128,
+        min_terms=2,
+        min_cluster_size=2,
+        settle_seconds=300,
+    ):
+        self.dim = dim
+        self.cluster_threshold = cluster_threshold
+        self.centroid_terms = centroid_terms
+        self.min_terms = min_terms
+        self.min_cluster_size = min_cluster_size
+        self.settle_seconds = settle_seconds
+
+    def run(self, batch_size=1000):
+        """
+        Mines every settled chat message newer than the watermark. Must run in an app
+        context.
+
+        Returns:
+        dict: Messages processed, clusters created and clusters updated.
+        """
+        state = db.session.get(FaqMiningState, 1)
+        if state is None:
+            state = FaqMiningState(id=1, last_message_id=0, document_count=0)
+        elif state.dimensions != self.dim:
+            raise ValueError(
+                f"FAQ state was built with {state.dimensions} dimensions, not {self.dim}"
+            )
+        vectorizer = HashedTfidf(
+            self.dim,
+            (
+                np.frombuffer(state.document_frequencies, dtype=np.float64).copy()
+                if state.document_frequencies
+                else None
+            ),
+            state.document_count,
+        )
+
+        clusters = FaqCluster.query.order_by(FaqCluster.id).all()
+        # Centroid rows, grown by doubling as clusters are added
+        centroids = np.zeros((max(64, 2 * len(clusters)), self.dim), dtype=np.float32)
+        for index, cluster in enumerate(clusters):
+            centroids[index] = unpack_vector(cluster.centroid, self.dim)
+        touched = set()
+        created = updated = processed = 0
+        settled_before = datetime.utcnow() - timedelta(seconds=self.settle_seconds)
+
+        settling = False
+        while not settling:
+            rows = (
+                db.session.query(
+                    ChatMessage.id,
+                    ChatMessage.message,
+                    ChatMessage.response,
+                    ChatMessage.timestamp,
+                )
+                .filter(ChatMessage.id > state.last_message_id)
+                # Turns answered from the FAQ would feed clusters their own answers
+                .filter(
+                    ~exists().where(
+                        ModelCallUsage.chat_message_id == ChatMessage.id,
+                        ModelCallUsage.cache_status == FAQ,
+                    )
+                )
+                .order_by(ChatMessage.id)
+                .limit(batch_size)
+                .all()
+            )
+            # Stop at the first message still settling; lower ids may yet commit behind it
+            for index, row in enumerate(rows):
+                if row.timestamp > settled_before:
+                    rows = rows[:index]
+                    settling = True
+                    break
+            if not rows:
+                break
+            state.last_message_id = rows[-1].id
+            rows = [
+                row
+                for row in rows
+                if row.response
+                and len(tokenize(row.message)) >= self.min_terms
+                and is_standalone(row.message)
+            ]
+            texts = [row.message for row in rows]
+            vectorizer.fit(texts)
+            vectors = vectorizer.transform(texts)
+
+            for row, vector in zip(rows, vectors):
+                processed += 1
+                count = len(clusters)
+                similarity = centroids[:count] @ vector
+                best = int(np.argmax(similarity)) if count else -1
+                if best >= 0 and similarity[best] >= self.cluster_threshold:
+                    cluster = clusters[best]
+                    cluster.size += 1
+                    centroid = (
+                        centroids[best] + (vector - centroids[best]) / cluster.size
+                    )
+                    centroids[best] = centroid / (np.linalg.norm(centroid) or 1.0)
+                    member_similarity = float(centroids[best] @ vector)
+                    if member_similarity >= cluster.representative_similarity:
+                        cluster.question = row.message
+                        cluster.answer = row.response
+                        cluster.representative_similarity = member_similarity
+                    touched.add(best)
+                    continue
+
+                if count == len(centroids):
+                    centroids = np.vstack([centroids, np.zeros_like(centroids)])
+                centroids[count] = vector
+                clusters.append(
+                    FaqCluster(
+                        question=row.message,
+                        answer=row.response,
+                        size=1,
+                        representative_similarity=1.0,
+                    )
+                )
+                touched.add(count)
+
+        for index in touched:
+            if clusters[index].id is not None:
+                updated += 1
+            elif clusters[index].size >= self.min_cluster_size:
+                created += 1
+            else:
+                # Questions asked once in this run are not worth storing
+                continue
+            clusters[index].centroid = pack_vector(
+                centroids[index], self.centroid_terms
+            )
+            clusters[index].updated_at = datetime.utcnow()
+            db.session.add(clusters[index])
+        state.dimensions = self.dim
+        state.document_count = vectorizer.document_count
+        state.document_frequencies = vectorizer.document_frequencies.tobytes()
+        state.updated_at = datetime.utcnow()
+        db.session.add(state)
+        db.session.commit()
+        return {
+            "processed": processed,
+            "created": created,
+            "updated": updated,
+            "last_message_id": state.last_message_id,
+        }
+
+
+class FaqIndex:
+    """
+    Serves FAQ answers for incoming messages.
+
+    Attributes:
+    - threshold: Cosine similarity to a cluster centroid required to answer directly.
+    - min_cluster_size: Clusters with fewer members are never served.
+    - reload_interval: Seconds between checks for a newer mining run.
+
+    Clusters are held in memory as one centroid matrix; a match is a single
+    matrix-vector product. Lookups must run in an app context.
+    """
+
+    def __init__(self, threshold=0.8, min_cluster_size=5, reload_interval=60.0):
+        self.threshold = threshold
+        self.min_cluster_size = min_cluster_size
+        self.reload_interval = reload_interval
+        self._vectorizer = None
+        self._centroids = None
+        self._answers = []
+        self._cluster_ids = []
+        self._loaded_at = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self.counters = {"matches": 0, "misses": 0}
+
+    def _refresh(self):
+        """Reloads the clusters if a mining run finished since the last load."""
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.reload_interval:
+                return
+            self._checked_at = now
+            try:
+                state = db.session.get(FaqMiningState, 1)
+                if state is None or state.updated_at == self._loaded_at:
+                    return
+                clusters = (
+                    db.session.query(
+                        FaqCluster.id, FaqCluster.answer, FaqCluster.centroid
+                    )
+                    .filter(
+                        FaqCluster.enabled.is_(True),
+                        FaqCluster.size >= self.min_cluster_size,
+                    )
+                    .all()
+                )
+                dim = state.dimensions
+                self._vectorizer = HashedTfidf(
+                    dim,
+                    np.frombuffer(state.document_frequencies, dtype=np.float64),
+                    state.document_count,
+                )
+                self._centroids = np.array(
+                    [unpack_vector(cluster.centroid, dim) for cluster in clusters],
+                    dtype=np.float32,
+                ).reshape(len(clusters), dim)
+                self._answers = [cluster.answer for cluster in clusters]
+                self._cluster_ids = [cluster.id for cluster in clusters]
+                self._loaded_at = state.updated_at
+            except Exception as e:
+                logging.error(f"Error loading FAQ clusters: {str(e)}")
+
+    def match(self, message):
+        """
+        Returns (cluster id, answer, similarity) for the best matching FAQ cluster, or
+        None if no cluster is similar enough.
+        """
+        self._refresh()
+        vectorizer, centroids = self._vectorizer, self._centroids
+        if vectorizer is None or not len(centroids):
+            return None
+        vector = vectorizer.transform([message])[0]
+        similarity = centroids @ vector
+        best = int(np.argmax(similarity))
+        matched = similarity[best] >= self.threshold
+        with self._counter_lock:
+            self.counters["matches" if matched else "misses"] += 1
+        if not matched:
+            return None
+        return self._cluster_ids[best], self._answers[best], float(similarity[best])
+
+    def stats(self):
+        """Returns match counters and the number of clusters served."""
+        with self._counter_lock:
+            data = dict(self.counters)
+        data["clusters"] = len(self._answers)
+        return data
+
+
+def create_faq_index(config):
+    """
+    Creates the FAQ fast path index from the FAQ_* settings in the app config, or returns
+    None when FAQ_FAST_PATH is off.
+    """
+    if not config["FAQ_FAST_PATH"]:
+        return None
+    return FaqIndex(
+        threshold=config["FAQ_MATCH_THRESHOLD"],
+        min_cluster_size=config["FAQ_MIN_CLUSTER_SIZE"],
+        reload_interval=config["FAQ_RELOAD_INTERVAL"],
+    )
+
+
+def create_faq_miner(config):
+    """Creates the FAQ miner from the FAQ_* settings in the app config."""
+    return FaqMiner(
+        dim=config["FAQ_VECTOR_DIM"],
+        cluster_threshold=config["FAQ_CLUSTER_THRESHOLD"],
+        centroid_terms=config["FAQ_CENTROID_TERMS"],
+        min_cluster_size=config["FAQ_MINING_MIN_CLUSTER_SIZE"],
+        settle_seconds=config["FAQ_MINING_SETTLE_SECONDS"],
+    )
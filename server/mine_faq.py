@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Mines recurring questions from chat history into FAQ clusters.
+
+Run it periodically, e.g. from cron. Each run only reads the chat messages stored since
+the previous run and folds them into the existing clusters, so it stays cheap as the
+history grows. Messages younger than FAQ_MINING_SETTLE_SECONDS wait for the next run.
+Running servers pick up the new clusters within FAQ_RELOAD_INTERVAL.
+
+Usage:
+   python mine_faq.py
+   python mine_faq.py --batch-size 5000
+"""
+
+import argparse
+
+from app import app
+from faq_miner import create_faq_miner
+
+
+def main():
+    """
+    Parses command-line options and runs one incremental mining pass.
+    """
+    parser = argparse.ArgumentParser(description="Mine FAQ clusters from chat history")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    with app.app_context():
+        result = create_faq_miner(app.config).run(batch_size=args.batch_size)
+    print(
+        f"Mined {result['processed']} messages through ChatMessage "
+        f"{result['last_message_id']}: {result['created']} clusters created, "
+        f"{result['updated']} updated."
+    )
+
+
+if __name__ == "__main__":
+    main()
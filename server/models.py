@@ -12,7 +12,7 @@ from app_utils import (
     validate_not_blank,
     validate_positive_number,
 )
-from config import bcrypt, db
+from config import db, password_hasher
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import validates
@@ -94,13 +94,13 @@ class UserAuth(db.Model, SerializerMixin):
         """
         Hashes the password before storing it in the database.
         """
-        self.password_hash = bcrypt.generate_password_hash(password).decode("utf-8")
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
         """
         Verifies password against the hash stored in the database
         """
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
 
     serialize_rules = (
         "-password_hash",
@@ -108,6 +108,15 @@ class UserAuth(db.Model, SerializerMixin):
     )
 
 
+# Serves username prefix searches (LIKE 'prefix%') and the (username, id) keyset of the
+# user listing on PostgreSQL. Prefix LIKEs only use a btree index under the C collation, and
+# a text_pattern_ops index cannot serve ORDER BY, so both run on username COLLATE "C".
+# SQLite compares text bytewise already and uses the unique username index.
+db.Index(
+    "ix_user_auth_username_c_id", UserAuth.username.collate("C"), UserAuth.id
+).ddl_if(dialect="postgresql")
+
+
 class ShippingInfo(db.Model, SerializerMixin):
     """
     ShippingInfo Model: Stores shipping information for users.
@@ -439,9 +448,17 @@ class ChatMessage(db.Model, SerializerMixin):
     - message: The content of the user's message.
     - response: The system's response to the user's message.
     - timestamp: The date and time when the message was exchanged.
+    - session_id: The UserSession the message was exchanged in.
+
+    Indexes on (user_id, id) and (session_id, id) serve newest-first history lookups and
+    keyset pagination by id.
     """
 
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        db.Index("ix_chat_messages_user_id_id", "user_id", "id"),
+        db.Index("ix_chat_messages_session_id_id", "session_id", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user_auth.id"), nullable=False)
@@ -457,6 +474,161 @@ class ChatMessage(db.Model, SerializerMixin):
         return f"<ChatMessage {self.id} User ID: {self.user_id}>"
 
 
+class ConversationSummary(db.Model, SerializerMixin):
+    """
+    Stores a rolling summary of the older turns of a chat session, so long conversations keep
+    their context without sending every message to the model.
+
+    Attributes:
+    - id: Unique identifier for the summary.
+    - session_id: The UserSession whose conversation is summarized; one summary per session.
+    - summary: Compact summary text of the folded turns.
+    - summarized_through_id: Id of the newest ChatMessage folded into the summary.
+    - turns_summarized: Number of chat messages folded into the summary so far.
+    - updated_at: Timestamp of the last refresh.
+    """
+
+    __tablename__ = "conversation_summaries"
+
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(
+        db.Integer, db.ForeignKey("user_sessions.id"), unique=True, nullable=False
+    )
+    summary = db.Column(db.Text, nullable=False, default="")
+    summarized_through_id = db.Column(db.Integer, nullable=False, default=0)
+    turns_summarized = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(
+        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+    )
+
+    session = db.relationship(
+        "UserSession",
+        backref=db.backref("summary", uselist=False, cascade="all, delete-orphan"),
+    )
+
+    def __repr__(self):
+        return f"<ConversationSummary {self.id} Session ID: {self.session_id}>"
+
+
+class ModelCallUsage(db.Model, SerializerMixin):
+    """
+    Records the token usage and latency of a single model call, for latency and spend analysis.
+
+    Attributes:
+    - id: Unique identifier for the record.
+    - chat_message_id: The ChatMessage the call produced; null for fallbacks, failed calls
+      and summary refreshes, and once the message is deleted.
+    - user_id: The user the call was made for. Not a foreign key, so usage history
+      outlives deleted users and sessions.
+    - session_id: The UserSession the call belongs to.
+    - call_type: "chat" for chat replies, "summary" for conversation summary refreshes.
+    - model: The model name sent to the API.
+    - prompt_tokens / completion_tokens / total_tokens: Token counts; 0 for cache hits.
+    - tokens_estimated: True when the API reported no usage (streamed replies) and the
+      counts were estimated locally.
+    - latency_ms: Wall time of the call, including cache lookups and retries.
+    - cache_status: "hit", "miss", "coalesced" (shared another call's result), "bypass"
+      (cache not used: opted out, or a follow-up depending on the conversation history),
+      or "faq" (answered from a mined FAQ cluster without a model call).
+    - streamed: True for streamed replies.
+    - success: False when the call failed or fell back.
+    - created_at: Timestamp of the call.
+    """
+
+    __tablename__ = "model_call_usage"
+
+    id = db.Column(db.Integer, primary_key=True)
+    chat_message_id = db.Column(
+        db.Integer,
+        db.ForeignKey("chat_messages.id", ondelete="SET NULL"),
+        nullable=True,
+        index=True,
+    )
+    user_id = db.Column(db.Integer, nullable=True, index=True)
+    session_id = db.Column(db.Integer, nullable=True, index=True)
+    call_type = db.Column(db.String(20), nullable=False, default="chat")
+    model = db.Column(db.String(100), nullable=False)
+    prompt_tokens = db.Column(db.Integer, nullable=False, default=0)
+    completion_tokens = db.Column(db.Integer, nullable=False, default=0)
+    total_tokens = db.Column(db.Integer, nullable=False, default=0)
+    tokens_estimated = db.Column(db.Boolean, nullable=False, default=False)
+    latency_ms = db.Column(db.Float, nullable=False, default=0)
+    cache_status = db.Column(db.String(20), nullable=False, default="miss")
+    streamed = db.Column(db.Boolean, nullable=False, default=False)
+    success = db.Column(db.Boolean, nullable=False, default=True)
+    created_at = db.Column(
+        db.DateTime, default=datetime.utcnow, nullable=False, index=True
+    )
+
+    chat_message = db.relationship(
+        "ChatMessage",
+        backref=db.backref("usage", passive_deletes=True),
+    )
+
+    def __repr__(self):
+        return f"<ModelCallUsage {self.id} Model: {self.model}>"
+
+
+class FaqCluster(db.Model, SerializerMixin):
+    """
+    A group of recurring user questions mined from chat history, with a canonical answer
+    the chat can serve without calling the model.
+
+    Attributes:
+    - id: Unique identifier for the cluster.
+    - question: The member question closest to the centroid.
+    - answer: The response given to that question, served for matching messages.
+    - size: Number of chat messages in the cluster.
+    - representative_similarity: Cosine similarity of the representative question to the
+      centroid when it was chosen.
+    - centroid: Packed sparse TF-IDF centroid (see faq_miner.pack_vector).
+    - enabled: Clusters can be switched off by hand if their answer should not be served.
+    - updated_at: Timestamp of the last mining run that changed the cluster.
+    """
+
+    __tablename__ = "faq_clusters"
+
+    id = db.Column(db.Integer, primary_key=True)
+    question = db.Column(db.Text, nullable=False)
+    answer = db.Column(db.Text, nullable=False)
+    size = db.Column(db.Integer, nullable=False, default=1)
+    representative_similarity = db.Column(db.Float, nullable=False, default=1.0)
+    centroid = db.Column(db.LargeBinary, nullable=False)
+    enabled = db.Column(db.Boolean, nullable=False, default=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    serialize_rules = ("-centroid",)
+
+    def __repr__(self):
+        return f"<FaqCluster {self.id} Size: {self.size}>"
+
+
+class FaqMiningState(db.Model):
+    """
+    Progress of FAQ mining, kept in a single row so each run only reads new messages.
+
+    Attributes:
+    - id: Always 1.
+    - last_message_id: Id of the newest ChatMessage mined (the watermark).
+    - dimensions: Hashed term buckets the vectors were built with.
+    - document_count / document_frequencies: TF-IDF statistics over all mined messages;
+      document_frequencies is a packed float64 array with one entry per bucket.
+    - updated_at: Timestamp of the last run; the serving index reloads when it changes.
+    """
+
+    __tablename__ = "faq_mining_state"
+
+    id = db.Column(db.Integer, primary_key=True)
+    last_message_id = db.Column(db.Integer, nullable=False, default=0)
+    dimensions = db.Column(db.Integer, nullable=True)
+    document_count = db.Column(db.Integer, nullable=False, default=0)
+    document_frequencies = db.Column(db.LargeBinary, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<FaqMiningState through ChatMessage {self.last_message_id}>"
+
+
 class AITrainingData(db.Model, SerializerMixin):
     """
     Represents AI training data points, storing the data used for AI model training along with timestamps.
@@ -475,3 +647,66 @@ class AITrainingData(db.Model, SerializerMixin):
 
     def __repr__(self):
         return f"<AITrainingData {self.id}>"
+
+
+class ChatExportState(db.Model):
+    """
+    Progress of a chat turn export target, so each run only reads new chat messages.
+
+    Attributes:
+    - target: Export target name, "ai_training_data" or "jsonl".
+    - last_message_id: Id of the newest ChatMessage exported (the watermark).
+    - exported: Turns written by the target so far.
+    - duplicates: Turns skipped because identical content was already exported.
+    - updated_at: Timestamp of the last run.
+    """
+
+    __tablename__ = "chat_export_state"
+
+    target = db.Column(db.String(32), primary_key=True)
+    last_message_id = db.Column(db.Integer, nullable=False, default=0)
+    exported = db.Column(db.Integer, nullable=False, default=0)
+    duplicates = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<ChatExportState {self.target} through ChatMessage {self.last_message_id}>"
+
+
+class ChatExportHash(db.Model):
+    """
+    Content hash of a chat turn already exported to a target, used to skip duplicates.
+
+    Attributes:
+    - target: Export target name.
+    - content_hash: SHA-256 hex digest of the normalized message and response.
+    """
+
+    __tablename__ = "chat_export_hashes"
+
+    target = db.Column(db.String(32), primary_key=True)
+    content_hash = db.Column(db.String(64), primary_key=True)
+
+    def __repr__(self):
+        return f"<ChatExportHash {self.target} {self.content_hash[:12]}>"
+
+
+class ServerSession(db.Model):
+    """
+    A server-side Flask session, stored by the "sql" session backend (see
+    session_store.py).
+
+    Attributes:
+    - id: The session id carried in the session cookie.
+    - data: The pickled session dict.
+    - expires_at: When the session expires; expired rows are removed by the sweeper.
+    """
+
+    __tablename__ = "server_sessions"
+
+    id = db.Column(db.String(255), primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<ServerSession expires {self.expires_at}>"
@@ -0,0 +1,184 @@
+# password_hasher.py: bcrypt hashing on a bounded per-process pool.
+# Password hashes and checks run on a small dedicated thread pool with a bounded queue. The
+# request thread still waits for its hash, but a burst of logins queues for a fixed number
+# of hashing threads, capping the CPU that sign-ins take in each process, and is refused
+# with 503 once the queue is full. The bcrypt cost is configurable; hashes made with another
+# cost are upgraded when their owner next signs in.
+
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import bcrypt
+from werkzeug.exceptions import ServiceUnavailable
+
+
+class PasswordHasherBusy(ServiceUnavailable):
+    """Raised when the hashing queue is full or a hash waited too long; responds 503."""
+
+    description = "Too many sign-in attempts right now, please try again shortly."
+
+    def __init__(self):
+        super().__init__(retry_after=1)
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies bcrypt passwords on a bounded pool of threads.
+
+    Attributes:
+    - rounds: bcrypt cost (log2 of the key expansion rounds) for new hashes.
+    - max_workers: Hashing threads in this process.
+    - max_pending: Hashes queued or running at once; further requests get
+      PasswordHasherBusy.
+    - timeout: Longest time, in seconds, a request waits for its hash.
+
+    bcrypt releases the GIL while hashing, so max_workers hashes run in parallel, each
+    keeping a core busy; the calling thread blocks until its hash is done. The limit is
+    per process: a host running several web workers hashes up to max_workers times their
+    number at once. Queue wait and hash time are kept for the most recent operations for
+    stats().
+    """
+
+    def __init__(self, rounds=12, max_workers=4, max_pending=64, timeout=10.0):
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="password-hash"
+        )
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._queue_waits = deque(maxlen=1000)
+        self._hash_times = deque(maxlen=1000)
+        self.counters = {
+            "hashes": 0,
+            "verifications": 0,
+            "rehashes": 0,
+            "rejected": 0,
+            "timeouts": 0,
+        }
+
+    def _run(self, fn, *args):
+        """Runs fn(*args) on the pool and returns its result."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.counters["rejected"] += 1
+            raise PasswordHasherBusy()
+        queued_at = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                finished = time.perf_counter()
+                self._slots.release()
+                with self._lock:
+                    self._queue_waits.append((started - queued_at) * 1000)
+                    self._hash_times.append((finished - started) * 1000)
+
+        def release_if_cancelled(done):
+            # A hash cancelled before it started never runs timed()
+            if done.cancelled():
+                self._slots.release()
+
+        future = self._executor.submit(timed)
+        future.add_done_callback(release_if_cancelled)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            with self._lock:
+                self.counters["timeouts"] += 1
+            raise PasswordHasherBusy()
+
+    def hash(self, password):
+        """Returns the bcrypt hash of a password with the configured cost, as text."""
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        hashed = self._run(bcrypt.hashpw, password.encode("utf-8"), salt)
+        with self._lock:
+            self.counters["hashes"] += 1
+        return hashed.decode("utf-8")
+
+    def verify(self, password_hash, password):
+        """Returns True if the password matches the stored bcrypt hash."""
+        try:
+            encoded_hash = password_hash.encode("utf-8")
+            bcrypt_cost(password_hash)
+        except (AttributeError, ValueError):
+            return False
+        matched = self._run(bcrypt.checkpw, password.encode("utf-8"), encoded_hash)
+        with self._lock:
+            self.counters["verifications"] += 1
+        return matched
+
+    def needs_rehash(self, password_hash):
+        """Returns True if a stored hash was made with a cost other than rounds."""
+        try:
+            return bcrypt_cost(password_hash) != self.rounds
+        except ValueError:
+            return False
+
+    def rehash(self, password):
+        """Hashes a verified password again with the configured cost."""
+        with self._lock:
+            self.counters["rehashes"] += 1
+        return self.hash(password)
+
+    def stats(self):
+        """Returns counters and queue wait and hash time summaries in milliseconds."""
+        with self._lock:
+            data = dict(self.counters)
+            queue_waits = sorted(self._queue_waits)
+            hash_times = sorted(self._hash_times)
+        data["rounds"] = self.rounds
+        data["workers"] = self.max_workers
+        data["queue_wait_ms"] = summarize(queue_waits)
+        data["hash_ms"] = summarize(hash_times)
+        return data
+
+
+def bcrypt_cost(password_hash):
+    """
+    Returns the cost of a bcrypt hash such as "$2b$12$...". Raises ValueError if the text
+    is not a bcrypt hash.
+    """
+    parts = password_hash.split("$")
+    if len(parts) != 4 or not parts[2].isdigit():
+        raise ValueError("Not a bcrypt hash")
+    return int(parts[2])
+
+
+def summarize(ordered):
+    """Returns the count, mean, p50, p95 and max of a sorted list of milliseconds."""
+    if not ordered:
+        return {"count": 0}
+
+    def percentile(pct):
+        return ordered[max(1, math.ceil(pct / 100 * len(ordered))) - 1]
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 2),
+        "p50": round(percentile(50), 2),
+        "p95": round(percentile(95), 2),
+        "max": round(ordered[-1], 2),
+    }
+
+
+def create_password_hasher(config):
+    """
+    Creates the password hasher from BCRYPT_LOG_ROUNDS and the PASSWORD_HASH_* settings
+    in the app config.
+    """
+    return PasswordHasher(
+        rounds=config["BCRYPT_LOG_ROUNDS"],
+        max_workers=config["PASSWORD_HASH_WORKERS"],
+        max_pending=config["PASSWORD_HASH_MAX_PENDING"],
+        timeout=config["PASSWORD_HASH_TIMEOUT"],
+    )
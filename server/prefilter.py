@@ -0,0 +1,292 @@
+# prefilter.py: Local pre-filter for chat messages.
+# Empty, abusive and clearly off-topic messages are answered with a templated reply before
+# any model call is made. Regex rules catch the obvious cases; an optional small linear
+# model trained on chat history (see train_prefilter.py) catches off-topic phrasing the
+# rules miss.
+
+import hashlib
+import json
+import logging
+import math
+import random
+import re
+import threading
+import zlib
+from pathlib import Path
+
+PASS = "pass"
+EMPTY = "empty"
+ABUSIVE = "abusive"
+OFF_TOPIC = "off_topic"
+
+# Audit trail of pre-filter decisions
+audit_log = logging.getLogger("prefilter")
+
+REPLIES = {
+    EMPTY: "It looks like your message came through empty. How can I help you with "
+    "your VisionX phone today?",
+    ABUSIVE: "I understand things can get frustrating, and I'm here to help. Let's keep "
+    "our conversation respectful so we can get your VisionX phone working for you. "
+    "What seems to be the problem?",
+    OFF_TOPIC: "I'm here to help with all things related to your VisionX phone. How can "
+    "I assist you with your device today?",
+}
+
+# Messages with no letters or digits at all
+EMPTY_PATTERN = re.compile(r"^[\W_]*$")
+
+# Insults and threats aimed at the agent. Swearing about the phone itself is frustration,
+# not abuse, and goes to the model.
+ABUSIVE_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (
+        r"\b(fuck|screw)\s+(you|off)\b",
+        r"\byou(\s+are|'re|\s+r)?\s+(an?\s+)?(stupid|useless|worthless|dumb|pathetic)"
+        r"(\s+(bot|ai|machine|piece of \w+))?\b",
+        r"\byou(\s+are|'re|\s+r)?\s+(an?\s+)?(idiot|moron|imbecile)s?\b",
+        r"\b(kill|hurt)\s+(yourself|you)\b",
+    )
+]
+
+# Requests that are clearly not about a phone, when no device vocabulary appears
+OFF_TOPIC_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (
+        r"\b(write|compose)\s+(me\s+)?(an?\s+)?(poem|essay|story|song|haiku|cover letter)",
+        r"\b(tell|know)\s+(me\s+)?(an?\s+)?(joke|riddle)s?\b",
+        r"\b(recipe|recipes|cook|bake)\b",
+        r"\bweather\b",
+        r"\bcapital\s+of\b",
+        r"\b(homework|math problem|solve\s+for\s+x)\b",
+        r"\b(stock|crypto|bitcoin)\s+(price|tip|tips)\b",
+        r"\bwho\s+(won|will win)\b",
+        r"\b(movie|tv show|netflix)\s+recommendation",
+        r"\bmeaning\s+of\s+life\b",
+    )
+]
+
+# Vocabulary that marks a message as possibly device related; rules never fire on these
+DEVICE_TERMS = frozenset("""
+    phone visionx futurephone device screen battery charge charging charger app apps
+    update software android settings wifi bluetooth camera call calls sms text storage
+    memory reset restart reboot sim network signal data account password pin lock
+    unlock warranty repair order shipping refund return recycle speaker microphone
+    volume notification notifications sync backup cloud email gps location
+    """.split())
+
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+def words(text):
+    """Splits text into lowercase words."""
+    return WORD_PATTERN.findall(text.lower())
+
+
+def features(text, buckets):
+    """
+    Returns the hashed bag-of-words features of a message: unigrams and bigrams mapped to
+    bucket indexes with crc32, so the same text hashes the same in every process.
+    """
+    tokens = words(text)
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    return [zlib.crc32(gram.encode("utf-8")) % buckets for gram in grams]
+
+
+class LinearModel:
+    """
+    Logistic regression over hashed word features, scoring how likely a message is
+    off-topic. Weights are stored sparsely as {bucket: weight}.
+    """
+
+    def __init__(self, weights=None, bias=0.0, buckets=2**16):
+        self.weights = weights or {}
+        self.bias = bias
+        self.buckets = buckets
+
+    def score(self, text):
+        """Returns the off-topic probability of a message, between 0 and 1."""
+        z = self.bias + sum(
+            self.weights.get(index, 0.0) for index in features(text, self.buckets)
+        )
+        return 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, z))))
+
+    @classmethod
+    def train(
+        cls, examples, buckets=2**16, epochs=10, learning_rate=0.2, l2=1e-4, seed=0
+    ):
+        """
+        Fits the model with stochastic gradient descent.
+
+        Args:
+        examples (list): (text, label) pairs; label 1 for off-topic, 0 otherwise.
+        The rarer class is weighted up so it is not drowned out.
+
+        Returns:
+        LinearModel: The trained model.
+        """
+        model = cls(buckets=buckets)
+        data = [(features(text, buckets), label) for text, label in examples]
+        positives = sum(label for _, label in data)
+        negatives = len(data) - positives
+        class_weight = {
+            1: len(data) / (2 * positives) if positives else 1.0,
+            0: len(data) / (2 * negatives) if negatives else 1.0,
+        }
+        rng = random.Random(seed)
+        for _ in range(epochs):
+            rng.shuffle(data)
+            for indexes, label in data:
+                z = model.bias + sum(model.weights.get(i, 0.0) for i in indexes)
+                prediction = 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, z))))
+                gradient = (prediction - label) * class_weight[label]
+                model.bias -= learning_rate * gradient
+                for i in indexes:
+                    weight = model.weights.get(i, 0.0)
+                    model.weights[i] = weight - learning_rate * (gradient + l2 * weight)
+        return model
+
+    def save(self, path):
+        """Writes the model to a JSON file."""
+        data = {
+            "buckets": self.buckets,
+            "bias": self.bias,
+            "weights": {str(i): round(w, 6) for i, w in self.weights.items() if w},
+        }
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+
+    @classmethod
+    def load(cls, path):
+        """Reads a model written by save()."""
+        with open(path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+        weights = {int(i): w for i, w in data["weights"].items()}
+        return cls(weights, data["bias"], data["buckets"])
+
+
+class Decision:
+    """The pre-filter's verdict on a message."""
+
+    __slots__ = ("label", "reason", "score")
+
+    def __init__(self, label, reason, score=None):
+        self.label = label
+        self.reason = reason
+        self.score = score
+
+    @property
+    def blocked(self):
+        return self.label != PASS
+
+    @property
+    def reply(self):
+        return REPLIES.get(self.label)
+
+
+class ChatPrefilter:
+    """
+    Decides whether a chat message needs the model at all.
+
+    Attributes:
+    - model: Optional LinearModel for off-topic messages.
+    - threshold: Model score at or above which a message counts as off-topic. Kept high
+      so only clear cases are short-circuited.
+    - enabled: When False every message passes.
+    - audit_chars: Leading characters of the message written to the audit log; 0 logs
+      only a hash and the length, so the log holds no message text.
+
+    Every decision that blocks a message is logged for auditing; passes are logged at
+    debug level.
+    """
+
+    def __init__(self, model=None, threshold=0.9, enabled=True, audit_chars=0):
+        self.model = model
+        self.threshold = threshold
+        self.enabled = enabled
+        self.audit_chars = audit_chars
+        self._lock = threading.Lock()
+        self.counters = {PASS: 0, EMPTY: 0, ABUSIVE: 0, OFF_TOPIC: 0}
+
+    def classify(self, message):
+        """
+        Returns the Decision for a message without logging or counting it. Anything but
+        a string counts as empty.
+        """
+        if not self.enabled:
+            return Decision(PASS, "disabled")
+        if not isinstance(message, str) or EMPTY_PATTERN.match(message):
+            return Decision(EMPTY, "no_text")
+        for index, pattern in enumerate(ABUSIVE_PATTERNS):
+            if pattern.search(message):
+                return Decision(ABUSIVE, f"abusive_rule_{index}")
+
+        if DEVICE_TERMS.intersection(words(message)):
+            return Decision(PASS, "device_terms")
+        for index, pattern in enumerate(OFF_TOPIC_PATTERNS):
+            if pattern.search(message):
+                return Decision(OFF_TOPIC, f"off_topic_rule_{index}")
+        if self.model:
+            score = self.model.score(message)
+            if score >= self.threshold:
+                return Decision(OFF_TOPIC, "model", score)
+            return Decision(PASS, "model", score)
+        return Decision(PASS, "no_rule")
+
+    def check(self, user_id, message):
+        """
+        Classifies a message, counts the decision and writes it to the audit log.
+        """
+        decision = self.classify(message)
+        with self._lock:
+            self.counters[decision.label] += 1
+        score = f"{decision.score:.3f}" if decision.score is not None else "-"
+        text = message if isinstance(message, str) else ""
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+        entry = (
+            f"Prefilter {decision.label} user={user_id} reason={decision.reason} "
+            f"score={score} message_sha256={digest} length={len(text)}"
+        )
+        if self.audit_chars:
+            entry += f" message={json.dumps(text[: self.audit_chars])}"
+        if decision.blocked:
+            audit_log.info(entry)
+        else:
+            audit_log.debug(entry)
+        return decision
+
+    def stats(self):
+        """Returns decision counters."""
+        with self._lock:
+            data = dict(self.counters)
+        data["model_loaded"] = self.model is not None
+        return data
+
+
+def create_prefilter(config):
+    """
+    Creates the chat pre-filter from the CHAT_PREFILTER_* settings in the app config.
+    The linear model is loaded from CHAT_PREFILTER_MODEL when that file exists, and
+    decisions are appended to CHAT_PREFILTER_AUDIT_LOG when it is set, creating its
+    directory if needed.
+    """
+    audit_path = config["CHAT_PREFILTER_AUDIT_LOG"]
+    if audit_path and not audit_log.handlers:
+        Path(audit_path).parent.mkdir(parents=True, exist_ok=True)
+        handler = logging.FileHandler(audit_path, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        audit_log.addHandler(handler)
+        audit_log.setLevel(logging.INFO)
+
+    model = None
+    model_path = Path(config["CHAT_PREFILTER_MODEL"])
+    if model_path.exists():
+        try:
+            model = LinearModel.load(model_path)
+        except Exception as e:
+            logging.error(f"Error loading prefilter model {model_path}: {str(e)}")
+    return ChatPrefilter(
+        model=model,
+        threshold=config["CHAT_PREFILTER_THRESHOLD"],
+        enabled=config["CHAT_PREFILTER"],
+        audit_chars=config["CHAT_PREFILTER_AUDIT_CHARS"],
+    )
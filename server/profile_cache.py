@@ -0,0 +1,68 @@
+# profile_cache.py: Per-process cache of signed-in users' profiles.
+# Lets /api/check_session, called on nearly every page navigation, answer without querying
+# UserAuth. Entries expire after a short TTL and are dropped when the account changes.
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class ProfileCache:
+    """
+    Process-local cache of user profiles (id, username, email) keyed by user id, bounded
+    to max_users with LRU eviction.
+
+    Attributes:
+    - ttl: Seconds an entry is served before it is reloaded from the database; 0
+      disables caching.
+    - max_users: Largest number of cached profiles.
+
+    invalidate() drops an entry in this process only. Other workers keep serving theirs
+    until they expire, so ttl bounds how long a change takes to show everywhere.
+    """
+
+    def __init__(self, ttl=60.0, max_users=10000):
+        self.ttl = ttl
+        self.max_users = max_users
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """Returns the cached profile for user_id, or None if missing or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or now - entry[1] >= self.ttl:
+                self._entries.pop(user_id, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(user_id)
+            return entry[0]
+
+    def store(self, user):
+        """Caches the profile of a UserAuth row and returns it."""
+        profile = {"id": user.id, "username": user.username, "email": user.email}
+        if self.ttl > 0:
+            with self._lock:
+                self._entries[user.id] = (profile, time.monotonic())
+                self._entries.move_to_end(user.id)
+                while len(self._entries) > self.max_users:
+                    self._entries.popitem(last=False)
+        return profile
+
+    def invalidate(self, user_id):
+        """Drops the cached profile for user_id."""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def stats(self):
+        """Returns hit/miss counters and the number of cached profiles."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "users": len(self._entries),
+            "ttl": self.ttl,
+        }
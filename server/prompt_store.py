@@ -0,0 +1,122 @@
+# prompt_store.py: Process-level cache for the support guide used as the chat system prompt.
+# Loads the guide once, reloads it only when the file's mtime/size or content hash changes,
+# and keeps the ready-built system message plus a version id other caches can key on.
+# Each load also builds a SupportGuideIndex so prompts can carry only the relevant sections.
+
+import hashlib
+import os
+import threading
+import time
+
+from support_index import SupportGuideIndex
+
+
+class PromptStore:
+    """
+    Holds the support guide text and its prebuilt system message in memory.
+
+    Attributes:
+    - path: Location of the support guide on disk.
+    - check_interval: Minimum number of seconds between stat() calls on the guide file.
+      A value of 0 checks the file on every access.
+    - core_sections: Number of leading guide paragraphs always included by system_message_for().
+
+    Usage:
+    - system_message(): The {"role": "system", ...} message for the current guide.
+      The returned dict is shared and must not be mutated by callers.
+    - system_message_for(query, top_k): A system message holding the core preamble plus the
+      top_k guide sections most relevant to the query.
+    - text(): The raw guide text.
+    - version(): Short content hash of the current guide, changing whenever its content does.
+    """
+
+    def __init__(self, path, check_interval=2.0, core_sections=2):
+        self.path = path
+        self.check_interval = check_interval
+        self.core_sections = core_sections
+        self._lock = threading.Lock()
+        self._signature = None
+        self._checked_at = 0.0
+        self._text = ""
+        self._version = None
+        self._system_message = {"role": "system", "content": ""}
+        self._index = SupportGuideIndex("", core_sections)
+
+    def _file_signature(self):
+        """
+        Returns a cheap (mtime, size) signature of the guide file, or None if it is missing.
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _load(self, signature):
+        """
+        Reads the guide and rebuilds the cached prompt if its content hash changed.
+        """
+        try:
+            with open(self.path, "rb") as file:
+                raw = file.read()
+        except FileNotFoundError:
+            print(f"The file {self.path} was not found.")
+            raw = b""
+        except Exception as e:
+            print(f"An error occurred while reading the file: {e}")
+            return
+
+        version = hashlib.sha256(raw).hexdigest()[:16]
+        self._signature = signature
+        if version == self._version:
+            return
+
+        text = raw.decode("utf-8")
+        self._index = SupportGuideIndex(text, self.core_sections)
+        self._text = text
+        self._system_message = {"role": "system", "content": text}
+        self._version = version
+
+    def refresh(self, force=False):
+        """
+        Reloads the guide if the file changed since it was last loaded.
+        Stat calls are throttled to once per check_interval unless force is True.
+        """
+        now = time.monotonic()
+        if (
+            not force
+            and self._version is not None
+            and now - self._checked_at < self.check_interval
+        ):
+            return
+
+        with self._lock:
+            self._checked_at = now
+            signature = self._file_signature()
+            if force or self._version is None or signature != self._signature:
+                self._load(signature)
+
+    def text(self):
+        """Returns the current support guide text."""
+        self.refresh()
+        return self._text
+
+    def system_message(self):
+        """Returns the prebuilt system message for the current support guide."""
+        self.refresh()
+        return self._system_message
+
+    def system_message_for(self, query, top_k=3):
+        """
+        Returns a system message with the core preamble and the guide sections relevant to
+        the query. A falsy top_k returns the full-guide system message instead.
+        """
+        self.refresh()
+        if not top_k:
+            return self._system_message
+        return {"role": "system", "content": self._index.build_prompt(query, top_k)}
+
+    def version(self):
+        """Returns the content version id of the current support guide."""
+        self.refresh()
+        return self._version
@@ -0,0 +1,348 @@
+# rate_limiter.py: Token-bucket limits on chat turns, model tokens and sign-in attempts.
+# Bucket levels are kept in a cachelib cache so every worker sharing the store enforces the
+# same limits. Chat turns are taken from per-user and global buckets before a turn starts;
+# model tokens are charged once a call reports its usage, so a large reply can leave a
+# bucket in debt until it refills. Sign-in attempts are throttled per client IP and per
+# username before any database or password hashing work.
+
+import fcntl
+import math
+import os
+import threading
+import time
+
+from cachelib import FileSystemCache, SimpleCache
+
+USER_TURNS = "user_turns"
+GLOBAL_TURNS = "global_turns"
+USER_TOKENS = "user_tokens"
+GLOBAL_TOKENS = "global_tokens"
+
+
+class Bucket:
+    """
+    Token bucket settings.
+
+    Attributes:
+    - rate: Units added per second.
+    - capacity: Largest number of units the bucket holds, i.e. the allowed burst.
+    """
+
+    __slots__ = ("rate", "capacity")
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+
+    def level(self, state, now):
+        """Returns the bucket's level at now, given its stored (level, updated_at)."""
+        if state is None:
+            return self.capacity
+        level, updated_at = state
+        return min(self.capacity, level + max(0.0, now - updated_at) * self.rate)
+
+    def wait(self, level, amount):
+        """Returns the seconds until the bucket holds amount units."""
+        return max(0.0, (amount - level) / self.rate)
+
+    def ttl(self, level=0.0):
+        """
+        Seconds after which an untouched bucket saved at level is full again and can be
+        forgotten. A bucket in debt takes longer than an empty one.
+        """
+        return int(math.ceil((self.capacity - level) / self.rate)) + 1
+
+
+class StoreLock:
+    """
+    Serializes bucket updates. Threads of this process share a lock; with a path, an
+    exclusive flock on that file serializes other processes on the host as well.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self.path:
+            try:
+                self._file = open(self.path, "a")
+                fcntl.flock(self._file, fcntl.LOCK_EX)
+            except Exception:
+                self._release_file()
+                self._lock.release()
+                raise
+        return self
+
+    def __exit__(self, *exc):
+        self._release_file()
+        self._lock.release()
+
+    def _release_file(self):
+        if self._file:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class RateLimited(Exception):
+    """Raised when a chat turn or sign-in attempt is over one of its limits."""
+
+    def __init__(self, limit, retry_after):
+        super().__init__(f"{limit} limit reached, retry after {retry_after:.1f}s")
+        self.limit = limit
+        self.retry_after = retry_after
+
+
+class ChatRateLimiter:
+    """
+    Enforces per-user and global token buckets on chat turns and model tokens.
+
+    Attributes:
+    - store: cachelib cache holding bucket levels as (level, updated_at) tuples.
+    - buckets: Bucket settings keyed by USER_TURNS, GLOBAL_TURNS, USER_TOKENS and
+      GLOBAL_TOKENS. Limits without an entry are not enforced.
+    - lock: StoreLock serializing updates of the store.
+
+    A turn is admitted only when every turn bucket holds a whole turn and every token
+    bucket is out of debt; it then takes one turn from each turn bucket. Tokens are
+    charged afterwards with charge().
+    """
+
+    def __init__(self, store, buckets, lock=None):
+        self.store = store
+        self.buckets = buckets
+        self.lock = lock or StoreLock()
+        self._counter_lock = threading.Lock()
+        self.counters = {"admitted": 0, "limited": 0, "tokens_charged": 0}
+        self.limited_by = {
+            USER_TURNS: 0,
+            GLOBAL_TURNS: 0,
+            USER_TOKENS: 0,
+            GLOBAL_TOKENS: 0,
+        }
+
+    def _key(self, name, user_id):
+        if name in (USER_TURNS, USER_TOKENS):
+            return f"rate:{name}:{user_id}"
+        return f"rate:{name}"
+
+    def _save(self, name, key, level, now):
+        self.store.set(key, (level, now), timeout=self.buckets[name].ttl(level))
+
+    def acquire(self, user_id):
+        """
+        Takes one chat turn from the user's and the global turn buckets.
+
+        Raises RateLimited with the limit hit and the seconds to wait when the turn is
+        not admitted; no bucket is changed in that case.
+        """
+        now = time.time()
+        with self.lock:
+            levels = {}
+            waits = {}
+            for name, bucket in self.buckets.items():
+                key = self._key(name, user_id)
+                level = bucket.level(self.store.get(key), now)
+                levels[name] = (key, level)
+                if name in (USER_TURNS, GLOBAL_TURNS):
+                    if level < 1:
+                        waits[name] = bucket.wait(level, 1)
+                elif level <= 0:
+                    waits[name] = bucket.wait(level, 0)
+            if not waits:
+                for name in (USER_TURNS, GLOBAL_TURNS):
+                    if name in levels:
+                        key, level = levels[name]
+                        self._save(name, key, level - 1, now)
+
+        with self._counter_lock:
+            if waits:
+                limit = max(waits, key=waits.get)
+                self.counters["limited"] += 1
+                self.limited_by[limit] += 1
+            else:
+                self.counters["admitted"] += 1
+        if waits:
+            raise RateLimited(limit, waits[limit])
+
+    def charge(self, user_id, tokens):
+        """
+        Takes model tokens spent on the user's behalf from the user's and the global
+        token buckets. Buckets may go negative; later turns wait until they refill.
+        """
+        if tokens <= 0:
+            return
+        now = time.time()
+        with self.lock:
+            for name in (USER_TOKENS, GLOBAL_TOKENS):
+                bucket = self.buckets.get(name)
+                if bucket is None:
+                    continue
+                key = self._key(name, user_id)
+                level = bucket.level(self.store.get(key), now)
+                # Debt is capped at one full bucket so a runaway reply cannot lock a user
+                # out for longer than one refill
+                self._save(name, key, max(level - tokens, -bucket.capacity), now)
+        with self._counter_lock:
+            self.counters["tokens_charged"] += tokens
+
+    def stats(self):
+        """Returns admission counters and how often each limit was hit."""
+        with self._counter_lock:
+            data = dict(self.counters)
+            data["limited_by"] = dict(self.limited_by)
+        data["limits"] = {
+            name: {"per_minute": bucket.rate * 60, "burst": bucket.capacity}
+            for name, bucket in self.buckets.items()
+        }
+        return data
+
+
+class KeyedRateLimiter:
+    """
+    Token buckets on attempts, keyed by request attributes such as the client IP or a
+    username.
+
+    Attributes:
+    - store: cachelib cache holding bucket levels as (level, updated_at) tuples.
+    - buckets: Bucket settings by name, e.g. {"ip": ..., "username": ...}.
+    - lock: StoreLock serializing updates of the store.
+    - prefix: Store key prefix separating these buckets from other limiters'.
+
+    An attempt names a key for some of the buckets and is admitted only if every one of
+    them holds a whole unit; it then takes one unit from each.
+    """
+
+    def __init__(self, store, buckets, lock=None, prefix="rate"):
+        self.store = store
+        self.buckets = buckets
+        self.lock = lock or StoreLock()
+        self.prefix = prefix
+        self._counter_lock = threading.Lock()
+        self.counters = {"admitted": 0, "limited": 0}
+        self.limited_by = {name: 0 for name in buckets}
+
+    def acquire(self, **keys):
+        """
+        Takes one attempt from the named buckets, e.g. acquire(ip=..., username=...).
+        Names without a configured bucket and empty keys are ignored.
+
+        Raises RateLimited with the bucket hit and the seconds to wait when the attempt is
+        not admitted; no bucket is changed in that case.
+        """
+        now = time.time()
+        waits = {}
+        with self.lock:
+            levels = []
+            for name, key in keys.items():
+                bucket = self.buckets.get(name)
+                if bucket is None or not key:
+                    continue
+                store_key = f"{self.prefix}:{name}:{key}"
+                level = bucket.level(self.store.get(store_key), now)
+                levels.append((bucket, store_key, level))
+                if level < 1:
+                    waits[name] = bucket.wait(level, 1)
+            if not waits:
+                for bucket, store_key, level in levels:
+                    self.store.set(
+                        store_key, (level - 1, now), timeout=bucket.ttl(level - 1)
+                    )
+
+        with self._counter_lock:
+            if waits:
+                limit = max(waits, key=waits.get)
+                self.counters["limited"] += 1
+                self.limited_by[limit] += 1
+            else:
+                self.counters["admitted"] += 1
+        if waits:
+            raise RateLimited(limit, waits[limit])
+
+    def stats(self):
+        """Returns admission counters and how often each bucket was hit."""
+        with self._counter_lock:
+            data = dict(self.counters)
+            data["limited_by"] = dict(self.limited_by)
+        data["limits"] = {
+            name: {"per_minute": bucket.rate * 60, "burst": bucket.capacity}
+            for name, bucket in self.buckets.items()
+        }
+        return data
+
+
+def buckets_from_config(config, settings):
+    """
+    Returns Bucket settings by name for (name, setting prefix) pairs, read from the
+    <prefix>_PER_MINUTE and <prefix>_BURST settings. A burst of 0 defaults to one
+    minute's worth; a rate of 0 leaves the bucket out.
+    """
+    buckets = {}
+    for name, prefix in settings:
+        per_minute = config[f"{prefix}_PER_MINUTE"]
+        if per_minute > 0:
+            burst = config[f"{prefix}_BURST"] or per_minute
+            buckets[name] = Bucket(per_minute / 60.0, burst)
+    return buckets
+
+
+def create_store(kind, directory):
+    """
+    Returns the (store, lock) pair for bucket levels: "memory" keeps them per process,
+    "filesystem" in a directory shared by every worker on the host.
+    """
+    # Past its threshold a cache evicts entries, which refills their buckets, so it is set
+    # well above the number of keys a busy minute produces
+    if kind == "filesystem":
+        store = FileSystemCache(directory, threshold=100000)
+        return store, StoreLock(os.path.join(directory, "rate.lock"))
+    if kind == "memory":
+        return SimpleCache(threshold=100000), StoreLock()
+    raise ValueError(f"Unknown rate limit store: {kind}")
+
+
+def create_rate_limiter(config):
+    """
+    Creates the chat rate limiter from the CHAT_RATE_* settings in the app config, or
+    returns None when CHAT_RATE_LIMIT is off.
+
+    CHAT_RATE_STORE may be "memory" (limits per process) or "filesystem" (bucket levels
+    in CHAT_RATE_DIR, shared by every worker on the host). A rate of 0 disables that
+    limit.
+    """
+    if not config["CHAT_RATE_LIMIT"]:
+        return None
+    buckets = buckets_from_config(
+        config,
+        (
+            (USER_TURNS, "CHAT_RATE_USER_TURNS"),
+            (GLOBAL_TURNS, "CHAT_RATE_GLOBAL_TURNS"),
+            (USER_TOKENS, "CHAT_RATE_USER_TOKENS"),
+            (GLOBAL_TOKENS, "CHAT_RATE_GLOBAL_TOKENS"),
+        ),
+    )
+    store, lock = create_store(config["CHAT_RATE_STORE"], config["CHAT_RATE_DIR"])
+    return ChatRateLimiter(store, buckets, lock)
+
+
+def create_auth_throttle(config):
+    """
+    Creates the sign-in throttle from the AUTH_RATE_* settings in the app config, or
+    returns None when AUTH_RATE_LIMIT is off. Its buckets are "ip" and "username" for
+    password attempts and "register_ip" for account creation.
+    """
+    if not config["AUTH_RATE_LIMIT"]:
+        return None
+    buckets = buckets_from_config(
+        config,
+        (
+            ("ip", "AUTH_RATE_IP"),
+            ("username", "AUTH_RATE_USERNAME"),
+            ("register_ip", "AUTH_RATE_REGISTER_IP"),
+        ),
+    )
+    store, lock = create_store(config["AUTH_RATE_STORE"], config["AUTH_RATE_DIR"])
+    return KeyedRateLimiter(store, buckets, lock, prefix="auth")
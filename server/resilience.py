@@ -0,0 +1,323 @@
+# resilience.py: Guards calls to the upstream model API.
+# A bulkhead caps concurrent calls, each call gets a deadline with jittered retries, and a
+# circuit breaker fails fast while the upstream is erroring or too slow, so a chat outage
+# cannot tie up every worker and take the rest of the storefront down with it.
+
+import random
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class UpstreamUnavailable(Exception):
+    """
+    Raised when an upstream call is refused or gave up: the bulkhead is full, the circuit
+    is open, or retries ran out before the deadline.
+    """
+
+    def __init__(self, reason, cause=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.cause = cause
+
+
+class CircuitBreaker:
+    """
+    Tracks the outcome of recent upstream calls and opens when too many fail or are slow.
+
+    Attributes:
+    - window: Number of recent calls considered.
+    - min_calls: Calls needed in the window before the breaker may open.
+    - failure_rate: Fraction of failed calls that opens the breaker.
+    - slow_call_seconds: Calls slower than this count as slow.
+    - slow_call_rate: Fraction of slow calls that opens the breaker.
+    - reset_timeout: Seconds the breaker stays open before letting a probe call through.
+
+    While half-open a single probe call is allowed; its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(
+        self,
+        window=20,
+        min_calls=10,
+        failure_rate=0.5,
+        slow_call_seconds=10.0,
+        slow_call_rate=0.8,
+        reset_timeout=30.0,
+    ):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.opened_count = 0
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Returns True if a call may proceed now."""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def record(self, success, duration):
+        """Records the outcome and duration (seconds) of a call allowed by allow()."""
+        slow = duration > self.slow_call_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+                if success and not slow:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open()
+                return
+
+            self._outcomes.append((success, slow))
+            if len(self._outcomes) < self.min_calls:
+                return
+            failures = sum(1 for ok, _ in self._outcomes if not ok)
+            slow_calls = sum(1 for _, is_slow in self._outcomes if is_slow)
+            total = len(self._outcomes)
+            if (
+                failures / total >= self.failure_rate
+                or slow_calls / total >= self.slow_call_rate
+            ):
+                self._open()
+
+    def cancel(self):
+        """
+        Releases a call allowed by allow() without recording an outcome, for calls that
+        never reached the upstream or whose error says nothing about its health. A
+        half-open probe slot is freed for the next call.
+        """
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_count += 1
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+
+class UpstreamGuard:
+    """
+    Runs upstream calls behind a bulkhead, per-call deadlines with jittered retries, and a
+    circuit breaker.
+
+    Attributes:
+    - max_concurrent: Maximum number of upstream calls in flight in this process.
+    - acquire_timeout: Seconds a call waits for a bulkhead slot before being refused.
+    - call_timeout: Timeout for a single attempt, in seconds.
+    - deadline: Total time budget for a call including retries, in seconds.
+    - max_retries: Retries after the first attempt for errors listed in retry_on.
+    - retry_base_delay: Base of the exponential backoff; each delay is drawn uniformly
+      between 0 and base * 2 ** attempt ("full jitter").
+    - retry_on: Exception types that count as upstream failures and are retried.
+
+    Calls receive the timeout for their attempt and must honour it, e.g. by passing it to
+    the OpenAI client.
+    """
+
+    def __init__(
+        self,
+        breaker,
+        max_concurrent=8,
+        acquire_timeout=0.5,
+        call_timeout=20.0,
+        deadline=30.0,
+        max_retries=2,
+        retry_base_delay=0.25,
+        retry_on=(Exception,),
+    ):
+        self.breaker = breaker
+        self.max_concurrent = max_concurrent
+        self.acquire_timeout = acquire_timeout
+        self.call_timeout = call_timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_on = retry_on
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.counters = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "timeouts": 0,
+            "rejected_bulkhead": 0,
+            "rejected_circuit": 0,
+        }
+        self.in_flight = 0
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def _enter(self):
+        """Claims a bulkhead slot and clears the call with the breaker."""
+        self._count("calls")
+        if not self.breaker.allow():
+            self._count("rejected_circuit")
+            raise UpstreamUnavailable("circuit_open")
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            self.breaker.cancel()
+            self._count("rejected_bulkhead")
+            raise UpstreamUnavailable("bulkhead_full")
+        with self._lock:
+            self.in_flight += 1
+
+    def _exit(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def _attempts(self):
+        """
+        Yields the timeout for each attempt until the deadline or retries run out,
+        sleeping with jittered backoff between attempts.
+        """
+        expires_at = time.monotonic() + self.deadline
+        for attempt in range(self.max_retries + 1):
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                return
+            if attempt:
+                self._count("retries")
+                delay = random.uniform(0, self.retry_base_delay * 2**attempt)
+                if delay >= remaining:
+                    return
+                time.sleep(delay)
+                remaining -= delay
+            yield min(self.call_timeout, remaining)
+
+    def _failed(self, error):
+        self._count("failures")
+        if "timeout" in type(error).__name__.lower():
+            self._count("timeouts")
+
+    def call(self, fn):
+        """
+        Calls fn(timeout) under the guard and returns its result. Errors outside retry_on,
+        such as client errors, are raised unchanged and count neither for nor against the
+        upstream.
+
+        Raises:
+        UpstreamUnavailable: If the call was refused or every attempt failed.
+        """
+        self._enter()
+        started = time.monotonic()
+        healthy = None
+        try:
+            last_error = None
+            for timeout in self._attempts():
+                try:
+                    result = fn(timeout)
+                except self.retry_on as error:
+                    self._failed(error)
+                    last_error = error
+                    continue
+                healthy = True
+                self._count("successes")
+                return result
+            healthy = False
+            raise UpstreamUnavailable("upstream_failed", last_error)
+        finally:
+            self._exit()
+            self._settle(healthy, time.monotonic() - started)
+
+    def stream(self, fn):
+        """
+        Calls fn(timeout), which must return an iterable, and yields its items under the
+        guard. The bulkhead slot is held until the stream is exhausted or closed. Attempts
+        are only retried before the first item has been yielded. As with call(), errors
+        outside retry_on, and streams closed before their end, leave the breaker unchanged.
+
+        Raises:
+        UpstreamUnavailable: If the call was refused or failed.
+        """
+        self._enter()
+        started = time.monotonic()
+        healthy = None
+        try:
+            last_error = None
+            for timeout in self._attempts():
+                started_streaming = False
+                try:
+                    for item in fn(timeout):
+                        started_streaming = True
+                        yield item
+                except self.retry_on as error:
+                    self._failed(error)
+                    last_error = error
+                    if started_streaming:
+                        break
+                    continue
+                healthy = True
+                self._count("successes")
+                return
+            healthy = False
+            raise UpstreamUnavailable("upstream_failed", last_error)
+        finally:
+            self._exit()
+            self._settle(healthy, time.monotonic() - started)
+
+    def _settle(self, healthy, duration):
+        """Records a call's outcome with the breaker; None releases it unrecorded."""
+        if healthy is None:
+            self.breaker.cancel()
+        else:
+            self.breaker.record(healthy, duration)
+
+    def stats(self):
+        """Returns the breaker state, bulkhead occupancy and call counters."""
+        with self._lock:
+            data = dict(self.counters)
+            data["in_flight"] = self.in_flight
+        data["max_concurrent"] = self.max_concurrent
+        data["circuit_state"] = self.breaker.state
+        data["circuit_opened_count"] = self.breaker.opened_count
+        return data
+
+
+def create_upstream_guard(config, retry_on=(Exception,)):
+    """
+    Creates an UpstreamGuard from the OPENAI_* resilience settings in the app config.
+    """
+    breaker = CircuitBreaker(
+        window=config["OPENAI_BREAKER_WINDOW"],
+        min_calls=config["OPENAI_BREAKER_MIN_CALLS"],
+        failure_rate=config["OPENAI_BREAKER_FAILURE_RATE"],
+        slow_call_seconds=config["OPENAI_BREAKER_SLOW_CALL_SECONDS"],
+        slow_call_rate=config["OPENAI_BREAKER_SLOW_CALL_RATE"],
+        reset_timeout=config["OPENAI_BREAKER_RESET_TIMEOUT"],
+    )
+    return UpstreamGuard(
+        breaker,
+        max_concurrent=config["OPENAI_MAX_CONCURRENCY"],
+        acquire_timeout=config["OPENAI_ACQUIRE_TIMEOUT"],
+        call_timeout=config["OPENAI_CALL_TIMEOUT"],
+        deadline=config["OPENAI_DEADLINE"],
+        max_retries=config["OPENAI_MAX_RETRIES"],
+        retry_base_delay=config["OPENAI_RETRY_BASE_DELAY"],
+        retry_on=retry_on,
+    )
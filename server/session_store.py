@@ -0,0 +1,389 @@
+# session_store.py: Server-side Flask session storage.
+# Sessions are kept by a pluggable backend behind Flask-Session's cookie and signing logic:
+# an in-process LRU for single-node deployments, a SQL table for deployments with several
+# nodes, or the original cachelib filesystem directory. A sweeper removes expired sessions
+# so storage does not grow without bound.
+
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from cachelib import FileSystemCache
+from config import db
+from flask_session.sessions import ServerSideSession, ServerSideSessionInterface
+from models import ServerSession
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+class SessionBackend:
+    """
+    Base class for session backends. Subclasses implement _load, _save, _delete and
+    sweep; the base class keeps counters and logs storage errors instead of failing the
+    request.
+    """
+
+    backend = "none"
+
+    def __init__(self):
+        self._counter_lock = threading.Lock()
+        self.counters = {
+            "loads": 0,
+            "hits": 0,
+            "saves": 0,
+            "deletes": 0,
+            "swept": 0,
+            "errors": 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._counter_lock:
+            self.counters[name] += amount
+
+    def load(self, key):
+        """Returns the session dict stored under key, or None if missing or expired."""
+        self._count("loads")
+        try:
+            data = self._load(key)
+        except Exception as e:
+            self._count("errors")
+            logging.error(f"Error loading session from {self.backend}: {str(e)}")
+            return None
+        if data is not None:
+            self._count("hits")
+        return data
+
+    def save(self, key, data, lifetime):
+        """Stores a session dict under key for lifetime (a timedelta)."""
+        self._count("saves")
+        try:
+            self._save(key, data, lifetime)
+        except Exception as e:
+            self._count("errors")
+            logging.error(f"Error saving session to {self.backend}: {str(e)}")
+
+    def delete(self, key):
+        """Removes the session stored under key."""
+        self._count("deletes")
+        try:
+            self._delete(key)
+        except Exception as e:
+            self._count("errors")
+            logging.error(f"Error deleting session from {self.backend}: {str(e)}")
+
+    def sweep(self):
+        """Removes expired sessions. Returns the number removed."""
+        return 0
+
+    def _load(self, key):
+        return None
+
+    def _save(self, key, data, lifetime):
+        pass
+
+    def _delete(self, key):
+        pass
+
+    def stats(self):
+        """Returns the backend name and its counters."""
+        with self._counter_lock:
+            data = dict(self.counters)
+        data["backend"] = self.backend
+        return data
+
+
+class MemorySessionBackend(SessionBackend):
+    """
+    In-process LRU session store. Fast, but only usable with a single worker process:
+    sessions are not visible to other processes and are lost on restart. The least
+    recently used session is evicted once max_entries is reached.
+    """
+
+    backend = "memory"
+
+    def __init__(self, max_entries=10000):
+        super().__init__()
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            data, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return dict(data)
+
+    def _save(self, key, data, lifetime):
+        with self._lock:
+            self._entries[key] = (dict(data), time.time() + lifetime.total_seconds())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def sweep(self):
+        now = time.time()
+        with self._lock:
+            expired = [
+                key
+                for key, (_, expires_at) in self._entries.items()
+                if expires_at <= now
+            ]
+            for key in expired:
+                del self._entries[key]
+        self._count("swept", len(expired))
+        return len(expired)
+
+    def stats(self):
+        data = super().stats()
+        data["entries"] = len(self._entries)
+        data["max_entries"] = self.max_entries
+        return data
+
+
+class SqlSessionBackend(SessionBackend):
+    """
+    Session store in the server_sessions table, shared by every node using the database.
+    Each operation is a single primary-key statement on its own connection, independent of
+    the request's db.session; expired rows are found through the expires_at index.
+    """
+
+    backend = "sql"
+
+    def __init__(self, app, sweep_batch_size=1000):
+        super().__init__()
+        self.app = app
+        self.sweep_batch_size = sweep_batch_size
+        self.table = ServerSession.__table__
+        self._engine = None
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            with self.app.app_context():
+                self._engine = db.engine
+        return self._engine
+
+    def _load(self, key):
+        with self.engine.connect() as connection:
+            data = connection.execute(
+                db.select(self.table.c.data).where(
+                    self.table.c.id == key,
+                    self.table.c.expires_at > datetime.utcnow(),
+                )
+            ).scalar()
+        return pickle.loads(data) if data is not None else None
+
+    def _save(self, key, data, lifetime):
+        row = {
+            "id": key,
+            "data": pickle.dumps(dict(data), pickle.HIGHEST_PROTOCOL),
+            "expires_at": datetime.utcnow() + lifetime,
+        }
+        with self.engine.begin() as connection:
+            dialect = connection.dialect.name
+            if dialect in ("postgresql", "sqlite"):
+                insert = (postgresql if dialect == "postgresql" else sqlite).insert
+                statement = insert(self.table).values(**row)
+                connection.execute(
+                    statement.on_conflict_do_update(
+                        index_elements=[self.table.c.id],
+                        set_={
+                            "data": statement.excluded.data,
+                            "expires_at": statement.excluded.expires_at,
+                        },
+                    )
+                )
+                return
+            updated = connection.execute(
+                db.update(self.table)
+                .where(self.table.c.id == key)
+                .values(data=row["data"], expires_at=row["expires_at"])
+            ).rowcount
+            if not updated:
+                connection.execute(db.insert(self.table).values(**row))
+
+    def _delete(self, key):
+        with self.engine.begin() as connection:
+            connection.execute(db.delete(self.table).where(self.table.c.id == key))
+
+    def sweep(self):
+        """
+        Deletes expired sessions in batches of sweep_batch_size, each in its own short
+        transaction.
+        """
+        removed = 0
+        now = datetime.utcnow()
+        while True:
+            expired = (
+                db.select(self.table.c.id)
+                .where(self.table.c.expires_at <= now)
+                .limit(self.sweep_batch_size)
+                .scalar_subquery()
+            )
+            with self.engine.begin() as connection:
+                count = connection.execute(
+                    db.delete(self.table).where(self.table.c.id.in_(expired))
+                ).rowcount
+            removed += count
+            if count < self.sweep_batch_size:
+                break
+        self._count("swept", removed)
+        return removed
+
+
+class FileSystemSessionBackend(SessionBackend):
+    """
+    Session store in a cachelib FileSystemCache directory, as used by Flask-Session's
+    "filesystem" type. Shared by workers on one host only.
+    """
+
+    backend = "filesystem"
+
+    def __init__(self, directory, threshold=500, mode=0o600):
+        super().__init__()
+        self.cache = FileSystemCache(directory, threshold=threshold, mode=mode)
+
+    def _load(self, key):
+        return self.cache.get(key)
+
+    def _save(self, key, data, lifetime):
+        self.cache.set(key, dict(data), int(lifetime.total_seconds()))
+
+    def _delete(self, key):
+        self.cache.delete(key)
+
+    def sweep(self):
+        """
+        Expired session files are only removed when cachelib prunes the directory on a
+        write past its threshold; a sweep forces that pass.
+        """
+        before = sum(1 for _ in self.cache._list_dir())
+        self.cache._remove_expired(time.time())
+        removed = before - sum(1 for _ in self.cache._list_dir())
+        self._count("swept", removed)
+        return removed
+
+
+class StoreSession(ServerSideSession):
+    pass
+
+
+class StoreSessionInterface(ServerSideSessionInterface):
+    """
+    Flask session interface storing sessions in a SessionBackend. Cookie handling, session
+    ids and signing are Flask-Session's.
+    """
+
+    session_class = StoreSession
+
+    def __init__(self, backend, key_prefix, use_signer, permanent, sid_length=32):
+        self.backend = backend
+        super().__init__(backend, key_prefix, use_signer, permanent, sid_length)
+
+    def fetch_session(self, sid):
+        data = self.backend.load(self.key_prefix + sid)
+        if data is not None:
+            return self.session_class(data, sid=sid)
+        return self.session_class(sid=sid, permanent=self.permanent)
+
+    def save_session(self, app, session, response):
+        if not self.should_set_cookie(app, session):
+            return
+        key = self.key_prefix + session.sid
+
+        # An emptied session is removed along with its cookie
+        if not session:
+            if session.modified:
+                self.backend.delete(key)
+                response.delete_cookie(
+                    app.config["SESSION_COOKIE_NAME"],
+                    domain=self.get_cookie_domain(app),
+                    path=self.get_cookie_path(app),
+                )
+            return
+
+        self.backend.save(key, dict(session), app.permanent_session_lifetime)
+        self.set_cookie_to_response(
+            app, session, response, self.get_expiration_time(app, session)
+        )
+
+
+class SessionSweeper:
+    """
+    Background thread removing expired sessions from a backend every interval seconds.
+    """
+
+    def __init__(self, backend, interval=300.0):
+        self.backend = backend
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._sweep_loop, name="session-sweeper", daemon=True
+        )
+        self._thread.start()
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                removed = self.backend.sweep()
+                if removed:
+                    logging.debug(f"Swept {removed} expired sessions")
+            except Exception as e:
+                logging.error(f"Error sweeping sessions: {str(e)}")
+
+    def stop(self):
+        self._stop.set()
+
+
+def create_session_backend(app):
+    """
+    Creates the session backend selected by SESSION_BACKEND in the app config: "memory"
+    (single worker only), "sql" (the server_sessions table) or "filesystem"
+    (SESSION_FILE_DIR, shared by workers on one host).
+    """
+    config = app.config
+    backend = config["SESSION_BACKEND"]
+    if backend == "memory":
+        return MemorySessionBackend(max_entries=config["SESSION_MAX_ENTRIES"])
+    if backend == "sql":
+        return SqlSessionBackend(app)
+    if backend == "filesystem":
+        return FileSystemSessionBackend(
+            config["SESSION_FILE_DIR"], threshold=config["SESSION_MAX_ENTRIES"]
+        )
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+
+
+def init_session_store(app):
+    """
+    Installs the configured session backend as the app's session interface and starts
+    its sweeper unless SESSION_SWEEP_INTERVAL is 0.
+
+    Returns:
+    StoreSessionInterface: The installed session interface.
+    """
+    config = app.config
+    interface = StoreSessionInterface(
+        create_session_backend(app),
+        key_prefix=config["SESSION_KEY_PREFIX"],
+        use_signer=config["SESSION_USE_SIGNER"],
+        permanent=config["SESSION_PERMANENT"],
+    )
+    app.session_interface = interface
+    if config["SESSION_SWEEP_INTERVAL"] > 0:
+        interface.sweeper = SessionSweeper(
+            interface.backend, config["SESSION_SWEEP_INTERVAL"]
+        )
+    return interface
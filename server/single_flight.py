@@ -0,0 +1,74 @@
+# single_flight.py: Coalesces concurrent identical calls into one.
+# While a call for a key is in flight, other callers with the same key wait for its result
+# instead of starting their own, which protects upstream rate limits during bursts.
+
+import threading
+
+
+class _Call:
+    """An in-flight call and the outcome its waiters receive."""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time within this process.
+
+    Counters:
+    - leaders: Calls that actually ran.
+    - coalesced: Calls that waited for a leader's result instead of running.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """
+        Returns fn() for key, sharing the result (or exception) of a call already in
+        flight for the same key.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        """Returns leader/coalesced counters and the number of calls in flight."""
+        with self._lock:
+            in_flight = len(self._calls)
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "in_flight": in_flight,
+        }
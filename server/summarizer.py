@@ -0,0 +1,197 @@
+# summarizer.py: Rolling summaries of long chat sessions.
+# Older turns of a session are folded into a stored ConversationSummary in the background,
+# so prompts can carry summary + recent turns and stay bounded however long a session runs.
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import db
+from models import ChatMessage, ConversationSummary
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a compact summary of a FuturePhone tech support conversation about a "
+    "VisionX phone. Update the current summary with the new turns. Keep the customer's "
+    "device issues, troubleshooting steps already tried, their outcomes and any open "
+    "questions. Reply with the updated summary only, in under 120 words."
+)
+
+
+class ConversationSummarizer:
+    """
+    Folds the older turns of a chat session into its ConversationSummary.
+
+    Attributes:
+    - refresh_every: Number of unsummarized older messages that triggers a refresh.
+      A value of 0 disables summarization.
+    - keep_recent: Number of newest session messages left out of the summary because
+      they are sent to the model as recent turns.
+    - on_refresh: Optional callback(user_id, session_id, summary) run after a refresh.
+    - guard: Optional UpstreamGuard the summarization calls run under.
+    - meter: Optional UsageMeter that summarization calls are recorded to.
+
+    Refreshes run on a single background thread; schedule() returns immediately.
+    """
+
+    def __init__(
+        self,
+        app,
+        client,
+        refresh_every=6,
+        keep_recent=10,
+        model="gpt-3.5-turbo",
+        max_tokens=200,
+        on_refresh=None,
+        guard=None,
+        meter=None,
+    ):
+        self.app = app
+        self.client = client
+        self.refresh_every = refresh_every
+        self.keep_recent = keep_recent
+        self.model = model
+        self.max_tokens = max_tokens
+        self.on_refresh = on_refresh
+        self.guard = guard
+        self.meter = meter
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="chat-summarizer"
+        )
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def schedule(self, session_id):
+        """
+        Queues a background refresh check for a session. Sessions that already have a
+        check queued are skipped.
+        """
+        if not session_id or self.refresh_every <= 0:
+            return
+        with self._lock:
+            if session_id in self._pending:
+                return
+            self._pending.add(session_id)
+        self._executor.submit(self._run, session_id)
+
+    def _run(self, session_id):
+        try:
+            with self.app.app_context():
+                self.refresh(session_id)
+        except Exception as e:
+            logging.error(f"Error summarizing session {session_id}: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending.discard(session_id)
+
+    def refresh(self, session_id):
+        """
+        Folds the session's older, unsummarized messages into its summary once at least
+        refresh_every of them have accumulated.
+
+        Returns:
+        ConversationSummary: The updated summary, or None if no refresh was needed.
+        """
+        summary = ConversationSummary.query.filter_by(session_id=session_id).first()
+        if summary is None:
+            summary = ConversationSummary(
+                session_id=session_id,
+                summary="",
+                summarized_through_id=0,
+                turns_summarized=0,
+            )
+
+        # Newest message that is old enough to be folded into the summary
+        recent_cutoff = (
+            db.session.query(ChatMessage.id)
+            .filter(ChatMessage.session_id == session_id)
+            .order_by(ChatMessage.id.desc())
+            .offset(self.keep_recent)
+            .limit(1)
+            .scalar()
+        )
+        if recent_cutoff is None or recent_cutoff <= summary.summarized_through_id:
+            return None
+
+        pending = (
+            ChatMessage.query.filter(
+                ChatMessage.session_id == session_id,
+                ChatMessage.id > summary.summarized_through_id,
+                ChatMessage.id <= recent_cutoff,
+            )
+            .order_by(ChatMessage.id.asc())
+            .all()
+        )
+        if len(pending) < self.refresh_every:
+            return None
+
+        usage = {}
+        try:
+            text = self.summarize(summary.summary, pending, usage)
+        finally:
+            if self.meter and usage:
+                self.meter.record(
+                    user_id=pending[-1].user_id, session_id=session_id, **usage
+                )
+        if not text:
+            return None
+
+        summary.summary = text
+        summary.summarized_through_id = pending[-1].id
+        summary.turns_summarized += len(pending)
+        db.session.add(summary)
+        db.session.commit()
+
+        if self.on_refresh:
+            self.on_refresh(pending[-1].user_id, session_id, text)
+        return summary
+
+    def summarize(self, current_summary, chat_messages, usage=None):
+        """
+        Asks the model to fold chat messages into the current summary text. A usage dict,
+        when passed, is filled with the call's model, token counts and latency.
+        """
+        transcript = "\n".join(
+            f"User: {msg.message}\nAssistant: {msg.response or ''}"
+            for msg in chat_messages
+        )
+        messages = [
+            {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+            {
+                "role": "user",
+                "content": f"Current summary:\n{current_summary or '(none)'}\n\n"
+                f"New turns:\n{transcript}",
+            },
+        ]
+
+        def create(timeout=None):
+            # Under a guard, the guard owns timeouts and retries
+            client = self.client
+            if timeout:
+                client = client.with_options(timeout=timeout, max_retries=0)
+            return client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=0.2,
+                max_tokens=self.max_tokens,
+            )
+
+        usage = {} if usage is None else usage
+        usage.update(
+            call_type="summary", model=self.model, cache_status="bypass", success=False
+        )
+        started = time.perf_counter()
+        try:
+            response = self.guard.call(create) if self.guard else create()
+        finally:
+            usage["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        usage["success"] = True
+        if response.usage:
+            usage.update(
+                prompt_tokens=response.usage.prompt_tokens,
+                completion_tokens=response.usage.completion_tokens,
+                total_tokens=response.usage.total_tokens,
+            )
+        if response.choices and response.choices[0].message:
+            return response.choices[0].message.content.strip()
+        return None
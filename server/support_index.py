@@ -0,0 +1,130 @@
+# support_index.py: Offline BM25 index over sections of the support guide.
+# Lets the chat prompt carry a fixed core preamble plus only the guide sections relevant
+# to the user's message, instead of the whole guide on every turn.
+
+import math
+import re
+from collections import Counter
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOP_WORDS = frozenset(
+    """
+    a an and are as at be but by can could do does for from has have how i if in is it
+    its me my of on or our so that the their them there they this to was we what when
+    which who will with you your
+    """.split()
+)
+
+
+def tokenize(text):
+    """
+    Splits text into lowercase word tokens, dropping common stop words.
+
+    Args:
+    text (str): The text to tokenize.
+
+    Returns:
+    list: The remaining tokens in order of appearance.
+    """
+    return [
+        token
+        for token in TOKEN_PATTERN.findall(text.lower().replace("’", "'"))
+        if token not in STOP_WORDS
+    ]
+
+
+def split_sections(text, core_sections=2):
+    """
+    Splits the support guide into a core preamble and retrievable sections.
+
+    Paragraphs are separated by blank lines. The first `core_sections` paragraphs form the
+    core preamble that is always sent. Every other line starts a new section, except
+    bullet ("- ") and answer ("A:") lines, which stay with the line that introduces them.
+
+    Args:
+    text (str): The full support guide.
+    core_sections (int): Number of leading paragraphs that make up the core preamble.
+
+    Returns:
+    tuple: (core preamble text, list of section texts in guide order).
+    """
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+    core = "\n\n".join(paragraphs[:core_sections])
+
+    sections = []
+    for paragraph in paragraphs[core_sections:]:
+        current = []
+        for line in paragraph.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if current and not line.startswith(("- ", "A:")):
+                sections.append("\n".join(current))
+                current = []
+            current.append(line)
+        if current:
+            sections.append("\n".join(current))
+    return core, sections
+
+
+class SupportGuideIndex:
+    """
+    BM25 index over the retrievable sections of the support guide.
+
+    Attributes:
+    - core: Core preamble included in every prompt.
+    - sections: Retrievable section texts, in guide order.
+
+    Built once per guide version; searching is pure in-memory work with no external service.
+    """
+
+    def __init__(self, text, core_sections=2, k1=1.5, b=0.75):
+        self.core, self.sections = split_sections(text, core_sections)
+        self.k1 = k1
+        self.b = b
+
+        self._term_freqs = [Counter(tokenize(section)) for section in self.sections]
+        self._lengths = [sum(tf.values()) for tf in self._term_freqs]
+        self._avg_length = (
+            sum(self._lengths) / len(self._lengths) if self._lengths else 0.0
+        )
+
+        doc_freqs = Counter()
+        for tf in self._term_freqs:
+            doc_freqs.update(tf.keys())
+        total = len(self.sections)
+        self._idf = {
+            term: math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for term, df in doc_freqs.items()
+        }
+
+    def search(self, query, top_k=3):
+        """
+        Returns the indexes of the top_k sections matching the query, in guide order.
+        Sections that share no terms with the query are never returned.
+        """
+        terms = [term for term in set(tokenize(query)) if term in self._idf]
+        if not terms or top_k <= 0:
+            return []
+
+        scores = []
+        for i, tf in enumerate(self._term_freqs):
+            norm = self.k1 * (1 - self.b + self.b * self._lengths[i] / self._avg_length)
+            score = 0.0
+            for term in terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self._idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            if score > 0:
+                scores.append((score, i))
+
+        scores.sort(key=lambda item: (-item[0], item[1]))
+        return sorted(i for _, i in scores[:top_k])
+
+    def build_prompt(self, query, top_k=3):
+        """
+        Assembles the system prompt text: the core preamble followed by the relevant sections.
+        """
+        relevant = [self.sections[i] for i in self.search(query, top_k)]
+        return "\n\n".join([self.core] + relevant) if relevant else self.core
@@ -0,0 +1,39 @@
+# conftest.py: Shared pytest setup.
+# The server modules read their settings from the environment when config is first imported,
+# so the test database, stores and keys are set here, before any test module imports them.
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DIR = tempfile.mkdtemp(prefix="server-tests-")
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ["DATABASE_URI"] = f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}"
+os.environ["BCRYPT_LOG_ROUNDS"] = "4"
+os.environ["SESSION_BACKEND"] = "sql"
+os.environ["SESSION_SWEEP_INTERVAL"] = "0"
+for name in ("CHAT_RATE_STORE", "AUTH_RATE_STORE", "CHAT_JOB_STORE"):
+    os.environ[name] = "memory"
+os.environ["CHAT_CACHE_BACKEND"] = "memory"
+
+sys.path.insert(0, SERVER_DIR)
+
+
+@pytest.fixture(scope="session")
+def app():
+    """The Flask app with every table created in a temporary SQLite database."""
+    from app import app as flask_app
+    from config import db
+
+    with flask_app.app_context():
+        db.create_all()
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
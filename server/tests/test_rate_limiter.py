@@ -0,0 +1,180 @@
+import pytest
+import rate_limiter
+from cachelib import SimpleCache
+from rate_limiter import (
+    GLOBAL_TOKENS,
+    GLOBAL_TURNS,
+    USER_TOKENS,
+    USER_TURNS,
+    Bucket,
+    ChatRateLimiter,
+    KeyedRateLimiter,
+    RateLimited,
+    buckets_from_config,
+)
+
+
+class FakeClock:
+    """Stands in for the time module inside rate_limiter."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", fake)
+    return fake
+
+
+class ExpiringStore:
+    """A cachelib-like store whose entries expire on the fake clock."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.entries = {}
+        self.timeouts = {}
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or entry[1] <= self.clock.now:
+            return None
+        return entry[0]
+
+    def set(self, key, value, timeout=None):
+        self.entries[key] = (value, self.clock.now + timeout)
+        self.timeouts[key] = timeout
+
+
+def test_bucket_level_refills_up_to_capacity():
+    bucket = Bucket(rate=2.0, capacity=10)
+
+    assert bucket.level(None, 100.0) == 10
+    assert bucket.level((3.0, 100.0), 101.5) == 6.0
+    assert bucket.level((3.0, 100.0), 200.0) == 10
+    assert bucket.level((3.0, 100.0), 99.0) == 3.0
+    assert bucket.level((-4.0, 100.0), 101.0) == -2.0
+
+
+def test_bucket_wait_and_ttl():
+    bucket = Bucket(rate=0.5, capacity=5)
+
+    assert bucket.wait(0.25, 1) == 1.5
+    assert bucket.wait(2.0, 1) == 0.0
+    assert bucket.wait(-3.0, 0) == 6.0
+    assert bucket.ttl() == 11
+    assert bucket.ttl(-5.0) == 21
+
+
+def test_buckets_from_config_defaults_burst_and_skips_zero_rates():
+    config = {
+        "A_PER_MINUTE": 30,
+        "A_BURST": 0,
+        "B_PER_MINUTE": 0,
+        "B_BURST": 5,
+    }
+
+    buckets = buckets_from_config(config, (("a", "A"), ("b", "B")))
+
+    assert list(buckets) == ["a"]
+    assert buckets["a"].rate == 0.5
+    assert buckets["a"].capacity == 30
+
+
+def test_turns_are_limited_after_the_burst(clock):
+    limiter = ChatRateLimiter(SimpleCache(), {USER_TURNS: Bucket(1.0, 2)})
+    limiter.acquire(1)
+    limiter.acquire(1)
+
+    with pytest.raises(RateLimited) as error:
+        limiter.acquire(1)
+    assert error.value.limit == USER_TURNS
+    assert error.value.retry_after == pytest.approx(1.0)
+
+    limiter.acquire(2)
+    clock.now += 1.0
+    limiter.acquire(1)
+    assert limiter.stats()["admitted"] == 4
+    assert limiter.stats()["limited_by"][USER_TURNS] == 1
+
+
+def test_refused_turn_takes_from_no_bucket(clock):
+    limiter = ChatRateLimiter(
+        SimpleCache(),
+        {USER_TURNS: Bucket(1.0, 1), GLOBAL_TURNS: Bucket(1.0, 2)},
+    )
+    limiter.acquire(1)
+    with pytest.raises(RateLimited):
+        limiter.acquire(1)
+
+    # The refused turn left the global bucket with one turn for another user
+    limiter.acquire(2)
+    with pytest.raises(RateLimited) as error:
+        limiter.acquire(3)
+    assert error.value.limit == GLOBAL_TURNS
+
+
+def test_token_debt_blocks_turns_until_repaid(clock):
+    limiter = ChatRateLimiter(
+        SimpleCache(),
+        {USER_TOKENS: Bucket(10.0, 100), GLOBAL_TOKENS: Bucket(1000.0, 10000)},
+    )
+    limiter.acquire(1)
+    limiter.charge(1, 130)
+
+    with pytest.raises(RateLimited) as error:
+        limiter.acquire(1)
+    assert error.value.limit == USER_TOKENS
+    assert error.value.retry_after == pytest.approx(3.0)
+
+    clock.now += 3.5
+    limiter.acquire(1)
+    assert limiter.stats()["tokens_charged"] == 130
+
+
+def test_token_debt_is_capped_at_one_bucket(clock):
+    limiter = ChatRateLimiter(SimpleCache(), {USER_TOKENS: Bucket(10.0, 100)})
+    limiter.charge(1, 10000)
+
+    with pytest.raises(RateLimited) as error:
+        limiter.acquire(1)
+    assert error.value.retry_after == pytest.approx(10.0)
+
+
+def test_keyed_limiter_checks_every_named_bucket(clock):
+    limiter = KeyedRateLimiter(
+        SimpleCache(),
+        {"ip": Bucket(1.0, 3), "username": Bucket(1.0, 1)},
+        prefix="auth",
+    )
+    limiter.acquire(ip="10.0.0.1", username="alice")
+
+    with pytest.raises(RateLimited) as error:
+        limiter.acquire(ip="10.0.0.1", username="alice")
+    assert error.value.limit == "username"
+
+    # Empty keys and unknown bucket names are ignored
+    limiter.acquire(ip="10.0.0.1", username="", other="x")
+    limiter.acquire(ip="10.0.0.1", username="bob")
+    with pytest.raises(RateLimited) as error:
+        limiter.acquire(ip="10.0.0.1", username="carol")
+    assert error.value.limit == "ip"
+    assert limiter.stats()["limited_by"] == {"ip": 1, "username": 1}
+
+
+def test_token_debt_outlives_the_ttl_of_an_empty_bucket(clock):
+    store = ExpiringStore(clock)
+    limiter = ChatRateLimiter(store, {USER_TOKENS: Bucket(10.0, 100)})
+    limiter.charge(1, 200)
+    assert store.timeouts["rate:user_tokens:1"] == 21
+
+    # Past the 11 seconds an empty bucket needs, the debt is still being repaid
+    clock.now += 12.0
+    limiter.charge(1, 50)
+    with pytest.raises(RateLimited) as error:
+        limiter.acquire(1)
+    assert error.value.retry_after == pytest.approx(3.0)
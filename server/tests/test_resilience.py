@@ -0,0 +1,174 @@
+import pytest
+import resilience
+from resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    UpstreamGuard,
+    UpstreamUnavailable,
+)
+
+
+class FakeClock:
+    """Stands in for the time module inside resilience."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(resilience, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(
+        window=4,
+        min_calls=4,
+        failure_rate=0.5,
+        slow_call_seconds=1.0,
+        slow_call_rate=0.75,
+        reset_timeout=30.0,
+    )
+
+
+def trip(breaker):
+    for success in (True, True, False, False):
+        assert breaker.allow()
+        breaker.record(success, 0.1)
+
+
+def test_stays_closed_below_min_calls(breaker):
+    for _ in range(3):
+        breaker.record(False, 0.1)
+
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_opens_at_failure_rate(breaker):
+    trip(breaker)
+
+    assert breaker.state == OPEN
+    assert breaker.opened_count == 1
+    assert not breaker.allow()
+
+
+def test_opens_at_slow_call_rate(breaker):
+    for duration in (2.0, 2.0, 2.0, 0.1):
+        breaker.record(True, duration)
+
+    assert breaker.state == OPEN
+
+
+def test_half_open_lets_one_probe_through(breaker, clock):
+    trip(breaker)
+    clock.now += 29.0
+    assert not breaker.allow()
+
+    clock.now += 1.0
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+
+
+def test_successful_probe_closes(breaker, clock):
+    trip(breaker)
+    clock.now += 30.0
+    breaker.allow()
+    breaker.record(True, 0.1)
+
+    assert breaker.state == CLOSED
+    # The window starts afresh, so one failure does not reopen it
+    breaker.record(False, 0.1)
+    assert breaker.state == CLOSED
+
+
+@pytest.mark.parametrize("success, duration", [(False, 0.1), (True, 5.0)])
+def test_failed_or_slow_probe_reopens(breaker, clock, success, duration):
+    trip(breaker)
+    clock.now += 30.0
+    breaker.allow()
+    breaker.record(success, duration)
+
+    assert breaker.state == OPEN
+    assert breaker.opened_count == 2
+    assert not breaker.allow()
+
+
+def test_cancelled_probe_frees_the_slot(breaker, clock):
+    trip(breaker)
+    clock.now += 30.0
+    assert breaker.allow()
+    breaker.cancel()
+
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+
+class ClientError(Exception):
+    """An error outside the guard's retry_on, like a 4xx response."""
+
+
+class UpstreamError(Exception):
+    pass
+
+
+@pytest.fixture
+def guard(breaker):
+    return UpstreamGuard(breaker, max_retries=0, retry_on=(UpstreamError,))
+
+
+def fail_with(error):
+    def call(timeout):
+        raise error
+
+    return call
+
+
+def test_client_error_does_not_close_a_half_open_breaker(guard, breaker, clock):
+    trip(breaker)
+    clock.now += 30.0
+
+    with pytest.raises(ClientError):
+        guard.call(fail_with(ClientError()))
+    assert breaker.state == HALF_OPEN
+
+    # The probe slot was released, and the next real outcome decides
+    with pytest.raises(UpstreamUnavailable):
+        guard.call(fail_with(UpstreamError()))
+    assert breaker.state == OPEN
+
+
+def test_client_errors_do_not_count_as_successes(guard, breaker):
+    for _ in range(2):
+        breaker.record(False, 0.1)
+    for _ in range(4):
+        with pytest.raises(ClientError):
+            guard.call(fail_with(ClientError()))
+    breaker.record(False, 0.1)
+    breaker.record(True, 0.1)
+
+    assert breaker.state == OPEN
+
+
+def test_client_error_in_a_stream_leaves_the_breaker_unchanged(guard, breaker, clock):
+    trip(breaker)
+    clock.now += 30.0
+
+    def stream(timeout):
+        yield "partial"
+        raise ClientError()
+
+    with pytest.raises(ClientError):
+        list(guard.stream(stream))
+    assert breaker.state == HALF_OPEN
+    assert guard.call(lambda timeout: "ok") == "ok"
+    assert breaker.state == CLOSED
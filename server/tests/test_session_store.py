@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+
+import pytest
+from config import db
+from models import ServerSession
+from session_store import MemorySessionBackend, SqlSessionBackend
+
+HOUR = timedelta(hours=1)
+EXPIRED = timedelta(seconds=-1)
+
+
+@pytest.fixture
+def sql_backend(app):
+    with app.app_context():
+        db.session.execute(db.delete(ServerSession))
+        db.session.commit()
+    return SqlSessionBackend(app, sweep_batch_size=2)
+
+
+@pytest.fixture(params=["memory", "sql"])
+def backend(request):
+    if request.param == "memory":
+        return MemorySessionBackend()
+    return request.getfixturevalue("sql_backend")
+
+
+def test_save_and_load(backend):
+    backend.save("session:a", {"user_id": 1}, HOUR)
+
+    assert backend.load("session:a") == {"user_id": 1}
+    assert backend.load("session:missing") is None
+    assert backend.stats()["hits"] == 1
+    assert backend.stats()["loads"] == 2
+
+
+def test_save_replaces_existing_session(backend):
+    backend.save("session:a", {"user_id": 1}, EXPIRED)
+    backend.save("session:a", {"user_id": 2}, HOUR)
+
+    assert backend.load("session:a") == {"user_id": 2}
+
+
+def test_expired_session_is_not_loaded(backend):
+    backend.save("session:a", {"user_id": 1}, EXPIRED)
+
+    assert backend.load("session:a") is None
+
+
+def test_delete(backend):
+    backend.save("session:a", {"user_id": 1}, HOUR)
+    backend.delete("session:a")
+
+    assert backend.load("session:a") is None
+
+
+def test_sweep_removes_only_expired_sessions(backend):
+    for index in range(5):
+        backend.save(f"session:old{index}", {"user_id": index}, EXPIRED)
+    backend.save("session:live", {"user_id": 9}, HOUR)
+
+    assert backend.sweep() == 5
+    assert backend.sweep() == 0
+    assert backend.load("session:live") == {"user_id": 9}
+    assert backend.stats()["swept"] == 5
+
+
+def test_memory_backend_returns_copies():
+    backend = MemorySessionBackend()
+    data = {"user_id": 1}
+    backend.save("session:a", data, HOUR)
+    data["user_id"] = 2
+    backend.load("session:a")["user_id"] = 3
+
+    assert backend.load("session:a") == {"user_id": 1}
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemorySessionBackend(max_entries=2)
+    backend.save("session:a", {"n": 1}, HOUR)
+    backend.save("session:b", {"n": 2}, HOUR)
+    backend.load("session:a")
+    backend.save("session:c", {"n": 3}, HOUR)
+
+    assert backend.load("session:b") is None
+    assert backend.load("session:a") == {"n": 1}
+    assert backend.stats()["entries"] == 2
+
+
+def test_sql_backend_upserts_one_row(app, sql_backend):
+    sql_backend.save("session:a", {"user_id": 1}, HOUR)
+    sql_backend.save("session:a", {"user_id": 2}, HOUR)
+
+    with app.app_context():
+        rows = db.session.scalars(db.select(ServerSession)).all()
+    assert [row.id for row in rows] == ["session:a"]
+    assert rows[0].expires_at > datetime.utcnow()
+
+
+def test_logout_removes_the_stored_session(app, client, sql_backend):
+    client.post(
+        "/api/user_auth",
+        json={
+            "username": "sessionuser",
+            "email": "s@example.com",
+            "password": "secret1",
+        },
+    )
+    client.post("/api/logout")
+    response = client.post(
+        "/api/login", json={"username": "sessionuser", "password": "secret1"}
+    )
+    assert response.status_code == 200
+    with app.app_context():
+        keys = db.session.scalars(db.select(ServerSession.id)).all()
+    assert len(keys) == 1
+    assert sql_backend.load(keys[0])["user_id"]
+
+    response = client.post("/api/logout")
+
+    assert response.status_code == 200
+    assert sql_backend.load(keys[0]) is None
+    assert client.get_cookie(app.config["SESSION_COOKIE_NAME"]) is None
+    assert client.get("/api/check_session").get_json() == {"authenticated": False}
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Trains the chat pre-filter's off-topic model from chat history.
+
+Each stored ChatMessage becomes a training example. A message is labelled off-topic when
+the assistant answered it with the "I'm here to help with ... your VisionX phone"
+redirect the support guide asks for, and on-topic otherwise. Extra hand-labelled
+examples can be added from a JSONL file of {"message": ..., "off_topic": true/false}.
+
+Usage:
+   python train_prefilter.py --output data/prefilter_model.json
+   python train_prefilter.py --examples labelled.jsonl --limit 50000
+The app loads the model from CHAT_PREFILTER_MODEL on startup.
+"""
+
+import argparse
+import json
+import re
+
+from app import app, db
+from models import ChatMessage
+from prefilter import LinearModel
+
+# The redirect the support guide asks the model to give for off-topic questions
+REDIRECT_PATTERN = re.compile(
+    r"here to help with (all things related to )?your visionx phone", re.IGNORECASE
+)
+
+
+def history_examples(limit):
+    """
+    Yields (message, label) pairs from the newest `limit` chat messages.
+    """
+    rows = (
+        db.session.query(ChatMessage.message, ChatMessage.response)
+        .order_by(ChatMessage.id.desc())
+        .limit(limit)
+        .yield_per(1000)
+    )
+    for message, response in rows:
+        if message:
+            yield message, int(bool(REDIRECT_PATTERN.search(response or "")))
+
+
+def file_examples(path):
+    """
+    Yields (message, label) pairs from a JSONL file of labelled examples.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                item = json.loads(line)
+                yield item["message"], int(bool(item["off_topic"]))
+
+
+def main():
+    """
+    Parses command-line options, trains the model and writes it to disk.
+    """
+    parser = argparse.ArgumentParser(description="Train the chat pre-filter model")
+    parser.add_argument("--output", default=app.config["CHAT_PREFILTER_MODEL"])
+    parser.add_argument("--examples", help="JSONL file of extra labelled examples")
+    parser.add_argument("--limit", type=int, default=100000)
+    parser.add_argument("--epochs", type=int, default=10)
+    args = parser.parse_args()
+
+    with app.app_context():
+        examples = list(history_examples(args.limit))
+    if args.examples:
+        examples.extend(file_examples(args.examples))
+
+    off_topic = sum(label for _, label in examples)
+    print(f"Examples: {len(examples)} ({off_topic} off-topic)")
+    if not off_topic or off_topic == len(examples):
+        print("Both on-topic and off-topic examples are needed; model not written.")
+        return
+
+    model = LinearModel.train(examples, epochs=args.epochs)
+    correct = sum((model.score(text) >= 0.5) == bool(label) for text, label in examples)
+    print(f"Training accuracy: {correct / len(examples):.3f}")
+    model.save(args.output)
+    print(f"Model written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
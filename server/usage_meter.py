@@ -0,0 +1,198 @@
+# usage_meter.py: Token usage and latency metering for model calls.
+# Every model call is recorded with its token counts, wall time and cache status. Records are
+# buffered in memory and written to the model_call_usage table in batches, so metering adds
+# no database round trip to the chat request path.
+
+import atexit
+import logging
+import threading
+from datetime import datetime
+
+from config import db
+from models import ModelCallUsage
+from sqlalchemy import case, func
+
+HIT = "hit"
+MISS = "miss"
+COALESCED = "coalesced"
+BYPASS = "bypass"
+FAQ = "faq"
+
+GROUP_BY = ("hour", "user", "session")
+SORT_BY = ("tokens", "latency", "calls")
+
+
+class UsageMeter:
+    """
+    Buffers model call usage records and persists them in batches.
+
+    Attributes:
+    - batch_size: Buffered records that trigger an immediate flush.
+    - flush_interval: Seconds between background flushes of a partly filled buffer.
+      A value of 0 disables the background flush.
+
+    Records are dicts of ModelCallUsage columns. Pending records are flushed at interpreter
+    exit; records that fail to persist are logged and dropped.
+    """
+
+    def __init__(self, app, batch_size=50, flush_interval=5.0):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.counters = {"recorded": 0, "persisted": 0, "dropped": 0, "flushes": 0}
+        if flush_interval > 0:
+            threading.Thread(
+                target=self._flush_loop, name="usage-meter", daemon=True
+            ).start()
+        atexit.register(self.close)
+
+    def record(self, **usage):
+        """
+        Buffers a usage record. Missing columns default as in ModelCallUsage; created_at is
+        set to now.
+        """
+        usage.setdefault("created_at", datetime.utcnow())
+        with self._lock:
+            self._buffer.append(usage)
+            self.counters["recorded"] += 1
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes all buffered records in a single insert. Returns the number persisted.
+        """
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+            try:
+                with self.app.app_context():
+                    db.session.execute(db.insert(ModelCallUsage), rows)
+                    db.session.commit()
+            except Exception as e:
+                logging.error(f"Error persisting {len(rows)} usage records: {str(e)}")
+                with self._lock:
+                    self.counters["dropped"] += len(rows)
+                return 0
+            with self._lock:
+                self.counters["persisted"] += len(rows)
+                self.counters["flushes"] += 1
+            return len(rows)
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """Stops the background flush and writes any pending records."""
+        self._stop.set()
+        self.flush()
+
+    def stats(self):
+        """Returns meter counters and the number of records waiting to be written."""
+        with self._lock:
+            data = dict(self.counters)
+            data["pending"] = len(self._buffer)
+        return data
+
+
+def create_usage_meter(app):
+    """
+    Creates the usage meter from the USAGE_METER_* settings in the app config.
+    """
+    return UsageMeter(
+        app,
+        batch_size=app.config["USAGE_METER_BATCH_SIZE"],
+        flush_interval=app.config["USAGE_METER_FLUSH_INTERVAL"],
+    )
+
+
+def hour_bucket(column):
+    """Truncates a timestamp column to the hour in SQL, for PostgreSQL and SQLite."""
+    if db.engine.dialect.name == "postgresql":
+        return func.date_trunc("hour", column)
+    return func.strftime("%Y-%m-%d %H:00:00", column)
+
+
+def usage_rollup(
+    group_by, since, until, call_type=None, sort="tokens", limit=100, user_id=None
+):
+    """
+    Aggregates recorded model calls between since and until.
+
+    Args:
+    group_by (str): "hour" (chronological), "user" or "session".
+    since, until (datetime): Time range of the calls, inclusive of since.
+    call_type (str): Optional call type filter, e.g. "chat".
+    sort (str): Ordering for user and session rollups: "tokens", "latency" or "calls",
+      largest first.
+    limit (int): Maximum number of rows returned.
+    user_id (int): Optional filter to one user's calls.
+
+    Returns:
+    list: One dict per group with call, cache hit, failure, token and latency totals.
+    """
+    if group_by == "hour":
+        key = hour_bucket(ModelCallUsage.created_at)
+    elif group_by == "user":
+        key = ModelCallUsage.user_id
+    else:
+        key = ModelCallUsage.session_id
+
+    calls = func.count(ModelCallUsage.id)
+    total_tokens = func.sum(ModelCallUsage.total_tokens)
+    avg_latency = func.avg(ModelCallUsage.latency_ms)
+    query = (
+        db.session.query(
+            key.label("key"),
+            calls.label("calls"),
+            func.sum(case((ModelCallUsage.cache_status == HIT, 1), else_=0)).label(
+                "cache_hits"
+            ),
+            func.sum(case((ModelCallUsage.success.is_(False), 1), else_=0)).label(
+                "failures"
+            ),
+            func.sum(ModelCallUsage.prompt_tokens).label("prompt_tokens"),
+            func.sum(ModelCallUsage.completion_tokens).label("completion_tokens"),
+            total_tokens.label("total_tokens"),
+            avg_latency.label("avg_latency_ms"),
+            func.max(ModelCallUsage.latency_ms).label("max_latency_ms"),
+        )
+        .filter(ModelCallUsage.created_at >= since, ModelCallUsage.created_at < until)
+        .group_by(key)
+    )
+    if call_type:
+        query = query.filter(ModelCallUsage.call_type == call_type)
+    if user_id is not None:
+        query = query.filter(ModelCallUsage.user_id == user_id)
+
+    if group_by == "hour":
+        query = query.order_by(key)
+    else:
+        order = {"tokens": total_tokens, "latency": avg_latency, "calls": calls}[sort]
+        query = query.order_by(order.desc())
+
+    rows = []
+    for row in query.limit(limit):
+        data = row._asdict()
+        if hasattr(data["key"], "isoformat"):
+            data["key"] = data["key"].isoformat()
+        data[group_by] = data.pop("key")
+        data["avg_latency_ms"] = round(float(data["avg_latency_ms"] or 0), 1)
+        for name in (
+            "cache_hits",
+            "failures",
+            "prompt_tokens",
+            "completion_tokens",
+            "total_tokens",
+        ):
+            data[name] = int(data[name] or 0)
+        rows.append(data)
+    return rows